@@ -1,13 +1,64 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
 import os
+import time
+import metrics
 from dotenv import load_dotenv
 from email_processor import EmailProcessor
+from jobs import JobManager, JobQueueFull, get_job_queue
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 email_processor = EmailProcessor()
+metrics.register_stats("preprocessor", email_processor.preprocessor.stats)
+metrics.register_stats("rate_limiter", email_processor.rate_limiter.stats)
+metrics.register_stats("retry_policy", email_processor.retry_policy.stats)
+
+# Durable queue for every processed email: ?async=true jobs are polled at /api/jobs/<id>, other
+# requests run their own job while the client waits. JOB_WORKERS consumers run in this process;
+# set it to 0 when worker.py processes do the work
+ANALYZE_EMAIL_JOB = "analyze_email"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+job_manager = JobManager(get_job_queue())
+job_manager.register(ANALYZE_EMAIL_JOB, email_processor.process_email)
+metrics.register_stats("jobs", job_manager.stats)
+
+def accepted(jobs):
+    """202 response for queued jobs, pointing at the first job's status URL"""
+    body = [{"job_id": job["id"], "status_url": f"/api/jobs/{job['id']}"} for job in jobs]
+    return body, 202, {"Location": body[0]["status_url"]} if body else {}
+
+def wants_async_job():
+    """Whether the caller asked for a background job via ?async=true or Prefer: respond-async"""
+    return (request.args.get("async", "").lower() in ("1", "true", "yes")
+            or "respond-async" in request.headers.get("Prefer", "").lower())
+
+@app.before_request
+def start_job_workers():
+    # Started with the first request, not at import: WSGI servers that load the app and then fork
+    # would lose the thread, and importing the app should not start consuming
+    job_manager.start_background(JOB_WORKERS)
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.labels(app="flask").inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # Label by URL rule so path parameters do not explode the label set
+    path = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_LATENCY.labels(app="flask", method=request.method, path=path).observe(
+        time.perf_counter() - g.request_start
+    )
+    metrics.HTTP_REQUESTS.labels(app="flask", method=request.method, path=path, status=str(response.status_code)).inc()
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception=None):
+    if "request_start" in g:
+        metrics.HTTP_IN_FLIGHT.labels(app="flask").dec()
 
 @app.route('/')
 def home():
@@ -17,6 +68,11 @@ def home():
 def health_check():
     return jsonify({"status": "healthy"})
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics in the Prometheus text format"""
+    return Response(metrics.latest(), mimetype=metrics.CONTENT_TYPE_LATEST)
+
 @app.route('/process_email', methods=['POST'])
 def process_email():
     """Process an email and return analysis results"""
@@ -25,15 +81,23 @@ def process_email():
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
-        result = email_processor.process_email(data)
+        result = job_manager.run_inline(ANALYZE_EMAIL_JOB, data)
         return jsonify(result)
 
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    """Handle incoming webhook requests"""
+    """
+    Handle incoming webhook requests
+
+    With ?async=true or Prefer: respond-async, returns 202 with a job ID at
+    once and processes the email in the background; the result is served at
+    /api/jobs/<id> and POSTed to the payload's callback_url when given.
+    """
     try:
         data = request.get_json()
         if not data:
@@ -43,19 +107,52 @@ def webhook():
         if data.get('type') != 'email':
             return jsonify({"error": "Invalid webhook type"}), 400
 
+        if wants_async_job():
+            email_data = data.get('data')
+            if not email_data:
+                return jsonify({"error": "No email data provided"}), 400
+            try:
+                job = job_manager.submit(ANALYZE_EMAIL_JOB, email_data, callback_url=data.get('callback_url'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 422
+            except JobQueueFull as e:
+                return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+            body, status, headers = accepted([job])
+            return jsonify({"status": "accepted", **body[0]}), status, headers
+
         # Process the email data
-        result = email_processor.process_email(data.get('data', {}))
+        result = job_manager.run_inline(ANALYZE_EMAIL_JOB, data.get('data', {}))
         return jsonify(result)
 
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of a background job, with its result once it has succeeded"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job)
+
 @app.route('/recent_emails', methods=['GET'])
 def recent_emails():
-    """Get and process recent emails"""
+    """
+    Get and process recent emails
+
+    With ?async=true, queues one job per email and returns 202 with their IDs
+    instead of processing them one after another.
+    """
     try:
         max_results = request.args.get('max_results', default=10, type=int)
-        emails = email_processor.get_recent_emails(max_results)
+        if wants_async_job():
+            jobs = email_processor.enqueue_recent_emails(job_manager, ANALYZE_EMAIL_JOB, max_results)
+            body, status, headers = accepted(jobs)
+            return jsonify({"status": "accepted", "jobs": body}), status, headers
+
+        emails = email_processor.get_recent_emails(max_results, job_manager, ANALYZE_EMAIL_JOB)
         return jsonify(emails)
 
     except Exception as e:
@@ -0,0 +1,386 @@
+"""
+Offline benchmark harness.
+
+Starts the stand-in servers from ``stubs.py``, runs the FastAPI and Flask
+apps against them, and drives each target at rising concurrency:
+
+- ``fastapi``: POST /api/process-email
+- ``flask``: POST /process_email
+- ``imap``: EmailHandler.check_emails reading a mailbox from the IMAP stub
+  and posting each message to the FastAPI app
+- ``gmail``: EmailProcessor.get_recent_emails reading from the Gmail stub
+
+Reports throughput, p50/p95/p99 latency and CPU time per unit of work.
+Results can be saved with ``--output`` and compared against a saved run
+with ``--baseline``; the run exits non-zero when throughput or p95
+regresses by more than ``--max-regression``.
+
+    python benchmarks/run.py --targets fastapi,flask --concurrency 1,8,32 --requests 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from stubs import NEWSLETTER_TEXT  # noqa: E402
+
+TARGETS = ("fastapi", "flask", "imap", "gmail")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_cpu_seconds(pid: int):
+    """CPU time used so far by another process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def summarize(target: str, concurrency: int, unit: str, latencies: list, errors: int,
+              elapsed: float, cpu_seconds) -> dict:
+    units = len(latencies) + errors
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "unit": unit,
+        "count": units,
+        "errors": errors,
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "cpu_ms_per_unit": round(cpu_seconds / units * 1000, 2) if cpu_seconds is not None and units else None
+    }
+
+
+class Environment:
+    """Stub servers, app processes and the environment pointing them at each other."""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="email-bench-")
+        self.processes = []
+        self.ports = {}
+        self.apps = {}
+
+    def __enter__(self):
+        stubs = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "stubs.py"),
+             "--openai-latency", self.args.openai_latency,
+             "--notion-latency", self.args.notion_latency,
+             "--gmail-latency", self.args.gmail_latency,
+             "--imap-latency", self.args.imap_latency,
+             "--messages", str(self.args.messages_per_mailbox)],
+            stdout=subprocess.PIPE, text=True
+        )
+        self.processes.append(stubs)
+        self.ports = json.loads(stubs.stdout.readline())
+
+        self.env = dict(os.environ)
+        self.env.update({
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{self.ports['openai']}/v1",
+            "OPENAI_API_BASE": f"http://127.0.0.1:{self.ports['openai']}/v1",
+            "NOTION_KEY": "secret-bench",
+            "NOTION_DATABASE_ID": "bench-database",
+            "NOTION_API_BASE": f"http://127.0.0.1:{self.ports['notion']}",
+            "TEST_MODE": "false",
+            "SAVE_TO_NOTION": "true",
+            "NOTION_OUTBOX_DB": os.path.join(self.tmpdir.name, "outbox.db"),
+            "SENDER_REPUTATION_DB": os.path.join(self.tmpdir.name, "reputation.db"),
+            "SUMMARY_CACHE_DB": "",
+            "IDEMPOTENCY_DB": os.path.join(self.tmpdir.name, "idempotency.db"),
+            "JOB_QUEUE_DB": os.path.join(self.tmpdir.name, "jobs.db"),
+            "IMAP_SYNC_DB": os.path.join(self.tmpdir.name, "imap_sync.db"),
+            # Measure the code, not the account's rate limits
+            "OPENAI_RPM_LIMIT": "100000000",
+            "OPENAI_TPM_LIMIT": "100000000000",
+            "OPENAI_MAX_CONCURRENCY": str(max(self.args.concurrency) * 2),
+            "HEALTH_CHECK_INTERVAL": "3600",
+        })
+        os.environ.update(self.env)
+        return self
+
+    def start_app(self, name: str) -> str:
+        """Start the FastAPI or Flask app and return its base URL."""
+        if name in self.apps:
+            return self.apps[name][1]
+        port = free_port()
+        if name == "fastapi":
+            command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                       "--port", str(port), "--log-level", "warning"]
+            ready_path = "/api/health/live"
+        else:
+            command = [sys.executable, "-c",
+                       f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+            ready_path = "/api/health"
+        process = subprocess.Popen(command, cwd=REPO_ROOT, env=self.env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.processes.append(process)
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} app exited during startup")
+            try:
+                if httpx.get(url + ready_path, timeout=1).status_code == 200:
+                    self.apps[name] = (process, url)
+                    return url
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{name} app did not become ready")
+
+    def app_cpu(self, name: str):
+        return process_cpu_seconds(self.apps[name][0].pid) if name in self.apps else None
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.tmpdir.cleanup()
+
+
+def email_payload(index: int) -> dict:
+    # Unique bodies so the summary cache does not turn the benchmark into a cache benchmark
+    return {
+        "subject": f"Example Weekly issue #{index}",
+        "body": f"Issue {index} ({time.time_ns()})\n\n{NEWSLETTER_TEXT}",
+        "sender": "news@example.com"
+    }
+
+
+async def drive_http(url: str, path: str, concurrency: int, requests: int):
+    latencies, errors = [], 0
+    next_index = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal next_index, errors
+            while next_index < requests:
+                index = next_index
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=email_payload(index))
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+
+def bench_http(environment: Environment, target: str, concurrency: int, requests: int) -> dict:
+    url = environment.start_app(target)
+    path = "/api/process-email" if target == "fastapi" else "/process_email"
+    cpu_before = environment.app_cpu(target)
+    start = time.perf_counter()
+    latencies, errors = asyncio.run(drive_http(url, path, concurrency, requests))
+    elapsed = time.perf_counter() - start
+    cpu_after = environment.app_cpu(target)
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return summarize(target, concurrency, "request", latencies, errors, elapsed, cpu)
+
+
+def run_pool(concurrency: int, rounds: int, task) -> tuple:
+    """Run task(round) from ``concurrency`` threads; return latencies, errors and elapsed time."""
+    latencies, errors = [], 0
+
+    def timed(index):
+        start = time.perf_counter()
+        ok = task(index)
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for ok, seconds in executor.map(timed, range(rounds)):
+            if ok:
+                latencies.append(seconds)
+            else:
+                errors += 1
+    return latencies, errors, time.perf_counter() - start
+
+
+def bench_imap(environment: Environment, concurrency: int, requests: int) -> dict:
+    """Each unit syncs one fresh mailbox, posting every message to the FastAPI app."""
+    from email_handler import EmailHandler
+
+    api_url = environment.start_app("fastapi")
+    os.environ.update({
+        "IMAP_SERVER": "127.0.0.1",
+        "IMAP_PORT": str(environment.ports["imap"]),
+        "IMAP_SSL": "false",
+        "EMAIL_PASSWORD": "bench",
+        "EMAIL_API_ENDPOINT": api_url,
+        # Time the summaries, not just queueing them
+        "EMAIL_API_ASYNC": "false",
+    })
+    mailboxes = max(requests // environment.args.messages_per_mailbox, concurrency)
+
+    def sync_mailbox(index):
+        handler = EmailHandler()
+        handler.email_address = f"bench-{concurrency}-{index}-{time.time_ns()}"
+        try:
+            return asyncio.run(handler.check_emails())
+        finally:
+            handler.close_session()
+
+    cpu_before = time.process_time(), environment.app_cpu("fastapi")
+    latencies, errors, elapsed = run_pool(concurrency, mailboxes, sync_mailbox)
+    cpu_after = time.process_time(), environment.app_cpu("fastapi")
+    cpu = cpu_after[0] - cpu_before[0]
+    if cpu_before[1] is not None and cpu_after[1] is not None:
+        cpu += cpu_after[1] - cpu_before[1]
+    return summarize("imap", concurrency, "mailbox_sync", latencies, errors, elapsed, cpu)
+
+
+def bench_gmail(environment: Environment, concurrency: int, requests: int) -> dict:
+    """Each unit fetches and analyses ``--messages-per-mailbox`` emails with EmailProcessor.get_recent_emails."""
+    from googleapiclient.discovery import build
+    from email_processor import EmailProcessor
+
+    per_call = environment.args.messages_per_mailbox
+    calls = max(requests // per_call, concurrency)
+    # googleapiclient's transport is not thread-safe, so each thread gets its own processor
+    local = threading.local()
+
+    def sync_gmail(index):
+        if not hasattr(local, "processor"):
+            local.processor = EmailProcessor()
+            local.processor.test_mode = False
+            local.processor.email_auth.service = build(
+                "gmail", "v1", developerKey="bench", static_discovery=True,
+                client_options={"api_endpoint": f"http://127.0.0.1:{environment.ports['gmail']}/"}
+            )
+        return len(local.processor.get_recent_emails(per_call)) == per_call
+
+    cpu_before = time.process_time()
+    latencies, errors, elapsed = run_pool(concurrency, calls, sync_gmail)
+    cpu = time.process_time() - cpu_before
+    return summarize("gmail", concurrency, "gmail_sync", latencies, errors, elapsed, cpu)
+
+
+def print_table(results: list):
+    columns = ("target", "concurrency", "unit", "count", "errors", "throughput_per_s",
+               "p50_ms", "p95_ms", "p99_ms", "cpu_ms_per_unit")
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def compare(results: list, baseline_path: str, max_regression: float) -> list:
+    """Return descriptions of results that regressed against the baseline."""
+    with open(baseline_path) as f:
+        baseline = {(r["target"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get((result["target"], result["concurrency"]))
+        if before is None:
+            continue
+        key = f"{result['target']}@{result['concurrency']}"
+        if before["throughput_per_s"] and result["throughput_per_s"] < before["throughput_per_s"] * (1 - max_regression):
+            regressions.append(f"{key}: throughput {before['throughput_per_s']} -> {result['throughput_per_s']}/s")
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{key}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the email pipelines against local stand-in servers")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help="Comma-separated targets: " + ", ".join(TARGETS))
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Units of work per concurrency level")
+    parser.add_argument("--messages-per-mailbox", type=int, default=10,
+                        help="Messages per IMAP mailbox and per Gmail fetch")
+    parser.add_argument("--openai-latency", default="lognormal:0.4:0.5",
+                        help="none | fixed:S | uniform:MIN:MAX | lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument("--notion-latency", default="lognormal:0.2:0.4")
+    parser.add_argument("--gmail-latency", default="fixed:0.05")
+    parser.add_argument("--imap-latency", default="fixed:0.01")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results saved with --output")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed fractional drop in throughput or rise in p95 against the baseline")
+    args = parser.parse_args(argv)
+    args.targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = []
+    with Environment(args) as environment:
+        for target in args.targets:
+            for concurrency in args.concurrency:
+                if target in ("fastapi", "flask"):
+                    result = bench_http(environment, target, concurrency, args.requests)
+                elif target == "imap":
+                    result = bench_imap(environment, concurrency, args.requests)
+                else:
+                    result = bench_gmail(environment, concurrency, args.requests)
+                results.append(result)
+                print(f"{target} @ {concurrency}: {result['throughput_per_s']}/s, p95 {result['p95_ms']} ms",
+                      file=sys.stderr)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "settings": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+                "results": results
+            }, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
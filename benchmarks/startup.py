@@ -0,0 +1,177 @@
+"""
+Cold-start benchmark for the FastAPI app.
+
+Measures, in fresh interpreters:
+
+- ``import_s``: time to ``import main``
+- ``ready_s``: time from launching uvicorn until ``/api/health/live`` answers
+- ``first_response_s``: time from launch until the first ``/api/process-email``
+  response, against the local stand-in servers from ``stubs.py``
+
+It also lists heavy modules that ``import main`` loaded even though they are
+only needed on first use. The run exits non-zero when a median exceeds its
+budget or a deferred module is loaded at import, so the cold-start budget can
+be enforced in CI.
+
+    python benchmarks/startup.py --runs 5 --max-import-seconds 1.5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from run import REPO_ROOT, Environment, email_payload, free_port, parse_args as parse_bench_args
+
+# Imported on first use by main; loading them at import time is a regression
+DEFERRED_MODULES = ("langchain", "openai", "requests", "notion_client", "tiktoken")
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_s": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET % (DEFERRED_MODULES,)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, count: int) -> list:
+    """Return the ``count`` top-level imports of main with the largest cumulative time, in ms."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stderr
+    imports, children = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Children are listed before their parent; after the separator space a
+        # top-level import is indented by one space and its children by three
+        indent = len(name) - len(name.lstrip())
+        if indent == 3:
+            children.append((name.strip(), round(int(cumulative) / 1000, 1)))
+        elif indent == 1:
+            if name.strip() == "main":
+                imports = children
+            children = []
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def measure_cold_start(env: dict, timeout: float = 60) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            deadline = time.monotonic() + timeout
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError("app exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError("app did not become ready")
+                try:
+                    if client.get("/api/health/live", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+            ready = time.perf_counter() - start
+            response = client.post("/api/process-email", json=email_payload(0))
+            first_response = time.perf_counter() - start
+            if response.status_code != 200:
+                raise RuntimeError(f"first request failed with {response.status_code}: {response.text}")
+        return {"ready_s": ready, "first_response_s": first_response}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-response of main.py")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--openai-latency", default="none",
+                        help="none | fixed:S | uniform:MIN:MAX | lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument("--max-import-seconds", type=float, default=1.5)
+    parser.add_argument("--max-ready-seconds", type=float, default=3.0)
+    parser.add_argument("--max-first-response-seconds", type=float, default=4.0)
+    parser.add_argument("--show-imports", type=int, default=10, help="Slowest direct imports of main to list")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    bench_args = parse_bench_args(["--concurrency", "1", "--openai-latency", args.openai_latency,
+                                   "--notion-latency", "none"])
+    samples = {"import_s": [], "ready_s": [], "first_response_s": []}
+    loaded = set()
+    with Environment(bench_args) as environment:
+        for _ in range(args.runs):
+            result = measure_import(environment.env)
+            samples["import_s"].append(result["import_s"])
+            loaded.update(result["loaded"])
+        for _ in range(args.runs):
+            for key, value in measure_cold_start(environment.env).items():
+                samples[key].append(value)
+        imports = slowest_imports(environment.env, args.show_imports)
+
+    results = {
+        key: {"median": round(statistics.median(values), 3), "max": round(max(values), 3)}
+        for key, values in samples.items()
+    }
+    for key, summary in results.items():
+        print(f"{key:<18} median {summary['median']:.3f}s  max {summary['max']:.3f}s")
+    print("slowest imports of main:")
+    for name, milliseconds in imports:
+        print(f"  {name:<28} {milliseconds:>8.1f} ms")
+
+    failures = []
+    budgets = {
+        "import_s": args.max_import_seconds,
+        "ready_s": args.max_ready_seconds,
+        "first_response_s": args.max_first_response_seconds,
+    }
+    for key, budget in budgets.items():
+        if results[key]["median"] > budget:
+            failures.append(f"{key} median {results[key]['median']}s exceeds budget {budget}s")
+    if loaded:
+        failures.append(f"import main loaded deferred modules: {', '.join(sorted(loaded))}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+                "budgets": budgets,
+                "slowest_imports": dict(imports),
+                "deferred_modules_loaded": sorted(loaded)
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"OVER BUDGET {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
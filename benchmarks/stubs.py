@@ -0,0 +1,460 @@
+"""
+Local stand-ins for the OpenAI, Notion, Gmail and IMAP services.
+
+Each stub answers just enough of its protocol for this app and waits for a
+latency drawn from a configurable distribution before responding, so the
+benchmarks run offline with realistic upstream timing.
+
+Run standalone to keep the stubs up for manual testing:
+
+    python benchmarks/stubs.py --openai-latency lognormal:0.4:0.5
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import select
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NEWSLETTER_TEXT = """View this email in your browser
+
+This week's highlights:
+1. New model releases and what they mean for production workloads https://example.com/models?utm_source=newsletter
+2. A deep dive into connection pooling for HTTP clients https://example.com/pooling?utm_medium=email
+3. Benchmarks of three vector databases under concurrent load https://example.com/vectors
+
+Our sponsor this week helps teams ship faster with managed queues and retries.
+
+That's all for this week. Reply to this email with feedback.
+
+You are receiving this because you subscribed. Unsubscribe here: https://example.com/unsubscribe
+"""
+
+
+class Latency:
+    """
+    A latency distribution parsed from a spec string, in seconds.
+
+    Specs: ``none``, ``fixed:S``, ``uniform:MIN:MAX`` and ``lognormal:MEDIAN:SIGMA``.
+    """
+
+    def __init__(self, spec: str = "none"):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"none": 0, "fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return random.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return random.lognormvariate(math.log(median), sigma)
+        return 0.0
+
+    def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs add ~40ms per response
+    disable_nagle_algorithm = True
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _function_arguments(function: dict) -> dict:
+    """Fill a function's required parameters with placeholder values."""
+    arguments = {}
+    properties = function.get("parameters", {}).get("properties", {})
+    for name in function.get("parameters", {}).get("required", []):
+        kind = properties.get(name, {}).get("type")
+        arguments[name] = True if kind == "boolean" else f"Benchmark {name}"
+    return arguments
+
+
+class OpenAIStubHandler(StubHandler):
+    """Answers chat completions (plain, function-calling and streamed) and model lookups."""
+
+    def do_GET(self):
+        match = re.match(r"^/v1/models/([^/?]+)", self.path)
+        if not match:
+            return self.send_json(404, {"error": {"message": "not found"}})
+        self.send_json(200, {"id": match.group(1), "object": "model", "owned_by": "benchmark"})
+
+    def do_POST(self):
+        if not self.path.startswith("/v1/chat/completions"):
+            return self.send_json(404, {"error": {"message": "not found"}})
+        request = self.read_json()
+        self.server.latency.wait()
+        self.server.requests += 1
+
+        prompt = " ".join(str(m.get("content") or "") for m in request.get("messages", []))
+        content = "Summary: the email covers model releases, HTTP connection pooling and vector database benchmarks."
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if request.get("stream"):
+            return self.stream(request, content)
+
+        message = {"role": "assistant", "content": content}
+        function_call = request.get("function_call")
+        if isinstance(function_call, dict):
+            function = next(
+                (f for f in request.get("functions", []) if f["name"] == function_call["name"]), {}
+            )
+            message = {
+                "role": "assistant",
+                "content": None,
+                "function_call": {"name": function_call["name"], "arguments": json.dumps(_function_arguments(function))}
+            }
+        elif request.get("max_tokens", 0) <= 10:
+            # Classification prompts expect a one-word answer
+            message["content"] = "true"
+
+        self.send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def stream(self, request: dict, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for word in content.split(" "):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class NotionStubHandler(StubHandler):
+    """Answers page creation and database lookups."""
+
+    def do_GET(self):
+        match = re.match(r"^/v1/databases/([^/?]+)", self.path)
+        if not match:
+            return self.send_json(404, {"object": "error", "status": 404, "code": "object_not_found", "message": "not found"})
+        self.server.latency.wait()
+        self.send_json(200, {"object": "database", "id": match.group(1), "properties": {}})
+
+    def do_POST(self):
+        if not self.path.startswith("/v1/pages"):
+            return self.send_json(404, {"object": "error", "status": 404, "code": "object_not_found", "message": "not found"})
+        self.read_json()
+        self.server.latency.wait()
+        self.server.requests += 1
+        self.send_json(200, {"object": "page", "id": str(uuid.uuid4())})
+
+
+def make_message(index: int, sender: str = "news@example.com") -> EmailMessage:
+    """Build a newsletter-like message for the mail stubs."""
+    message = EmailMessage()
+    message["From"] = f"Example Weekly <{sender}>"
+    message["To"] = "bench@example.com"
+    message["Subject"] = f"Example Weekly issue #{index}"
+    message["Message-ID"] = f"<bench-{index}-{uuid.uuid4().hex}@example.com>"
+    message["List-Unsubscribe"] = "<https://example.com/unsubscribe>"
+    message.set_content(f"Issue {index}\n\n{NEWSLETTER_TEXT}")
+    return message
+
+
+class GmailStubHandler(StubHandler):
+    """Answers the Gmail API message list and get calls used by EmailAuth.get_emails."""
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/gmail/v1/users/me/messages":
+            query = dict(p.split("=", 1) for p in self.path.split("?", 1)[1].split("&") if "=" in p) if "?" in self.path else {}
+            count = int(query.get("maxResults", 10))
+            self.server.latency.wait()
+            return self.send_json(200, {"messages": [{"id": f"msg{i}", "threadId": f"msg{i}"} for i in range(count)]})
+
+        match = re.match(r"^/gmail/v1/users/me/messages/msg(\d+)$", path)
+        if not match:
+            return self.send_json(404, {"error": {"code": 404, "message": "not found"}})
+        self.server.latency.wait()
+        message = make_message(int(match.group(1)))
+        data = base64.urlsafe_b64encode(message.get_content().encode()).decode()
+        self.send_json(200, {
+            "id": f"msg{match.group(1)}",
+            "payload": {
+                "headers": [{"name": name, "value": str(value)} for name, value in message.items()],
+                "body": {"size": len(data), "data": data}
+            }
+        })
+
+
+class IMAPStubHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks the subset of IMAP4rev1 that imaplib uses to read mail by
+    sequence number or UID, plus IDLE (RFC 2177) unless the server was
+    started with ``idle=False``.
+
+    Each login gets its own mailbox of ``messages_per_mailbox`` unseen
+    newsletters, created on first use. ``IMAPStubServer.deliver`` adds mail
+    and wakes connections that are idling on that mailbox.
+    """
+
+    disable_nagle_algorithm = True
+
+    def send(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def capabilities(self) -> str:
+        return "IMAP4rev1 IDLE" if self.server.idle else "IMAP4rev1"
+
+    def idle(self, tag: str, mailbox: list, reported: int) -> int:
+        """Report new mail until the client sends DONE; returns the message count last reported."""
+        self.send("+ idling")
+        while True:
+            if len(mailbox) > reported:
+                reported = len(mailbox)
+                self.send(f"* {reported} EXISTS")
+            readable, _, _ = select.select([self.connection], [], [], 0.02)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return reported
+                if line.strip().upper() == b"DONE":
+                    self.send(f"{tag} OK IDLE terminated")
+                    return reported
+
+    def search(self, mailbox: list, criteria: str, by_uid: bool) -> list:
+        """Answer searches combining ``ALL``, ``UNSEEN`` and ``UID first:last``."""
+        criteria = criteria.upper().split()
+        matches = list(enumerate(mailbox, 1))
+        while criteria:
+            criterion = criteria.pop(0)
+            if criterion == "UNSEEN":
+                matches = [(number, entry) for number, entry in matches if not entry["seen"]]
+            elif criterion == "UID":
+                first, _, last = criteria.pop(0).partition(":")
+                newest = mailbox[-1]["uid"] if mailbox else 0
+                # "*" is the newest UID, so "n:*" matches the newest message even when n is above it
+                low, high = sorted((int(first), newest if last == "*" else int(last or first)))
+                matches = [(number, entry) for number, entry in matches if low <= entry["uid"] <= high]
+        return [str(entry["uid"] if by_uid else number) for number, entry in matches]
+
+    def fetch(self, mailbox: list, message_set: str, items: str, by_uid: bool):
+        """Send each requested message whole; only ``BODY.PEEK[]`` leaves it unseen."""
+        items = items.upper()
+        name = "RFC822" if "RFC822" in items else "BODY[]"
+        for identifier in message_set.split(","):
+            if by_uid:
+                found = [(number, entry) for number, entry in enumerate(mailbox, 1) if entry["uid"] == int(identifier)]
+            else:
+                found = [(int(identifier), mailbox[int(identifier) - 1])]
+            for number, entry in found:
+                if "PEEK" not in items:
+                    entry["seen"] = True
+                data = entry["data"]
+                self.wfile.write(
+                    f"* {number} FETCH (UID {entry['uid']} {name} {{{len(data)}}}\r\n".encode() + data + b")\r\n"
+                )
+
+    def handle(self):
+        self.server.connections.add(self.connection)
+        try:
+            self.serve()
+        finally:
+            self.server.connections.discard(self.connection)
+
+    def serve(self):
+        self.send(f"* OK [CAPABILITY {self.capabilities()}] benchmark IMAP stub ready")
+        mailbox = None
+        reported = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, command, *args = line.decode().rstrip("\r\n").split(" ", 2) + [""]
+            command = command.upper()
+            argument = args[0]
+            by_uid = command == "UID"
+            if by_uid:
+                command, _, argument = argument.partition(" ")
+                command = command.upper()
+
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY {self.capabilities()}")
+            elif command == "LOGIN":
+                user = argument.split(" ")[0].strip('"')
+                mailbox = self.server.mailbox(user)
+                self.server.logins += 1
+            elif command in ("SELECT", "EXAMINE"):
+                self.server.latency.wait()
+                reported = len(mailbox)
+                self.send(f"* {reported} EXISTS")
+                self.send("* 0 RECENT")
+                self.send(f"* OK [UIDVALIDITY {self.server.uid_validity}] UIDs valid")
+                self.send(f"* OK [UIDNEXT {mailbox[-1]['uid'] + 1 if mailbox else 1}] Predicted next UID")
+            elif command == "SEARCH":
+                self.server.latency.wait()
+                self.send(" ".join(["* SEARCH"] + self.search(mailbox, argument, by_uid)))
+            elif command == "FETCH":
+                self.server.latency.wait()
+                message_set, _, items = argument.partition(" ")
+                self.fetch(mailbox, message_set, items, by_uid)
+            elif command == "IDLE" and self.server.idle:
+                self.server.idle_sessions += 1
+                reported = self.idle(tag, mailbox, reported)
+                continue
+            elif command == "LOGOUT":
+                self.send("* BYE logging out")
+                self.send(f"{tag} OK LOGOUT completed")
+                return
+            elif command != "NOOP":
+                self.send(f"{tag} BAD unsupported command {command}")
+                continue
+            self.send(f"{tag} OK {command} completed")
+
+
+class QuietErrorsMixin:
+    """Ignore clients hanging up mid-response instead of printing a traceback."""
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubHTTPServer(QuietErrorsMixin, ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class IMAPStubServer(QuietErrorsMixin, socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency: Latency, messages_per_mailbox: int = 10, idle: bool = True):
+        super().__init__(address, IMAPStubHandler)
+        self.latency = latency
+        self.messages_per_mailbox = messages_per_mailbox
+        self.idle = idle
+        self.idle_sessions = 0
+        self.logins = 0
+        # Clients must resync when this changes, as after a mailbox is recreated
+        self.uid_validity = int(time.time())
+        self.connections = set()
+        self._mailboxes = {}
+        self._lock = threading.Lock()
+
+    def mailbox(self, user: str) -> list:
+        with self._lock:
+            if user not in self._mailboxes:
+                self._mailboxes[user] = [
+                    {"uid": i + 1, "data": make_message(i, f"news{i % 5}@example.com").as_bytes(), "seen": False}
+                    for i in range(self.messages_per_mailbox)
+                ]
+            return self._mailboxes[user]
+
+    def deliver(self, user: str, count: int = 1):
+        """Add ``count`` unseen newsletters to a mailbox, as if they had just arrived."""
+        mailbox = self.mailbox(user)
+        with self._lock:
+            for _ in range(count):
+                index = len(mailbox)
+                mailbox.append({
+                    "uid": mailbox[-1]["uid"] + 1 if mailbox else 1,
+                    "data": make_message(index, f"news{index % 5}@example.com").as_bytes(),
+                    "seen": False
+                })
+
+    def disconnect_all(self):
+        """Drop every open client connection, as a server restart or network failure would."""
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def start_http_stub(handler, latency: Latency, port: int = 0) -> StubHTTPServer:
+    """Start an HTTP stub on 127.0.0.1 in a background thread."""
+    server = StubHTTPServer(("127.0.0.1", port), handler)
+    server.latency = latency
+    server.requests = 0
+    return _serve(server)
+
+
+def start_imap_stub(latency: Latency, messages_per_mailbox: int = 10, port: int = 0,
+                    idle: bool = True) -> IMAPStubServer:
+    """Start the IMAP stub on 127.0.0.1 in a background thread."""
+    return _serve(IMAPStubServer(("127.0.0.1", port), latency, messages_per_mailbox, idle))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark stand-in servers")
+    parser.add_argument("--openai-latency", default="lognormal:0.4:0.5")
+    parser.add_argument("--notion-latency", default="lognormal:0.2:0.4")
+    parser.add_argument("--gmail-latency", default="fixed:0.05")
+    parser.add_argument("--imap-latency", default="fixed:0.01")
+    parser.add_argument("--messages", type=int, default=10, help="Unseen messages per IMAP mailbox")
+    args = parser.parse_args()
+
+    servers = {
+        "openai": start_http_stub(OpenAIStubHandler, Latency(args.openai_latency)),
+        "notion": start_http_stub(NotionStubHandler, Latency(args.notion_latency)),
+        "gmail": start_http_stub(GmailStubHandler, Latency(args.gmail_latency)),
+        "imap": start_imap_stub(Latency(args.imap_latency), args.messages),
+    }
+    print(json.dumps({name: server.server_address[1] for name, server in servers.items()}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import io
+import threading
+
+from token_utils import count_tokens
+
+
+class TokenChunker:
+    """
+    Packs lines of text into chunks that fit a token budget.
+
+    Chunks are yielded lazily, so callers that only need the first few never
+    pay to tokenize the rest of the content. Lifetime chunk and token counts
+    are kept for tuning the budget; per-call counts come with the chunks, as
+    the chunker is shared by concurrent requests.
+    """
+
+    def __init__(self, max_tokens: int = 1000, model: str = "gpt-3.5-turbo"):
+        self.max_tokens = max_tokens
+        self.model = model
+        self._lock = threading.Lock()
+        self.total_calls = 0
+        self.total_chunks = 0
+        self.total_tokens = 0
+
+    def _split_long_line(self, line: str):
+        """Split a line over the budget into word-aligned pieces."""
+        words, used = [], 0
+        for word in line.split(" "):
+            tokens = count_tokens(word + " ", self.model)
+            if words and used + tokens > self.max_tokens:
+                yield " ".join(words), used
+                words, used = [], 0
+            words.append(word)
+            used += tokens
+        if words:
+            yield " ".join(words), used
+
+    def _pieces(self, content: str):
+        """Yield (text, token count) for each non-blank line, splitting long lines."""
+        for line in io.StringIO(content):
+            line = line.rstrip()
+            if not line.strip():
+                continue
+            tokens = count_tokens(line + "\n", self.model)
+            if tokens > self.max_tokens:
+                yield from self._split_long_line(line)
+            else:
+                yield line, tokens
+
+    def iter_chunks(self, content: str, with_tokens: bool = False):
+        """
+        Yield chunks of content, each within the token budget.
+
+        Args:
+            content (str): The text to chunk.
+            with_tokens (bool): Yield ``(chunk, tokens)`` pairs instead of bare chunks.
+
+        Yields:
+            str: The next chunk of newline-joined lines.
+        """
+        with self._lock:
+            self.total_calls += 1
+
+        lines, used = [], 0
+        for text, tokens in self._pieces(content or ""):
+            if lines and used + tokens > self.max_tokens:
+                self._record(used)
+                yield ("\n".join(lines), used) if with_tokens else "\n".join(lines)
+                lines, used = [], 0
+            lines.append(text)
+            used += tokens
+        if lines:
+            self._record(used)
+            yield ("\n".join(lines), used) if with_tokens else "\n".join(lines)
+
+    def _record(self, tokens: int):
+        with self._lock:
+            self.total_chunks += 1
+            self.total_tokens += tokens
+
+    def stats(self) -> dict:
+        """Return chunk and token counters."""
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "calls": self.total_calls,
+                "chunks": self.total_chunks,
+                "tokens": self.total_tokens,
+                "average_chunk_tokens": round(self.total_tokens / self.total_chunks, 1) if self.total_chunks else 0.0
+            }
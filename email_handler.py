@@ -2,6 +2,11 @@ import imaplib
 import email
 from email.header import decode_header
 import os
+import re
+import socket
+import sqlite3
+import threading
+import time
 from dotenv import load_dotenv
 from datetime import datetime
 import asyncio
@@ -10,23 +15,148 @@ import json
 
 load_dotenv()
 
+# Seconds to wait for the server to acknowledge IDLE or DONE
+IDLE_RESPONSE_TIMEOUT = 30
+
+EXISTS_RESPONSE = re.compile(rb"^\* (\d+) (EXISTS|EXPUNGE)", re.IGNORECASE)
+
+
+class IMAPSyncState:
+    """
+    High-water mark of processed UIDs per mailbox, kept in SQLite.
+
+    A mark is only meaningful under the UIDVALIDITY it was recorded with;
+    when the server reports another one, the mailbox's UIDs were reassigned
+    and the handler syncs it from scratch. ``backlog_until`` is the newest
+    UID when that sync started: up to it only unseen messages are processed,
+    so an interrupted first sync resumes without picking up read mail.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so importing the handler does not create the database file
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS imap_sync ("
+                "mailbox TEXT PRIMARY KEY, "
+                "uid_validity INTEGER NOT NULL, "
+                "last_uid INTEGER NOT NULL, "
+                "backlog_until INTEGER NOT NULL DEFAULT 0, "
+                "updated_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def get(self, mailbox: str):
+        """
+        Return ``(uid_validity, last_uid, backlog_until)`` for a mailbox, or
+        ``(None, 0, 0)`` if it was never synced.
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT uid_validity, last_uid, backlog_until FROM imap_sync WHERE mailbox = ?", (mailbox,)
+            ).fetchone()
+        return tuple(row) if row else (None, 0, 0)
+
+    def save(self, mailbox: str, uid_validity: int, last_uid: int, backlog_until: int = 0):
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO imap_sync (mailbox, uid_validity, last_uid, backlog_until, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (mailbox, uid_validity, last_uid, backlog_until, time.time())
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            mailboxes = self._connection().execute("SELECT COUNT(*) FROM imap_sync").fetchone()[0]
+        return {"mailboxes": mailboxes}
+
+
+_sync_state = None
+_sync_state_lock = threading.Lock()
+
+
+def get_sync_state() -> IMAPSyncState:
+    """Return the process-wide IMAP sync state stored at IMAP_SYNC_DB."""
+    global _sync_state
+    with _sync_state_lock:
+        if _sync_state is None:
+            _sync_state = IMAPSyncState(os.getenv("IMAP_SYNC_DB", "imap_sync.db"))
+        return _sync_state
+
 class EmailHandler:
     def __init__(self):
         self.email_address = os.getenv("EMAIL_ADDRESS")
         self.email_password = os.getenv("EMAIL_PASSWORD")
         self.imap_server = os.getenv("IMAP_SERVER", "imap.gmail.com")
-        self.api_endpoint = "http://localhost:8000"  # Our FastAPI endpoint
+        self.imap_port = int(os.getenv("IMAP_PORT", "993"))
+        self.imap_ssl = os.getenv("IMAP_SSL", "true").lower() == "true"
+        self.api_endpoint = os.getenv("EMAIL_API_ENDPOINT", "http://localhost:8000")  # Our FastAPI endpoint
+        # Queue emails for the background workers instead of waiting for each summary
+        self.api_async = os.getenv("EMAIL_API_ASYNC", "true").lower() == "true"
+        # Wait for new mail with IDLE, renewed well within the 30 minutes servers allow (RFC 2177)
+        self.use_idle = os.getenv("IMAP_IDLE", "true").lower() == "true"
+        self.idle_renew = float(os.getenv("IMAP_IDLE_RENEW_SECONDS", "1740"))
+        # Without IDLE, poll every IMAP_POLL_MIN_SECONDS after finding mail, backing off to IMAP_POLL_MAX_SECONDS
+        self.poll_min = float(os.getenv("IMAP_POLL_MIN_SECONDS", "30"))
+        self.poll_max = float(os.getenv("IMAP_POLL_MAX_SECONDS", "300"))
+        self.poll_interval = self.poll_min
+        self.idle_supported = None
+        self.last_found = 0
+        self.logins = 0
+        # Messages are synced by UID from a high-water mark kept per account and mailbox
+        self.sync_state = get_sync_state()
+        self._mail = None
+        self._uid_validity = None
+        self._uid_next = None
+        self._backlog_until = 0
+        self._idle_exists = 0
+        self._idle_tags = 0
+
+    @property
+    def sync_key(self):
+        """The mailbox the high-water mark is stored under"""
+        return f"{self.email_address}@{self.imap_server}/INBOX"
 
-    async def process_email_content(self, email_content, from_email):
-        """Process email content through our API"""
+    def connect(self):
+        """Open an IMAP connection, over SSL unless IMAP_SSL is false"""
+        if self.imap_ssl:
+            return imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+        return imaplib.IMAP4(self.imap_server, self.imap_port)
+
+    async def process_email_content(self, email_content, from_email, subject="", message_id=None):
+        """
+        Process email content through our API.
+
+        Raises:
+            aiohttp.ClientResponseError: If the API is overloaded or failing
+                (408, 429 or 5xx), so the message is tried again.
+            ValueError: If the API rejected the message itself.
+        """
+        payload = {
+            "subject": subject,
+            "body": email_content,
+            "sender": from_email
+        }
+        if message_id:
+            # Lets the API recognise a message it has already processed
+            payload["headers"] = {"Message-ID": message_id}
         async with aiohttp.ClientSession() as session:
             async with session.post(
-                f"{self.api_endpoint}/",
-                json={
-                    "from_email": from_email,
-                    "content": email_content
-                }
+                f"{self.api_endpoint}/api/process-email",
+                params={"async": "true"} if self.api_async else None,
+                json=payload
             ) as response:
+                if response.status in (408, 429) or response.status >= 500:
+                    response.raise_for_status()
+                if response.status >= 400:
+                    # Sending it again would get the same answer
+                    raise ValueError(f"API rejected the email ({response.status}): {await response.text()}")
                 return await response.json()
 
     def extract_email_content(self, email_message):
@@ -40,21 +170,84 @@ class EmailHandler:
             content = email_message.get_payload(decode=True).decode()
         return content
 
-    async def check_emails(self):
-        """Check for new emails and process them"""
-        try:
-            # Connect to IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server)
+    def session(self):
+        """Return the long-lived IMAP session with the inbox selected, logging in if it is not open"""
+        if self._mail is None:
+            mail = self.connect()
             mail.login(self.email_address, self.email_password)
-            mail.select("inbox")
+            # Servers may advertise more capabilities once logged in
+            _, capabilities = mail.capability()
+            self.idle_supported = b"IDLE" in capabilities[0].upper().split()
+            # Read-only: messages are fetched with BODY.PEEK[], so their read state is left to the user
+            _, data = mail.select("inbox", readonly=True)
+            self._idle_exists = int(data[0])
+            self._uid_validity = int(mail.response("UIDVALIDITY")[1][0])
+            uid_next = mail.response("UIDNEXT")[1][0]
+            self._uid_next = int(uid_next) if uid_next is not None else None
+            self._mail = mail
+            self.logins += 1
+        return self._mail
+
+    def close_session(self):
+        """Drop the IMAP session; safe to call from another thread to interrupt an IDLE"""
+        mail, self._mail = self._mail, None
+        if mail is not None:
+            try:
+                mail.shutdown()
+            except OSError:
+                pass
+
+    def _newest_uid(self, mail) -> int:
+        if self._uid_next is not None:
+            return self._uid_next - 1
+        _, data = mail.uid("SEARCH", "ALL")
+        return max((int(uid) for uid in data[0].split()), default=0)
+
+    def _new_uids(self, mail) -> list:
+        """Return the UIDs of messages past the stored high-water mark, oldest first"""
+        uid_validity, last_uid, backlog_until = self.sync_state.get(self.sync_key)
+        if uid_validity != self._uid_validity:
+            if uid_validity is not None:
+                print(f"UIDVALIDITY of {self.sync_key} changed; syncing its unseen mail again")
+            # No usable mark: the unseen mail up to the newest message is the backlog, then follow UIDs
+            last_uid, backlog_until = 0, self._newest_uid(mail)
+            self.sync_state.save(self.sync_key, self._uid_validity, last_uid, backlog_until)
+        self._backlog_until = backlog_until if backlog_until > last_uid else 0
+
+        uids = []
+        if self._backlog_until:
+            # Messages the user had read before the first sync are not processed, even when resuming
+            _, data = mail.uid("SEARCH", "UNSEEN", "UID", f"{last_uid + 1}:{self._backlog_until}")
+            uids = sorted(int(uid) for uid in data[0].split())
+            last_uid = self._backlog_until
+        _, data = mail.uid("SEARCH", "UID", f"{last_uid + 1}:*")
+        # "n:*" always matches the newest message, even when its UID is below n
+        return uids + sorted(uid for uid in (int(uid) for uid in data[0].split()) if uid > last_uid)
 
-            # Search for unread emails
-            _, messages = mail.search(None, "UNSEEN")
+    def _save_mark(self, last_uid: int):
+        self.sync_state.save(self.sync_key, self._uid_validity, last_uid, self._backlog_until)
 
-            for message_number in messages[0].split():
+    async def check_emails(self):
+        """Process messages that arrived since the last check"""
+        try:
+            try:
+                uids = self._new_uids(self.session())
+            except (imaplib.IMAP4.abort, OSError) as e:
+                # The server or network dropped the session since the last check
+                print(f"IMAP session lost, reconnecting: {str(e)}")
+                self.close_session()
+                uids = self._new_uids(self.session())
+
+            self.last_found = len(uids)
+            mail = self._mail
+            for uid in uids:
                 try:
                     # Fetch email message
-                    _, msg = mail.fetch(message_number, "(RFC822)")
+                    _, msg = mail.uid("FETCH", str(uid), "(BODY.PEEK[])")
+                    if msg[0] is None:
+                        # Expunged since the search
+                        self._save_mark(uid)
+                        continue
                     email_body = msg[0][1]
                     email_message = email.message_from_bytes(email_body)
 
@@ -64,31 +257,159 @@ class EmailHandler:
                     if "<" in from_email:
                         from_email = from_email.split("<")[1].strip(">")
 
+                    # Get subject
+                    subject_header = decode_header(email_message["Subject"] or "")[0]
+                    subject = subject_header[0].decode() if isinstance(subject_header[0], bytes) else subject_header[0]
+
                     # Extract content
                     content = self.extract_email_content(email_message)
 
                     # Process through our API
-                    result = await self.process_email_content(content, from_email)
+                    result = await self.process_email_content(
+                        content, from_email, subject, message_id=email_message["Message-ID"]
+                    )
                     print(f"Processed email from {from_email}: {result}")
 
+                except (imaplib.IMAP4.abort, OSError, aiohttp.ClientError):
+                    # Keep the mark before this message so the next check retries it
+                    raise
                 except Exception as e:
-                    print(f"Error processing message {message_number}: {str(e)}")
-                    continue
+                    print(f"Error processing message {uid}: {str(e)}")
+
+                self._save_mark(uid)
 
-            mail.logout()
+            if self._backlog_until:
+                # The unseen backlog is done; the rest of it had already been read
+                last_uid = max([self._backlog_until] + uids)
+                self._backlog_until = 0
+                self._save_mark(last_uid)
             return True
 
         except Exception as e:
+            if isinstance(e, (imaplib.IMAP4.abort, OSError)) and not isinstance(e, aiohttp.ClientError):
+                self.close_session()
             print(f"Error checking emails: {str(e)}")
             return False
 
+    def _read_idle_line(self, sock, buffer: bytearray, timeout: float) -> bytes:
+        # Read from the socket directly: a timeout on imaplib's buffered file would break it for later commands
+        deadline = time.monotonic() + timeout
+        while b"\r\n" not in buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("IMAP IDLE timed out")
+            sock.settimeout(remaining)
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise imaplib.IMAP4.abort("IMAP connection closed during IDLE")
+            buffer.extend(chunk)
+        line, _, rest = bytes(buffer).partition(b"\r\n")
+        buffer[:] = rest
+        return line
+
+    def _update_exists(self, line: bytes) -> bool:
+        """Track the mailbox size from an untagged response; returns whether it reports new mail"""
+        match = EXISTS_RESPONSE.match(line)
+        if not match:
+            return False
+        if match.group(2).upper() == b"EXPUNGE":
+            self._idle_exists = max(self._idle_exists - 1, 0)
+            return False
+        count = int(match.group(1))
+        new_mail = count > self._idle_exists
+        self._idle_exists = count
+        return new_mail
+
+    def idle(self, mail, timeout: float) -> bool:
+        """
+        Wait in IDLE until the server reports new mail or timeout seconds pass
+
+        Returns:
+            bool: Whether new mail arrived
+        """
+        self._idle_tags += 1
+        tag = b"IDLE%d" % self._idle_tags
+        sock = mail.sock
+        previous_timeout = sock.gettimeout()
+        buffer = bytearray()
+        mail.send(tag + b" IDLE\r\n")
+        line = self._read_idle_line(sock, buffer, IDLE_RESPONSE_TIMEOUT)
+        while line.startswith(b"* "):
+            self._update_exists(line)
+            line = self._read_idle_line(sock, buffer, IDLE_RESPONSE_TIMEOUT)
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace')}")
+
+        new_mail = False
+        deadline = time.monotonic() + timeout
+        while not new_mail:
+            try:
+                line = self._read_idle_line(sock, buffer, deadline - time.monotonic())
+            except socket.timeout:
+                break
+            new_mail = self._update_exists(line)
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = self._read_idle_line(sock, buffer, IDLE_RESPONSE_TIMEOUT)
+            if line.startswith(tag + b" "):
+                break
+            new_mail = self._update_exists(line) or new_mail
+        sock.settimeout(previous_timeout)
+        if not line[len(tag) + 1:].upper().startswith(b"OK"):
+            raise imaplib.IMAP4.error(f"IDLE failed: {line.decode(errors='replace')}")
+        return new_mail
+
+    def _idle_once(self) -> bool:
+        if self._mail is None:
+            # Reconnected: check once more for mail that arrived while the session was down
+            self.session()
+            return True
+        if not self.idle_supported:
+            return False
+        # New mail the server reported during the last check, which IDLE will not repeat
+        _, counts = self._mail.response("EXISTS")
+        if any(count is not None and self._update_exists(b"* " + count + b" EXISTS") for count in counts):
+            return True
+        return self.idle(self._mail, self.idle_renew)
+
+    async def wait_for_mail(self) -> bool:
+        """
+        Return when new mail may have arrived
+
+        Uses IDLE when the server supports it, returning as soon as mail arrives or
+        when the session is renewed. Otherwise, or while IDLE is failing, sleeps for an
+        interval that resets after a check found mail and doubles after one that did not.
+
+        Returns:
+            bool: Whether the server reported new mail
+        """
+        if self.use_idle and self.idle_supported is not False:
+            try:
+                new_mail = await asyncio.get_running_loop().run_in_executor(None, self._idle_once)
+                if self.idle_supported or new_mail:
+                    return new_mail
+            except (imaplib.IMAP4.error, OSError) as e:
+                print(f"IMAP IDLE failed, polling until it reconnects: {str(e)}")
+                self.close_session()
+
+        self.poll_interval = self.poll_min if self.last_found else min(self.poll_interval * 2, self.poll_max)
+        await asyncio.sleep(self.poll_interval)
+        return False
+
+    async def run(self):
+        """Check for mail, then again each time the server reports more or the poll interval passes"""
+        try:
+            while True:
+                await self.check_emails()
+                await self.wait_for_mail()
+        finally:
+            # Unblocks an IDLE still waiting in the executor
+            self.close_session()
+
 async def run_email_checker():
-    """Run the email checker periodically"""
-    handler = EmailHandler()
-    while True:
-        await handler.check_emails()
-        # Wait for 5 minutes before checking again
-        await asyncio.sleep(300)
+    """Process new mail as it arrives"""
+    await EmailHandler().run()
 
 if __name__ == "__main__":
     asyncio.run(run_email_checker())
\ No newline at end of file
@@ -0,0 +1,199 @@
+import os
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from token_utils import count_tokens
+
+# Query parameters added by email service providers and analytics tools
+TRACKING_PARAMS = re.compile(
+    r"^(utm_\w+|mc_cid|mc_eid|fbclid|gclid|dclid|msclkid|_hsenc|_hsmi|mkt_tok|oly_anon_id|oly_enc_id|"
+    r"vero_id|ck_subscriber_id|s_cid|trk|ref_src)$",
+    re.I
+)
+
+_URL = re.compile(r"https?://[^\s<>()\"']+")
+_INVISIBLE = re.compile(r"[\u200b-\u200f\u2060\ufeff\u00ad\u034f]")
+_QUOTE_HEADER = re.compile(r"^\s*(On\s.+\bwrote:|-{2,}\s*Original Message\s*-{2,}|From:\s.+\bSent:\s.+)\s*$", re.I)
+_SIGNATURE = re.compile(r"^(--|Sent from my \w+.*|Get Outlook for \w+.*)\s*$", re.I)
+_FOOTER_LINE = re.compile(
+    r"unsubscribe|manage (your )?(email )?(preferences|subscription)|update your preferences|"
+    r"you('re| are) receiving this|you received this (email|message)|no longer (wish|want) to receive|"
+    r"all rights reserved|^\s*(©|\(c\)|copyright)\s|privacy policy|view (this email )?in (your )?browser|"
+    r"view (it )?online|forwarded this email\?|add us to your address book",
+    re.I
+)
+# Lines shorter than this (addresses, company names) may sit between footer lines
+_FOOTER_MAX_PLAIN_LINE = 80
+
+
+def _is_footer_line(key: str) -> bool:
+    return len(key) < 300 and bool(_FOOTER_LINE.search(key))
+
+
+def _is_footer_paragraph(lines: list) -> bool:
+    """Whether most lines of a paragraph are footer lines and the rest are short"""
+    keys = [line.strip().lower() for line in lines if line.strip()]
+    footer = sum(1 for key in keys if _is_footer_line(key))
+    plain_short = all(len(key) < _FOOTER_MAX_PLAIN_LINE for key in keys if not _is_footer_line(key))
+    return footer * 2 > len(keys) and plain_short
+
+
+def shorten_url(url: str, max_length: int = 80) -> str:
+    """
+    Drop tracking parameters from a URL and truncate what is still too long.
+
+    Args:
+        url (str): The URL to shorten.
+        max_length (int): URLs longer than this are cut down to host and path.
+
+    Returns:
+        str: The shortened URL.
+    """
+    trailing = ""
+    while url and url[-1] in ".,;:!?":
+        trailing = url[-1] + trailing
+        url = url[:-1]
+    try:
+        parts = urlsplit(url)
+        query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k)]
+        url = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+    except ValueError:
+        return url + trailing
+    if len(url) > max_length:
+        # Redirect and click-tracking links carry nothing a summary needs past the host
+        path = parts.path if len(parts.netloc) + len(parts.path) + 8 <= max_length else "/..."
+        url = f"{parts.scheme}://{parts.netloc}{path}"
+    return url + trailing
+
+
+class EmailPreprocessor:
+    """
+    Cleans email bodies before they are pasted into a prompt.
+
+    Whitespace and invisible characters are normalized, tracking links
+    shortened, and quoted replies, signatures, the "view in browser" header,
+    the footer paragraphs and repeated boilerplate removed. Token counts
+    before and after are kept for each email so the saving can be monitored.
+    """
+
+    def __init__(self, max_url_length: int = 80, model: str = "gpt-3.5-turbo"):
+        self.max_url_length = max_url_length
+        self.model = model
+        self._lock = threading.Lock()
+        self.emails = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.last_tokens_before = 0
+        self.last_tokens_after = 0
+
+    def _strip_quoted(self, lines: list) -> list:
+        kept = []
+        for line in lines:
+            if _QUOTE_HEADER.match(line):
+                # Everything after a reply header is the earlier thread
+                break
+            if line.lstrip().startswith(">"):
+                continue
+            kept.append(line)
+        return kept
+
+    def _strip_signature(self, lines: list) -> list:
+        for index in range(len(lines) - 1, max(len(lines) - 15, 0) - 1, -1):
+            if _SIGNATURE.match(lines[index].rstrip()):
+                return lines[:index]
+        return lines
+
+    def _strip_footer(self, lines: list) -> list:
+        # Footer phrases inside the body are content ("manage your subscription in Settings"),
+        # so only whole paragraphs at the edges are cut: the footer and a "view in browser" header
+        paragraphs, start = [], 0
+        for index, line in enumerate(lines + [""]):
+            if not line.strip():
+                if index > start:
+                    paragraphs.append((start, index))
+                start = index + 1
+        end = len(lines)
+        while paragraphs and _is_footer_paragraph(lines[paragraphs[-1][0]:paragraphs[-1][1]]):
+            end = paragraphs.pop()[0]
+        begin = 0
+        if paragraphs and _is_footer_paragraph(lines[paragraphs[0][0]:paragraphs[0][1]]):
+            begin = paragraphs[0][1]
+        return lines[begin:end]
+
+    def _strip_boilerplate(self, lines: list) -> list:
+        kept, seen = [], set()
+        for line in lines:
+            key = line.strip().lower()
+            if len(key) >= 20:
+                # Repeated headers, sponsor blurbs and disclaimers only need saying once
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(line)
+        return kept
+
+    def clean(self, body: str) -> str:
+        """
+        Return the body with prompt-irrelevant content removed.
+
+        Args:
+            body (str): The raw email body.
+
+        Returns:
+            str: The cleaned body.
+        """
+        if not body:
+            return ""
+        text = _INVISIBLE.sub("", body.replace("\r\n", "\n").replace("\r", "\n"))
+        text = _URL.sub(lambda match: shorten_url(match.group(0), self.max_url_length), text)
+
+        lines = [re.sub(r"[ \t\xa0]+", " ", line).rstrip() for line in text.split("\n")]
+        lines = self._strip_quoted(lines)
+        lines = self._strip_signature(lines)
+        lines = self._strip_footer(lines)
+        lines = self._strip_boilerplate(lines)
+
+        cleaned = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+        # Never hand the LLM an empty prompt because every line looked like boilerplate
+        return cleaned or body.strip()
+
+    def process(self, body: str) -> str:
+        """Clean the body and record its token reduction."""
+        cleaned = self.clean(body)
+        before = count_tokens(body or "", self.model)
+        after = count_tokens(cleaned, self.model)
+        with self._lock:
+            self.emails += 1
+            self.tokens_before += before
+            self.tokens_after += after
+            self.last_tokens_before = before
+            self.last_tokens_after = after
+        return cleaned
+
+    def stats(self) -> dict:
+        """Return lifetime and last-email token counts."""
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "emails": self.emails,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "reduction_ratio": round(saved / self.tokens_before, 4) if self.tokens_before else 0.0,
+                "last_tokens_before": self.last_tokens_before,
+                "last_tokens_after": self.last_tokens_after
+            }
+
+
+_preprocessor = None
+_preprocessor_lock = threading.Lock()
+
+
+def get_email_preprocessor() -> EmailPreprocessor:
+    """Return the process-wide preprocessor configured from the environment."""
+    global _preprocessor
+    with _preprocessor_lock:
+        if _preprocessor is None:
+            _preprocessor = EmailPreprocessor(max_url_length=int(os.getenv("PREPROCESS_MAX_URL_LENGTH", "80")))
+        return _preprocessor
@@ -1,13 +1,29 @@
 import os
+import metrics
 from openai import OpenAI
 from dotenv import load_dotenv
 from email_auth import EmailAuth
+from email_preprocessor import get_email_preprocessor
+from model_router import get_model_router
+from openai_completions import complete_once
+from rate_limiter import get_openai_rate_limiter
+from resilience import get_openai_retry_policy, is_transient_error, CircuitOpenError
+from token_utils import count_tokens
 
 class EmailProcessor:
     def __init__(self):
         """Initialize the email processor"""
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.rate_limiter = get_openai_rate_limiter()
+        self.retry_policy = get_openai_retry_policy()
+        self.preprocessor = get_email_preprocessor()
+        self.model_router = get_model_router()
+        # Retries are handled by the shared retry policy
+        self.client = OpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            http_client=self.rate_limiter.http_client(),
+            max_retries=0
+        )
         self.test_mode = os.getenv('TEST_MODE', 'False').lower() == 'true'
         self.email_auth = EmailAuth()
 
@@ -36,15 +52,24 @@ class EmailProcessor:
             }
 
         try:
+            with metrics.stage("preprocessing"):
+                body = self.preprocessor.process(body)
+
             # Use OpenAI to analyze the email
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an email analysis assistant. Analyze the email and provide a summary, action items, and priority level."},
-                    {"role": "user", "content": f"Subject: {subject}\n\nBody: {body}\n\nSender: {sender}\n\nAttachments: {', '.join([att['filename'] for att in attachments]) if attachments else 'None'}"}
-                ],
-                max_tokens=200
-            )
+            prompt = f"Subject: {subject}\n\nBody: {body}\n\nSender: {sender}\n\nAttachments: {', '.join([att['filename'] for att in attachments]) if attachments else 'None'}"
+            model = self.model_router.route("email_analysis", count_tokens(prompt, self.model_router.small_model))
+
+            # Retry transient failures; fail fast while the circuit breaker is open
+            with metrics.stage("summarization"), self.model_router.measure("email_analysis", model):
+                response = self.retry_policy.call(
+                    complete_once, self.client, self.rate_limiter, self.retry_policy.attempt_timeout,
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "You are an email analysis assistant. Analyze the email and provide a summary, action items, and priority level."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=200
+                )
 
             # Parse the response
             analysis = response.choices[0].message.content
@@ -65,22 +90,28 @@ class EmailProcessor:
             # Check if the error is due to insufficient quota
             if "insufficient_quota" in str(e):
                 print("OpenAI quota exceeded. Falling back to basic processing.")
-                # Return basic email info without OpenAI analysis
-                return {
-                    'subject': subject,
-                    'summary': 'Analysis skipped due to OpenAI quota limits.',
-                    'action_items': [],
-                    'priority': 'Unknown',
-                    'sender': sender,
-                    'has_attachments': len(attachments) > 0,
-                    'attachments': [att['filename'] for att in attachments] if attachments else []
-                }
+                return self._basic_result(subject, sender, attachments, 'Analysis skipped due to OpenAI quota limits.')
+            elif isinstance(e, CircuitOpenError) or is_transient_error(e):
+                print("OpenAI unavailable. Falling back to basic processing.")
+                return self._basic_result(subject, sender, attachments, 'Analysis skipped because OpenAI is unavailable.')
             else:
                 # Re-raise other exceptions
                 raise
 
-    def get_recent_emails(self, max_results=10):
-        """Get and process recent emails"""
+    def _basic_result(self, subject, sender, attachments, summary):
+        """Return basic email info without OpenAI analysis"""
+        return {
+            'subject': subject,
+            'summary': summary,
+            'action_items': [],
+            'priority': 'Unknown',
+            'sender': sender,
+            'has_attachments': len(attachments) > 0,
+            'attachments': [att['filename'] for att in attachments] if attachments else []
+        }
+
+    def get_recent_emails(self, max_results=10, job_manager=None, kind=None):
+        """Get and process recent emails, recording each as a job of ``kind`` when a job manager is given"""
         try:
             # Get emails using Gmail API
             emails = self.email_auth.get_emails(max_results)
@@ -89,7 +120,10 @@ class EmailProcessor:
             processed_emails = []
             for email in emails:
                 try:
-                    processed = self.process_email(email)
+                    if job_manager is not None:
+                        processed = job_manager.run_inline(kind, email)
+                    else:
+                        processed = self.process_email(email)
                     processed_emails.append(processed)
                 except Exception as e:
                     print(f"Error processing email {email.get('id', 'unknown')}: {str(e)}")
@@ -101,6 +135,12 @@ class EmailProcessor:
             print(f"Error getting recent emails: {str(e)}")
             raise
 
+    def enqueue_recent_emails(self, job_manager, kind, max_results=10):
+        """Queue one job per recent email for background workers and return the jobs"""
+        emails = self.email_auth.get_emails(max_results)
+        # Keyed by Gmail message ID so polling again does not queue the same email twice
+        return [job_manager.submit(kind, email, job_id=f"gmail-{email['id']}") for email in emails]
+
     def _extract_action_items(self, analysis):
         """Extract action items from the analysis"""
         # Simple implementation - can be enhanced
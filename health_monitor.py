@@ -0,0 +1,93 @@
+import asyncio
+import time
+from datetime import datetime
+
+
+class HealthMonitor:
+    """
+    Runs dependency checks in the background and serves the cached results.
+
+    Each check is an async callable returning a dict with at least ``status``
+    (``"connected"`` when healthy) and ``message``. Probes read the cached
+    results instead of calling the upstream services themselves.
+    """
+
+    def __init__(self, checks: dict, interval: float = 60, timeout: float = 10):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.results = {}
+        self.last_checked = None
+        self._checked_monotonic = None
+        self._task = None
+        self._refresh_lock = None
+
+    async def _run_check(self, name, check):
+        try:
+            return await asyncio.wait_for(check(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return {"status": "error", "message": f"{name} check timed out after {self.timeout}s"}
+        except Exception as e:
+            return {"status": "error", "message": f"{name} check failed: {str(e)}"}
+
+    async def refresh(self):
+        """Run every check concurrently and store the results."""
+        names = list(self.checks)
+        results = await asyncio.gather(*[self._run_check(name, self.checks[name]) for name in names])
+        self.results = dict(zip(names, results))
+        self.last_checked = datetime.now().isoformat()
+        self._checked_monotonic = time.monotonic()
+        return self.results
+
+    async def ensure_checked(self):
+        """Run the checks once if no result has been cached yet."""
+        if self._checked_monotonic is not None:
+            return
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if self._checked_monotonic is None:
+                await self.refresh()
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start refreshing the checks every ``interval`` seconds."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background refresh task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def age_seconds(self):
+        """Seconds since the last completed check, or None if never checked."""
+        if self._checked_monotonic is None:
+            return None
+        return round(time.monotonic() - self._checked_monotonic, 3)
+
+    @property
+    def ready(self) -> bool:
+        """Whether every check passed on the last run."""
+        return bool(self.results) and all(
+            result["status"] in ("connected", "skipped") for result in self.results.values()
+        )
+
+    def snapshot(self) -> dict:
+        """Return the cached results with the age of the last check."""
+        return {
+            "checks": self.results,
+            "last_checked": self.last_checked,
+            "age_seconds": self.age_seconds,
+            "interval_seconds": self.interval
+        }
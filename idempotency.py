@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import weakref
+
+# Request header carrying the caller's idempotency key
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+# Response header marking a stored or joined result instead of a fresh one
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Seconds between sweeps of expired keys
+PURGE_INTERVAL = 60
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"Idempotency key {key!r} was already used for a different request")
+
+
+class _Abandoned(Exception):
+    """Set on an in-flight future whose request was cancelled, so duplicates run the work themselves."""
+
+
+def idempotency_key(headers, email_headers: dict = None):
+    """
+    Return the idempotency key for a request, if it has one.
+
+    The ``Idempotency-Key`` header wins; otherwise the email's ``Message-ID``
+    is used, so retried webhooks for the same email match without the caller
+    sending a key.
+
+    Args:
+        headers: The HTTP request headers.
+        email_headers (dict): The email's own headers, if supplied.
+
+    Returns:
+        str: The key, or None when the request cannot be deduplicated.
+    """
+    key = headers.get(IDEMPOTENCY_KEY_HEADER)
+    if not key and email_headers:
+        key = next((value for name, value in email_headers.items() if name.lower() == "message-id"), None)
+    return (key or "").strip() or None
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Hash a request payload so reuse of a key for a different request can be detected."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Runs each idempotency key's work once and replays its result.
+
+    Finished results are kept in SQLite for ``ttl`` seconds, so retries after
+    a restart or on another worker get the stored result. While a key is
+    being processed, duplicates in the same process await the same result;
+    duplicates in other processes see the pending claim and poll until the
+    result is stored. A claim left by a crashed worker expires after
+    ``lock_timeout`` seconds. Failures are not stored, so a retry after an
+    error runs the work again.
+    """
+
+    def __init__(self, db_path: str, ttl: float = 86400, lock_timeout: float = 300, poll_interval: float = 0.25):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_purge = 0.0
+        # Futures are bound to their event loop, so in-flight work is tracked per loop
+        self._in_flight = weakref.WeakKeyDictionary()
+        self.processed = 0
+        self.replayed = 0
+        self.joined = 0
+        self.conflicts = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so importing the app does not create the database file
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency ("
+                "key TEXT PRIMARY KEY, "
+                "fingerprint TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "response TEXT, "
+                "expires_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _claim(self, key: str, fingerprint: str):
+        """Return ``("claimed", None)``, ``("pending", None)``, ``("done", response)`` or ``("conflict", None)``."""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if now - self._last_purge > PURGE_INTERVAL:
+                    db.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+                    self._last_purge = now
+                row = db.execute(
+                    "SELECT fingerprint, status, response, expires_at FROM idempotency WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[3] <= now:
+                    db.execute(
+                        "INSERT OR REPLACE INTO idempotency (key, fingerprint, status, response, expires_at) "
+                        "VALUES (?, ?, 'pending', NULL, ?)",
+                        (key, fingerprint, now + self.lock_timeout)
+                    )
+                    claim = "claimed", None
+                elif row[0] != fingerprint:
+                    claim = "conflict", None
+                elif row[1] == "done":
+                    claim = "done", json.loads(row[2])
+                else:
+                    claim = "pending", None
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return claim
+
+    def _complete(self, key: str, response):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE idempotency SET status = 'done', response = ?, expires_at = ? WHERE key = ?",
+                (json.dumps(response), time.time() + self.ttl, key)
+            )
+
+    def _release(self, key: str):
+        with self._lock:
+            self._connection().execute("DELETE FROM idempotency WHERE key = ? AND status = 'pending'", (key,))
+
+    async def run(self, key: str, fingerprint: str, func):
+        """
+        Return the result for a key, running ``func`` only if no result exists.
+
+        Args:
+            key (str): The idempotency key.
+            fingerprint (str): Hash of the request, from ``request_fingerprint``.
+            func: Coroutine function producing a JSON-serializable result.
+
+        Returns:
+            tuple: The result, and whether it was replayed rather than produced by this call.
+
+        Raises:
+            IdempotencyConflict: If the key was used for a request with a different fingerprint.
+        """
+        in_flight = self._in_flight.setdefault(asyncio.get_running_loop(), {})
+        while True:
+            if key in in_flight:
+                running_fingerprint, future = in_flight[key]
+                if running_fingerprint != fingerprint:
+                    self.conflicts += 1
+                    raise IdempotencyConflict(key)
+                self.joined += 1
+                try:
+                    # Shield so a duplicate disconnecting does not cancel the original request
+                    return await asyncio.shield(future), True
+                except _Abandoned:
+                    # The original request was cancelled and released its claim; claim the key again
+                    continue
+
+            # SQLite may wait on another worker's lock, so it is kept off the event loop
+            claiming = asyncio.ensure_future(asyncio.to_thread(self._claim, key, fingerprint))
+            try:
+                state, response = await asyncio.shield(claiming)
+            except asyncio.CancelledError:
+                # The claim still lands in its thread; give it back rather than leave duplicates waiting on it
+                if (await claiming)[0] == "claimed":
+                    await asyncio.to_thread(self._release, key)
+                raise
+            if state == "conflict":
+                self.conflicts += 1
+                raise IdempotencyConflict(key)
+            if state == "done":
+                self.replayed += 1
+                return response, True
+            if state == "claimed":
+                break
+            # Another worker is processing the key
+            await asyncio.sleep(self.poll_interval)
+
+        future = asyncio.get_running_loop().create_future()
+        in_flight[key] = (fingerprint, future)
+        self.processed += 1
+        try:
+            response = await func()
+        except BaseException as e:
+            try:
+                await asyncio.to_thread(self._release, key)
+            finally:
+                # A cancelled request is not a result of the work, so duplicates retry instead of failing with it
+                future.set_exception(_Abandoned() if isinstance(e, asyncio.CancelledError) else e)
+                # Mark the exception retrieved; there may be no duplicates waiting on it
+                future.exception()
+            raise
+        else:
+            try:
+                await asyncio.to_thread(self._complete, key, response)
+            finally:
+                # Duplicates get the result even if storing it was interrupted
+                future.set_result(response)
+            return response, False
+        finally:
+            in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stored = self._connection().execute(
+                "SELECT COUNT(*) FROM idempotency WHERE status = 'done' AND expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        return {
+            "processed": self.processed,
+            "replayed": self.replayed,
+            "joined": self.joined,
+            "conflicts": self.conflicts,
+            "in_flight": sum(len(keys) for keys in list(self._in_flight.values())),
+            "stored": stored
+        }
@@ -0,0 +1,688 @@
+import asyncio
+import inspect
+import ipaddress
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import httpx
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+# Terminal failure: the job exhausted its attempts or failed permanently, and is kept as a dead letter
+FAILED = "failed"
+
+# Seconds between sweeps of expired finished jobs
+PURGE_INTERVAL = 60
+
+
+class JobQueueFull(Exception):
+    """Raised by ``enqueue`` when ``max_pending`` jobs are already queued or running."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        super().__init__(f"Job queue is full ({max_pending} jobs pending); retry shortly")
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying the job cannot succeed."""
+
+
+def callback_allowed_hosts() -> set:
+    """Hosts from ``JOB_CALLBACK_ALLOWED_HOSTS`` that callbacks may reach even on internal addresses."""
+    return {host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+
+def validate_callback_url(url: str):
+    """
+    Raise ValueError unless url is an absolute http(s) URL on a public address.
+
+    Callbacks are POSTed by the server, so a host that resolves to a
+    loopback, link-local or private address is rejected unless it is listed
+    in ``JOB_CALLBACK_ALLOWED_HOSTS``.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid callback URL: {url!r}")
+    host = parts.hostname.lower()
+    if host in callback_allowed_hosts():
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValueError(f"Callback host {host!r} does not resolve")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"Callback host {host!r} resolves to the non-public address {ip}")
+
+
+def job_error(e: Exception) -> dict:
+    """Describe a failed job the way the API reports errors: a status code and detail."""
+    return {"status_code": getattr(e, "status_code", 500), "detail": getattr(e, "detail", None) or str(e)}
+
+
+def is_permanent_error(e: Exception) -> bool:
+    """Whether a handler error should dead-letter the job at once instead of being retried."""
+    if isinstance(e, (PermanentJobError, ValueError)):
+        return True
+    status_code = getattr(e, "status_code", None)
+    # Client errors other than timeouts, conflicts and rate limits will fail the same way again
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in (408, 409, 429)
+
+
+class JobQueue:
+    """
+    Durable queue of background jobs, shared by every process using the same SQLite file.
+
+    A claimed job is invisible to other consumers for ``visibility_timeout``
+    seconds; the consumer extends the claim while it works, so a job held by
+    a process that died becomes visible again and is picked up elsewhere.
+    Each claim carries a token, and only the current holder can finish the
+    job. Failed jobs are retried with jittered exponential backoff; jobs that
+    fail permanently or use up ``max_attempts`` claims are kept as ``failed``
+    dead letters. Succeeded jobs are deleted ``ttl`` seconds after finishing.
+    """
+
+    def __init__(self, db_path: str, visibility_timeout: float = 300, max_attempts: int = 5,
+                 base_delay: float = 2, max_delay: float = 300, ttl: float = 3600, max_pending: int = 1000):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_purge = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so importing the app does not create the database file
+        if self._db is None:
+            # Several worker processes write to the file, so wait out their locks
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, "
+                "kind TEXT NOT NULL, "
+                "payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, "
+                "available_at REAL NOT NULL, "
+                "claim_token TEXT, "
+                "claimed_until REAL, "
+                "started_at REAL, "
+                "finished_at REAL, "
+                "result TEXT, "
+                "error TEXT, "
+                "callback_url TEXT, "
+                "callback_status TEXT, "
+                "callback_attempts INTEGER NOT NULL DEFAULT 0, "
+                "callback_available_at REAL, "
+                "callback_error TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, available_at)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_callbacks_due ON jobs (callback_status, callback_available_at)"
+            )
+        return self._db
+
+    def _transaction(self, work):
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(db)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            return result
+
+    def _peek(self, query: str, params: tuple) -> bool:
+        # Idle consumers poll often; a plain read lets them skip the write lock when nothing is due
+        with self._lock:
+            return self._connection().execute(query, params).fetchone() is not None
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def enqueue(self, kind: str, payload: dict, callback_url: str = None, job_id: str = None) -> str:
+        """
+        Store a job for a consumer of ``kind``.
+
+        Args:
+            kind (str): The handler that runs the job.
+            payload (dict): JSON-serializable arguments for the handler.
+            callback_url (str): Optional URL to POST the finished job to.
+            job_id (str): Optional ID; enqueuing an ID that already exists
+                returns it without adding a second job.
+
+        Returns:
+            str: The job ID.
+
+        Raises:
+            JobQueueFull: If ``max_pending`` jobs are already queued or running.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+
+        def insert(db):
+            if db.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone():
+                return job_id
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFull(self.max_pending)
+            db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, available_at, callback_url) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, now, now, callback_url)
+            )
+            return job_id
+
+        return self._transaction(insert)
+
+    def enqueue_claimed(self, kind: str, payload: dict):
+        """
+        Store a job already claimed by the caller, for work run while a client waits.
+
+        Returns:
+            tuple: ``(id, claim_token)``.
+
+        Raises:
+            JobQueueFull: If ``max_pending`` jobs are already queued or running.
+        """
+        job_id, token = uuid.uuid4().hex, uuid.uuid4().hex
+        now = time.time()
+
+        def insert(db):
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFull(self.max_pending)
+            db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, attempts, created_at, available_at, claim_token, "
+                "claimed_until, started_at) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), RUNNING, now, now, token, now + self.visibility_timeout, now)
+            )
+            return job_id, token
+
+        return self._transaction(insert)
+
+    def claim(self, kinds: list):
+        """
+        Claim the oldest due job of one of ``kinds``.
+
+        Jobs whose claim expired are reclaimed; one that has already been
+        claimed ``max_attempts`` times is dead-lettered instead, so a job that
+        crashes its worker cannot loop forever.
+
+        Returns:
+            tuple: ``(id, kind, payload, attempts, claim_token)``, or None when nothing is due.
+        """
+        if not kinds:
+            return None
+        now = time.time()
+        placeholders = ", ".join("?" for _ in kinds)
+        due = (
+            f"SELECT id, kind, payload, attempts, status FROM jobs WHERE kind IN ({placeholders}) AND "
+            "((status = ? AND available_at <= ?) OR (status = ? AND claimed_until <= ?)) "
+            "ORDER BY available_at LIMIT 1"
+        )
+        if now - self._last_purge <= PURGE_INTERVAL and not self._peek(due, (*kinds, QUEUED, now, RUNNING, now)):
+            return None
+
+        def take(db):
+            if now - self._last_purge > PURGE_INTERVAL:
+                db.execute(
+                    "DELETE FROM jobs WHERE status = ? AND finished_at <= ? "
+                    "AND (callback_status IS NULL OR callback_status IN ('delivered', 'failed'))",
+                    (SUCCEEDED, now - self.ttl)
+                )
+                self._last_purge = now
+            while True:
+                row = db.execute(due, (*kinds, QUEUED, now, RUNNING, now)).fetchone()
+                if row is None:
+                    return None
+                job_id, kind, payload, attempts, status = row
+                if status == RUNNING and attempts >= self.max_attempts:
+                    self._dead_letter(db, job_id, {"status_code": 500, "detail": "Worker lost the job too many times"})
+                    continue
+                token = uuid.uuid4().hex
+                db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, claim_token = ?, claimed_until = ?, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (RUNNING, token, now + self.visibility_timeout, now, job_id)
+                )
+                return job_id, kind, json.loads(payload), attempts + 1, token
+
+        return self._transaction(take)
+
+    def extend(self, job_id: str, token: str) -> bool:
+        """Push back the claim's expiry while the job is still being worked on."""
+        with self._lock:
+            cursor = self._connection().execute(
+                "UPDATE jobs SET claimed_until = ? WHERE id = ? AND claim_token = ? AND status = ?",
+                (time.time() + self.visibility_timeout, job_id, token, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def _finished(self, db, job_id: str, status: str, result=None, error: dict = None):
+        now = time.time()
+        db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, claim_token = NULL, "
+            "claimed_until = NULL, callback_status = CASE WHEN callback_url IS NULL THEN NULL ELSE 'pending' END, "
+            "callback_available_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None,
+             json.dumps(error) if error is not None else None, now, now, job_id)
+        )
+
+    def _dead_letter(self, db, job_id: str, error: dict):
+        self._finished(db, job_id, FAILED, error=error)
+
+    def complete(self, job_id: str, token: str, result) -> bool:
+        """Store a job's result; returns False if the claim was lost to another consumer."""
+        def finish(db):
+            if not self._holds(db, job_id, token):
+                return False
+            self._finished(db, job_id, SUCCEEDED, result=result)
+            return True
+
+        return self._transaction(finish)
+
+    def fail(self, job_id: str, token: str, attempts: int, error: dict, permanent: bool = False) -> bool:
+        """Schedule a retry with backoff, or dead-letter the job; returns False if the claim was lost."""
+        def record(db):
+            if not self._holds(db, job_id, token):
+                return False
+            if permanent or attempts >= self.max_attempts:
+                self._dead_letter(db, job_id, error)
+            else:
+                db.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, error = ?, claim_token = NULL, "
+                    "claimed_until = NULL WHERE id = ?",
+                    (QUEUED, time.time() + self._backoff(attempts), json.dumps(error), job_id)
+                )
+            return True
+
+        return self._transaction(record)
+
+    def release(self, job_id: str, token: str):
+        """Hand back a job the consumer is abandoning (e.g. on shutdown) without using up an attempt."""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET status = ?, available_at = ?, attempts = MAX(attempts - 1, 0), "
+                "claim_token = NULL, claimed_until = NULL WHERE id = ? AND claim_token = ?",
+                (QUEUED, time.time(), job_id, token)
+            )
+
+    def discard(self, job_id: str, token: str):
+        """Delete a claimed job whose failure was already reported to a waiting client."""
+        with self._lock:
+            self._connection().execute("DELETE FROM jobs WHERE id = ? AND claim_token = ?", (job_id, token))
+
+    def _holds(self, db, job_id: str, token: str) -> bool:
+        row = db.execute("SELECT claim_token FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] == token
+
+    def claim_callback(self, timeout: float):
+        """
+        Claim the oldest finished job whose callback is due.
+
+        Returns:
+            tuple: ``(id, callback_url, callback_attempts)``, or None when nothing is due.
+        """
+        now = time.time()
+        due = (
+            "SELECT id, callback_url, callback_attempts FROM jobs "
+            "WHERE callback_status IN ('pending', 'delivering') AND callback_available_at <= ? "
+            "ORDER BY callback_available_at LIMIT 1"
+        )
+        if not self._peek(due, (now,)):
+            return None
+
+        def take(db):
+            row = db.execute(due, (now,)).fetchone()
+            if row is not None:
+                # A consumer that dies mid-delivery leaves the callback to be retried after the timeout
+                db.execute(
+                    "UPDATE jobs SET callback_status = 'delivering', callback_available_at = ? WHERE id = ?",
+                    (now + timeout * 2, row[0])
+                )
+            return row
+
+        return self._transaction(take)
+
+    def callback_delivered(self, job_id: str):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET callback_status = 'delivered', callback_attempts = callback_attempts + 1, "
+                "callback_error = NULL WHERE id = ?",
+                (job_id,)
+            )
+
+    def callback_failed(self, job_id: str, attempts: int, error: str, max_attempts: int):
+        attempts += 1
+        status = "failed" if attempts >= max_attempts else "pending"
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET callback_status = ?, callback_attempts = ?, callback_available_at = ?, "
+                "callback_error = ? WHERE id = ?",
+                (status, attempts, time.time() + self._backoff(attempts), error[:500], job_id)
+            )
+
+    def get(self, job_id: str):
+        """Return a job as served by the API, or None if it is unknown or has expired."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT id, kind, status, attempts, created_at, started_at, finished_at, result, error, "
+                "callback_status, callback_attempts, callback_error FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "attempts": row[3],
+            "created_at": row[4],
+            "started_at": row[5],
+            "finished_at": row[6],
+            "result": json.loads(row[7]) if row[7] is not None else None,
+            # The last error is kept while a retry is pending
+            "error": json.loads(row[8]) if row[8] is not None else None,
+            "callback": None
+        }
+        if row[9] is not None:
+            job["callback"] = {"status": row[9], "attempts": row[10]}
+            if row[11]:
+                job["callback"]["error"] = row[11]
+        return job
+
+    def requeue_failed(self, kinds: list = None) -> int:
+        """Move dead-lettered jobs back to the queue with fresh attempts; returns how many."""
+        now = time.time()
+        query = ("UPDATE jobs SET status = ?, attempts = 0, available_at = ?, finished_at = NULL, "
+                 "callback_status = NULL WHERE status = ?")
+        params = [QUEUED, now, FAILED]
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        with self._lock:
+            return self._connection().execute(query, params).rowcount
+
+    def stats(self) -> dict:
+        """Return job counts by status and the age of the oldest queued job."""
+        now = time.time()
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT status, COUNT(*), MIN(created_at) FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = {status: count for status, count, _ in rows}
+        oldest = [created_at for status, _, created_at in rows if status == QUEUED]
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "succeeded": counts.get(SUCCEEDED, 0),
+            "failed": counts.get(FAILED, 0),
+            "oldest_queued_age_seconds": round(now - min(oldest), 3) if oldest else None
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue configured from the environment."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                db_path=os.getenv("JOB_QUEUE_DB", "jobs.db"),
+                visibility_timeout=float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300")),
+                max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5")),
+                ttl=float(os.getenv("JOB_TTL", "3600")),
+                max_pending=int(os.getenv("JOB_MAX_PENDING", "1000"))
+            )
+        return _queue
+
+
+class JobManager:
+    """
+    Submits jobs to a ``JobQueue`` and consumes the kinds it has handlers for.
+
+    Handlers take the job payload and return a JSON-serializable result;
+    coroutine handlers run on the event loop, plain ones on the loop's
+    default thread pool. Consumers also deliver callbacks for finished jobs,
+    with up to ``callback_attempts`` tries. Any process with handlers can
+    consume, so the API apps and ``worker.py`` processes share the work.
+    """
+
+    def __init__(self, queue: JobQueue, poll_interval: float = 0.5, callback_attempts: int = 5,
+                 callback_timeout: float = 10, max_poll_interval: float = None):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        # Idle consumers back off up to this, so an empty queue is not polled twice a second per task
+        self.max_poll_interval = max(poll_interval, max_poll_interval or poll_interval * 10)
+        self.callback_attempts = callback_attempts
+        self.callback_timeout = callback_timeout
+        self.handlers = {}
+        self._tasks = []
+        self._stopping = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+
+    def register(self, kind: str, handler):
+        """Consume jobs of ``kind`` with handler."""
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, payload: dict, callback_url: str = None, job_id: str = None) -> dict:
+        """
+        Queue a job and return it as served by the API.
+
+        Raises:
+            ValueError: If callback_url is not an http(s) URL.
+            JobQueueFull: If the queue is at its pending limit.
+        """
+        if callback_url:
+            validate_callback_url(callback_url)
+        return self.queue.get(self.queue.enqueue(kind, payload, callback_url=callback_url, job_id=job_id))
+
+    def get(self, job_id: str):
+        return self.queue.get(job_id)
+
+    def run_inline(self, kind: str, payload: dict):
+        """
+        Record a job and run it in the calling thread, for a client waiting on the result.
+
+        The job is claimed as it is stored, so it does not wait behind queued
+        work and the caller gets the handler's own errors; failed jobs are
+        dropped rather than retried. If the process dies while it runs, the
+        claim expires and a consumer retries the job.
+
+        Raises:
+            JobQueueFull: If the queue is at its pending limit.
+        """
+        job_id, token = self.queue.enqueue_claimed(kind, payload)
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.queue.visibility_timeout / 3):
+                self.queue.extend(job_id, token)
+
+        threading.Thread(target=heartbeat, name=f"job-{job_id}-heartbeat", daemon=True).start()
+        try:
+            result = self.handlers[kind](payload)
+        except Exception:
+            self.errors += 1
+            # The caller has the error and decides whether to retry; a dead letter could be requeued behind its back
+            self.queue.discard(job_id, token)
+            raise
+        else:
+            self.processed += 1
+            self.queue.complete(job_id, token, result)
+            return result
+        finally:
+            done.set()
+
+    async def run_inline_async(self, kind: str, payload: dict):
+        """
+        Async version of ``run_inline``; coroutine handlers run on the event loop.
+
+        Queue reads and writes run in worker threads, as SQLite may wait on
+        another process's lock.
+        """
+        job_id, token = await asyncio.to_thread(self.queue.enqueue_claimed, kind, payload)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, token))
+        try:
+            result = await self._call(self.handlers[kind], payload)
+        except asyncio.CancelledError:
+            # The client went away; hand the job to a consumer instead of losing it
+            await asyncio.to_thread(self.queue.release, job_id, token)
+            raise
+        except Exception:
+            self.errors += 1
+            await asyncio.to_thread(self.queue.discard, job_id, token)
+            raise
+        else:
+            self.processed += 1
+            await asyncio.to_thread(self.queue.complete, job_id, token, result)
+            return result
+        finally:
+            heartbeat.cancel()
+
+    async def _call(self, handler, payload: dict):
+        if inspect.iscoroutinefunction(handler):
+            return await handler(payload)
+        return await asyncio.get_running_loop().run_in_executor(None, handler, payload)
+
+    async def _heartbeat(self, job_id: str, token: str):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            await asyncio.to_thread(self.queue.extend, job_id, token)
+
+    async def run_next(self) -> bool:
+        """
+        Run one due job.
+
+        Returns:
+            bool: Whether a job was due.
+        """
+        claimed = await asyncio.to_thread(self.queue.claim, list(self.handlers))
+        if claimed is None:
+            return False
+        job_id, kind, payload, attempts, token = claimed
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, token))
+        try:
+            result = await self._call(self.handlers[kind], payload)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.queue.release, job_id, token)
+            raise
+        except Exception as e:
+            self.errors += 1
+            permanent = is_permanent_error(e)
+            print(f"Job {job_id} ({kind}) failed on attempt {attempts}: {str(e)}")
+            await asyncio.to_thread(self.queue.fail, job_id, token, attempts, job_error(e), permanent=permanent)
+        else:
+            self.processed += 1
+            if not await asyncio.to_thread(self.queue.complete, job_id, token, result):
+                print(f"Job {job_id} ({kind}) finished after its claim expired; result discarded")
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def deliver_next_callback(self) -> bool:
+        """POST one finished job to its callback URL; returns whether one was due."""
+        claimed = await asyncio.to_thread(self.queue.claim_callback, self.callback_timeout)
+        if claimed is None:
+            return False
+        job_id, url, attempts = claimed
+        body = await asyncio.to_thread(self.queue.get, job_id)
+        body.pop("callback", None)
+        try:
+            # Checked again on delivery: the host's DNS may have changed since the job was submitted
+            await asyncio.to_thread(validate_callback_url, url)
+            async with httpx.AsyncClient(timeout=self.callback_timeout) as client:
+                response = await client.post(url, json=body)
+                response.raise_for_status()
+        except Exception as e:
+            print(f"Callback for job {job_id} failed (attempt {attempts + 1}): {str(e)}")
+            await asyncio.to_thread(self.queue.callback_failed, job_id, attempts, str(e), self.callback_attempts)
+        else:
+            await asyncio.to_thread(self.queue.callback_delivered, job_id)
+        return True
+
+    async def _poll(self, step, name: str):
+        delay = self.poll_interval
+        while not self._stopping:
+            try:
+                if await step():
+                    delay = self.poll_interval
+                    continue
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"{name} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _worker(self):
+        await self._poll(self.run_next, "Job worker")
+
+    async def _callback_worker(self):
+        # Separate from the job consumers so a busy queue does not hold back callbacks
+        await self._poll(self.deliver_next_callback, "Job callback worker")
+
+    def start(self, workers: int = 4):
+        """Start ``workers`` consumer tasks and a callback delivery task on the running event loop."""
+        if self._tasks or workers <= 0:
+            return
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        self._tasks.append(asyncio.create_task(self._callback_worker()))
+
+    async def stop(self, grace: float = 0):
+        """
+        Stop consuming.
+
+        Jobs still running after ``grace`` seconds are cancelled and handed
+        back to the queue for another consumer.
+        """
+        self._stopping = True
+        if grace > 0 and self._tasks:
+            await asyncio.wait(self._tasks, timeout=grace)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def start_background(self, workers: int = 4):
+        """Consume from a daemon thread with its own event loop, for apps without one."""
+        with self._thread_lock:
+            if self._thread is not None or workers <= 0:
+                return
+
+            async def consume():
+                self.start(workers)
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+            self._thread = threading.Thread(target=asyncio.run, args=(consume(),), name="job-consumer", daemon=True)
+            self._thread.start()
+
+    def stats(self) -> dict:
+        return {**self.queue.stats(), "processed": self.processed, "errors": self.errors}
@@ -1,21 +1,115 @@
-from openai import OpenAI
-from langchain.chains.summarize import load_summarize_chain
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
 import os
 import json
+import asyncio
+import importlib
+import math
+import threading
+import time
+import weakref
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import requests
+from typing import Dict, List, Optional
 from datetime import datetime, timezone
-from notion_client import Client
-import openai
+import notion_transport
+import metrics
+import openai_completions
+import tracing
+from summary_cache import SummaryCache
+from rate_limiter import get_openai_rate_limiter, estimate_request_tokens, RateLimitWaitExceeded
+from resilience import get_openai_retry_policy, CircuitOpenError
+from health_monitor import HealthMonitor
+from notion_outbox import NotionOutbox, PermanentDeliveryError
+from chunker import TokenChunker
+from token_utils import count_tokens
+from newsletter_classifier import NewsletterClassifier
+from sender_reputation import SenderReputation
+from email_preprocessor import get_email_preprocessor
+from model_router import get_model_router, openai_models
+from jobs import JobManager, JobQueueFull, get_job_queue, validate_callback_url
+from idempotency import (
+    IdempotencyConflict, IdempotencyStore, REPLAYED_HEADER, idempotency_key, request_fingerprint
+)
+from itertools import islice
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Shared limiter keeping OpenAI traffic within the account's RPM/TPM budgets
+openai_rate_limiter = get_openai_rate_limiter()
+
+# Shared retry policy and circuit breaker for every OpenAI call site
+openai_retry_policy = get_openai_retry_policy()
+
+# OpenAI clients, created on first use; call get_openai_client() and get_async_openai_client()
+client = None
+_async_openai_clients = weakref.WeakKeyDictionary()
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the process-wide OpenAI client, importing the SDK on first use."""
+    global client
+    with _openai_client_lock:
+        if client is None:
+            from openai import OpenAI
+            # Retries are handled by openai_retry_policy, so the client does not retry on its own
+            client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=openai_rate_limiter.http_client(),
+                max_retries=0
+            )
+        return client
+
+
+def get_async_openai_client():
+    """
+    Return the AsyncOpenAI client for the running event loop, importing the SDK on first use.
+
+    Async connection pools cannot be shared between event loops, so one
+    client is kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+    async_client = _async_openai_clients.get(loop)
+    if async_client is None:
+        from openai import AsyncOpenAI
+        async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=openai_rate_limiter.async_http_client(),
+            max_retries=0
+        )
+        _async_openai_clients[loop] = async_client
+    return async_client
+
+
+async def close_async_openai_client():
+    """Close the running loop's AsyncOpenAI client and release its connections."""
+    async_client = _async_openai_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.close()
+
+# Maximum number of OpenAI completions in flight at once on the async path
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "20"))
+
+# Batch endpoint limits: items processed concurrently per request, and items accepted per request
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "10"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# Seconds between background dependency checks, and the timeout for each check
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "10"))
+
+# Save API summaries to Notion through the write-behind outbox
+SAVE_TO_NOTION = os.getenv("SAVE_TO_NOTION", "false").lower() == "true"
+NOTION_OUTBOX_WORKERS = int(os.getenv("NOTION_OUTBOX_WORKERS", "2"))
+NOTION_OUTBOX_POLL_INTERVAL = float(os.getenv("NOTION_OUTBOX_POLL_INTERVAL", "1"))
+
+notion_outbox = NotionOutbox(
+    db_path=os.getenv("NOTION_OUTBOX_DB", "notion_outbox.db"),
+    max_attempts=int(os.getenv("NOTION_OUTBOX_MAX_ATTEMPTS", "8"))
+)
 
 NOTION_KEY = os.getenv("NOTION_KEY")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
@@ -26,7 +120,11 @@ headers = {
     "Notion-Version": "2022-06-28"
 }
 
-models = ["gpt-3.5-turbo"]
+# Available chat models, smallest and fastest first
+models = openai_models()
+
+# Shared with the Flask app: short and classification prompts use the first model, long prompts the last
+model_router = get_model_router()
 
 app = FastAPI(
     title="Email Processor API",
@@ -62,41 +160,210 @@ function_descriptions = [
             },
             "required": ["title"]
         }
+    },
+    {
+        "name": "newsletter_summary",
+        "description": "Based on the newsletter content given in the query, the function creates a title and a summary for it",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "title": {
+                    "type": "string",
+                    "description": "Generated title for the newsletter containing less than 100 characters"
+                },
+                "summary": {
+                    "type": "string",
+                    "description": "Summary of the newsletter covering its main topics and key points"
+                }
+            },
+            "required": ["title", "summary"]
+        }
     }
 ]
 
+# How summarise_newsletter schedules its LLM calls: "sequential", "parallel" or "combined"
+NEWSLETTER_PIPELINE_MODE = os.getenv("NEWSLETTER_PIPELINE_MODE", "parallel")
+
 # Test mode flag
 TEST_MODE = os.getenv("TEST_MODE", "false").lower() == "true"
 
-def doc_creator(content):
+# Local pre-classifier; only emails scoring between 1 - threshold and threshold reach the LLM
+newsletter_classifier = NewsletterClassifier(
+    threshold=float(os.getenv("NEWSLETTER_HEURISTIC_THRESHOLD", "0.85"))
+)
+
+# Per-sender and per-domain newsletter verdicts, consulted before classifying an email
+sender_reputation = SenderReputation(
+    db_path=os.getenv("SENDER_REPUTATION_DB", "sender_reputation.db"),
+    min_observations=float(os.getenv("SENDER_REPUTATION_MIN_OBSERVATIONS", "3")),
+    confidence=float(os.getenv("SENDER_REPUTATION_CONFIDENCE", "0.9")),
+    half_life_days=float(os.getenv("SENDER_REPUTATION_HALF_LIFE_DAYS", "30")),
+    recheck_rate=float(os.getenv("SENDER_REPUTATION_RECHECK_RATE", "0.05"))
+)
+
+# Results of /api/process-email kept by idempotency key so webhook retries are not reprocessed
+idempotency_store = IdempotencyStore(
+    db_path=os.getenv("IDEMPOTENCY_DB", "idempotency.db"),
+    ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+    lock_timeout=float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "300"))
+)
+
+# Durable queue for every processed email: ?async=true jobs are polled at /api/jobs/{id}, other
+# requests run their own job while the client waits. JOB_WORKERS consumers run in this process;
+# set it to 0 when worker.py processes do the work
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+job_manager = JobManager(get_job_queue())
+
+# Strips quoted replies, signatures, tracking links and footers from bodies before prompting
+PREPROCESS_EMAIL_BODIES = os.getenv("PREPROCESS_EMAIL_BODIES", "true").lower() == "true"
+email_preprocessor = get_email_preprocessor()
+
+# Cache of LLM results keyed by prompt template, model and email content
+summary_cache = SummaryCache(
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=int(os.getenv("SUMMARY_CACHE_TTL", "86400")),
+    db_path=os.getenv("SUMMARY_CACHE_DB") or None
+)
+
+# Token budget per chunk fed to the summarization chains, and the most chunks summarized per newsletter
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "1000"))
+CHUNK_MAX_COUNT = int(os.getenv("CHUNK_MAX_COUNT", "10"))
+# Chunks pasted into one prompt by the short summary and combined modes, which must fit a single context window
+SINGLE_PROMPT_MAX_CHUNKS = int(os.getenv("SINGLE_PROMPT_MAX_CHUNKS", "3"))
+
+chunker = TokenChunker(max_tokens=CHUNK_TOKEN_BUDGET, model=models[-1])
+
+
+def prepare_body(body: str) -> str:
+    """Return the email body as it should appear in a prompt."""
+    if not PREPROCESS_EMAIL_BODIES:
+        return body
+    with metrics.stage("preprocessing"):
+        return email_preprocessor.process(body)
+
+
+def route_model(task: str, prompt: str) -> str:
+    """Return the model model_router picks for a prompt."""
+    return model_router.route(task, count_tokens(prompt, models[0]))
+
+
+# Bump when preprocessing changes, so results cached from the old prompts are not served
+PROMPT_VERSION = "2"
+
+
+def summary_cache_key(template: str, task: str, subject: str, body: str) -> str:
+    """
+    Cache key for an LLM result, built from the raw email.
+
+    Looking it up needs no preprocessing or token counting. Instead of the
+    routed model, the key covers what the prompt and model are derived from:
+    the prompt version, whether bodies are preprocessed and the task's routes.
+    """
+    version = json.dumps([
+        PROMPT_VERSION, PREPROCESS_EMAIL_BODIES, model_router.task_models.get(task),
+        model_router.small_model, model_router.large_model, model_router.large_threshold
+    ])
+    return SummaryCache.make_key(template, version, subject, body)
+
+
+def doc_creator(content, max_chunks=None):
     """
     Create documents from text content.
 
+    Lines are packed into chunks of at most CHUNK_TOKEN_BUDGET tokens. Chunks
+    are produced lazily, so content past the last chunk used is never tokenized.
+    Each document's token count is kept in its ``tokens`` metadata.
+
     Args:
         content (str): The input text content.
+        max_chunks (int): The most documents to create, defaults to CHUNK_MAX_COUNT.
 
     Returns:
         list: The list of created documents.
     """
-    # Initialize the text splitter
-    text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=150)
+    # langchain is only needed on this path, so it is imported on first use
+    from langchain.docstore.document import Document
 
-    # Split the content into chunks
-    split_content = text_splitter.split_text(content)
+    chunks = islice(chunker.iter_chunks(content, with_tokens=True), max_chunks or CHUNK_MAX_COUNT)
+    return [Document(page_content=chunk, metadata={"tokens": tokens}) for chunk, tokens in chunks]
 
-    # Split the first chunk by newline character
-    split_content = split_content[0].split("\n")
 
-    # Create documents from the split content
-    docs = text_splitter.create_documents(split_content)
+# Chunk summaries run concurrently in the map step of generate_summary. The default covers every
+# chunk, so the step runs in one wave; the shared rate limiter still paces the requests
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", str(CHUNK_MAX_COUNT)))
 
-    return docs
+SHORT_SUMMARY_PROMPT = """Write a concise summary in less than 500 characters of the text given below. If it is a
+    newsletter, refer to it as a newsletter. If it isn't a newsletter, simply make summary say "This isn't a newsletter".
+    If it is a newsletter, the summary should be less than 500 characters long and refer to the original text as a
+    newsletter, otherwise simply output the summary as "This isn't a newsletter".
+
+    TEXT:
+    {text}
+
+    SUMMARY OF NEWSLETTER IN LESS THAN 500 CHARACTERS:"""
+
+
+class RateLimitedCompletions:
+    """``chat.completions`` for langchain models, sending each request through ``complete_once``."""
+
+    def create(self, **kwargs):
+        return complete_once(**kwargs)
+
+
+class AsyncRateLimitedCompletions:
+    """Async ``chat.completions`` for langchain models, sending each request through ``complete_once_async``."""
+
+    async def create(self, **kwargs):
+        return await complete_once_async(**kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model_name: str):
+    """Return the process-wide ChatOpenAI instance for model_name."""
+    from langchain.chat_models import ChatOpenAI
+
+    # Requests share the OpenAI client, rate limiter and token accounting of the direct call sites;
+    # retries are handled by openai_retry_policy around each chain call
+    return ChatOpenAI(
+        model=model_name,
+        temperature=0.5,
+        max_retries=0,
+        client=RateLimitedCompletions(),
+        async_client=AsyncRateLimitedCompletions()
+    )
+
+
+@lru_cache(maxsize=None)
+def get_summary_chain(model_name: str):
+    """Return the process-wide map_reduce summarization chain for model_name."""
+    from langchain.chains.summarize import load_summarize_chain
+
+    return load_summarize_chain(get_chat_model(model_name), chain_type="map_reduce")
+
+
+@lru_cache(maxsize=None)
+def get_short_summary_chain(model_name: str):
+    """Return the process-wide stuff chain used for short summaries."""
+    from langchain.chains.summarize import load_summarize_chain
+    from langchain.prompts import PromptTemplate
+
+    return load_summarize_chain(
+        get_chat_model(model_name),
+        chain_type="stuff",
+        prompt=PromptTemplate(template=SHORT_SUMMARY_PROMPT, input_variables=["text"])
+    )
 
 
 def generate_summary(content):
     """
     Generate a summary of the given content.
 
+    The map step summarizes up to SUMMARY_MAP_CONCURRENCY chunks at once.
+    With the default, which matches CHUNK_MAX_COUNT, every chunk runs in a
+    single wave and the step takes about as long as its slowest chunk; a
+    lower setting runs ceil(chunks / SUMMARY_MAP_CONCURRENCY) waves. The
+    chunk summaries are then combined by the chain's reduce step.
+
     Args:
         content (str): The content to generate a summary from.
 
@@ -105,15 +372,29 @@ def generate_summary(content):
     """
     # Create documents from content
     documents = doc_creator(content)
+    if not documents:
+        return ""
+
+    model = model_router.route("newsletter_summary", max(d.metadata["tokens"] for d in documents))
+    chain = get_summary_chain(model)
+
+    def summarize_chunk(document):
+        return openai_retry_policy.call(
+            chain.llm_chain.predict, **{chain.document_variable_name: document.page_content}
+        )
 
-    # Initialize the ChatOpenAI model
-    model = ChatOpenAI(model=models[-1], temperature=0.5)
+    with model_router.measure("newsletter_summary", model):
+        # Map: summarize each chunk concurrently
+        with ThreadPoolExecutor(max_workers=SUMMARY_MAP_CONCURRENCY) as executor:
+            chunk_summaries = list(executor.map(tracing.propagate(summarize_chunk), documents))
 
-    # Load and initialize the summarization chain
-    chain = load_summarize_chain(model, chain_type="map_reduce")
+        # Reduce: combine the chunk summaries into the final summary
+        from langchain.docstore.document import Document
 
-    # Generate the summary using the chain
-    summary = chain.run(documents)
+        summary, _ = openai_retry_policy.call(
+            chain.reduce_documents_chain.combine_docs,
+            [Document(page_content=chunk_summary) for chunk_summary in chunk_summaries]
+        )
 
     return summary
 
@@ -122,68 +403,155 @@ def generate_short_summary(content):
     """
     Generate a short summary of the given content.
 
+    Only the first SINGLE_PROMPT_MAX_CHUNKS chunks are summarized, as they
+    are sent in one prompt.
+
     Args:
         content (str): The content to summarize.
 
     Returns:
         str: The generated short summary.
     """
+    documents = doc_creator(content, max_chunks=SINGLE_PROMPT_MAX_CHUNKS)
+    model = route_model("short_summary", "\n".join(doc.page_content for doc in documents))
+    with model_router.measure("short_summary", model):
+        return openai_retry_policy.call(get_short_summary_chain(model).run, documents)
 
-    # Define the prompt template
-    prompt_template = """Write a concise summary in less than 500 characters of the text given below. If it is a
-    newsletter, refer to it as a newsletter. If it isn't a newsletter, simply make summary say "This isn't a newsletter".
-    If it is a newsletter, the summary should be less than 500 characters long and refer to the original text as a
-    newsletter, otherwise simply output the summary as "This isn't a newsletter".
-
-    TEXT:
-    {text}
-
-    SUMMARY OF NEWSLETTER IN LESS THAN 500 CHARACTERS:"""
-
-    # Generate the summary using the load_summarize_chain function
-    summary = load_summarize_chain(
-        ChatOpenAI(model=models[-1], temperature=0.5),
-        chain_type="stuff",
-        prompt=PromptTemplate(template=prompt_template, input_variables=["text"])
-    ).run(doc_creator(content)[:3])
-
-    return summary
 
+def generate_title(short_summary):
+    """
+    Generate a title for a newsletter summary.
 
-def summarise_newsletter(content):
-    # Generate a short summary of the newsletter content
-    short_summary = generate_short_summary(content)
-    print(short_summary)
+    Args:
+        short_summary (str): The short summary of the newsletter.
 
+    Returns:
+        str: The generated title.
+    """
     # Prompt the user to generate a title for the summary content
     query_title = f"Please generate a title in less than 100 characters for the following newsletter summary content: {short_summary}"
     messages_title = [{"role": "user", "content": query_title}]
 
     # Generate the title using an AI model
-    title_response = client.chat.completions.create(
-        model=models[-1],
-        messages=messages_title,
-        functions=function_descriptions,
-        function_call={"name": "summary_title"}
-    )
+    model = route_model("title", query_title)
+    with model_router.measure("title", model):
+        title_response = create_chat_completion(
+            model=model,
+            messages=messages_title,
+            functions=function_descriptions,
+            function_call={"name": "summary_title"}
+        )
 
     # Extract the generated title from the AI response
     title_json = json.loads(title_response.choices[0].message.function_call.arguments)
-    title = title_json["title"]
+    return title_json["title"]
+
+
+def generate_title_and_summary(content):
+    """
+    Generate a title and a summary of the given content in a single function call.
+
+    Unlike the map-reduce summary of parallel mode, which covers up to
+    CHUNK_MAX_COUNT chunks, this sends only the first SINGLE_PROMPT_MAX_CHUNKS
+    chunks so the prompt fits one context window.
+
+    Args:
+        content (str): The content to summarize.
+
+    Returns:
+        dict: The generated "title" and "summary".
+    """
+    text = "\n".join(doc.page_content for doc in doc_creator(content, max_chunks=SINGLE_PROMPT_MAX_CHUNKS))
+    query = f"Please generate a title in less than 100 characters and a concise summary for the following newsletter: {text}"
+
+    model = route_model("title_and_summary", query)
+    with model_router.measure("title_and_summary", model):
+        response = create_chat_completion(
+            model=model,
+            messages=[{"role": "user", "content": query}],
+            functions=function_descriptions,
+            function_call={"name": "newsletter_summary"}
+        )
+
+    result = json.loads(response.choices[0].message.function_call.arguments)
+    return {"title": result["title"], "summary": result["summary"]}
+
+
+def _timed(timings: dict, stage: str, func, *args):
+    """Call func, recording its latency in seconds under timings[stage] and as the newsletter_<stage> stage."""
+    start = time.perf_counter()
+    try:
+        with metrics.stage(f"newsletter_{stage}"):
+            return func(*args)
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 3)
 
-    # Generate the final summary of the newsletter content
-    final_summary = generate_summary(content)
 
-    # Create a summary object with the title and final summary
-    summary_object = {
-        "title": title,
-        "summary": final_summary
+@metrics.timed_stage("summarization")
+def summarise_newsletter(content, mode=None):
+    """
+    Generate a title and summary for a newsletter.
+
+    Modes:
+        sequential: short summary, then title, then full summary.
+        parallel: the short summary and title run alongside the full summary.
+        combined: one function call returns the title and summary together.
+
+    Args:
+        content (str): The newsletter content.
+        mode (str): The pipeline mode, defaults to NEWSLETTER_PIPELINE_MODE.
+
+    Returns:
+        dict: The "title" and "summary", plus per-stage "timings" in seconds.
+    """
+    mode = mode or NEWSLETTER_PIPELINE_MODE
+    timings = {}
+    start = time.perf_counter()
+    content = prepare_body(content)
+
+    if mode == "combined":
+        summary_object = _timed(timings, "title_and_summary", generate_title_and_summary, content)
+    elif mode == "parallel":
+        def title_stage():
+            short_summary = _timed(timings, "short_summary", generate_short_summary, content)
+            return _timed(timings, "title", generate_title, short_summary)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            title_future = executor.submit(tracing.propagate(title_stage))
+            summary_future = executor.submit(tracing.propagate(_timed), timings, "summary", generate_summary, content)
+            summary_object = {"title": title_future.result(), "summary": summary_future.result()}
+    elif mode == "sequential":
+        # Generate a short summary of the newsletter content
+        short_summary = _timed(timings, "short_summary", generate_short_summary, content)
+
+        title = _timed(timings, "title", generate_title, short_summary)
+
+        # Generate the final summary of the newsletter content
+        final_summary = _timed(timings, "summary", generate_summary, content)
+
+        # Create a summary object with the title and final summary
+        summary_object = {
+            "title": title,
+            "summary": final_summary
+        }
+    else:
+        raise ValueError(f"Unknown newsletter pipeline mode: {mode}")
+
+    total = round(time.perf_counter() - start, 3)
+    stages_total = round(sum(timings.values()), 3)
+    summary_object["timings"] = {
+        "mode": mode,
+        "stages": timings,
+        "total": total,
+        "saved": round(max(stages_total - total, 0.0), 3)
     }
+    metrics.PIPELINE_SAVED.labels(mode=mode).inc(summary_object["timings"]["saved"])
 
     return summary_object
 
 
-def create_notion_page(data: dict) -> requests.Response:
+@metrics.timed_stage("notion_write")
+def create_notion_page(data: dict):
     """
     Creates a new page in Notion using the provided data.
 
@@ -193,13 +561,13 @@ def create_notion_page(data: dict) -> requests.Response:
     Returns:
         requests.Response: The response object containing the server's response to the request.
     """
-    url = "https://api.notion.com/v1/pages"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {NOTION_KEY}",
-        "Notion-Version": "2022-06-28"
-    }
-    response = requests.post(url, headers=headers, json=data)
+    session = notion_transport.get_session()
+    with tracing.span("notion.pages.create"):
+        response = session.post(
+            notion_transport.notion_url("/v1/pages"),
+            json=data,
+            timeout=notion_transport.request_timeout()
+        )
     return response
 
 
@@ -251,76 +619,152 @@ class EmailContent(BaseModel):
     subject: str
     body: str
     sender: str
+    headers: Optional[Dict[str, str]] = None
+    # With ?async=true, the finished job is POSTed here
+    callback_url: Optional[str] = None
 
 
 def handle_openai_error(e):
     """Handle OpenAI API errors with user-friendly messages."""
+    import openai
+
     error_message = str(e)
     if "insufficient_quota" in error_message:
         return "OpenAI API quota exceeded. Please check your API key and billing status at https://platform.openai.com/account/billing"
     elif "invalid_api_key" in error_message:
         return "Invalid OpenAI API key. Please check your API key in the .env file"
+    elif isinstance(e, (RateLimitWaitExceeded, openai.RateLimitError)):
+        return f"OpenAI rate limit reached. Please retry shortly: {error_message}"
+    elif isinstance(e, CircuitOpenError):
+        return f"OpenAI is temporarily unavailable: {error_message}"
     else:
         return f"OpenAI API error: {error_message}"
 
 
-def is_newsletter(subject: str, body: str) -> bool:
-    """Determine if the email is a newsletter."""
-    if TEST_MODE:
-        # In test mode, consider it a newsletter if the subject contains "newsletter" or "digest"
-        return "newsletter" in subject.lower() or "digest" in subject.lower()
-
-    try:
-        prompt = f"""
+NEWSLETTER_CHECK_PROMPT = """
         Analyze if this email is a newsletter:
         Subject: {subject}
-        Content: {body[:500]}...
+        Content: {body}...
 
         Respond with only 'true' or 'false'.
         """
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=10
-        )
+NEWSLETTER_SUMMARY_PROMPT = """
+        Summarize this newsletter in a concise way:
+        Subject: {subject}
+        Content: {body}
+
+        Include:
+        1. Main topics
+        2. Key points
+        3. Any important links or resources
+        """
+
 
-        return response.choices[0].message.content.strip().lower() == 'true'
+@metrics.timed_stage("classification")
+def is_newsletter(subject: str, body: str, sender: str = "", headers: dict = None) -> bool:
+    """
+    Determine if the email is a newsletter.
+
+    Senders with a confident history are answered from the reputation
+    store. Otherwise headers and content are scored locally, and the LLM is
+    only asked when the local classifier is not confident either way. Every
+    fresh verdict is added to the sender's history.
+    """
+    if TEST_MODE:
+        # In test mode, consider it a newsletter if the subject contains "newsletter" or "digest"
+        return "newsletter" in subject.lower() or "digest" in subject.lower()
+
+    verdict = sender_reputation.lookup(sender)
+    if verdict is not None:
+        return verdict
+
+    verdict = newsletter_classifier.classify(subject, body, sender, headers)
+    if verdict is not None:
+        sender_reputation.record(sender, verdict)
+        return verdict
+
+    cache_key = summary_cache_key(NEWSLETTER_CHECK_PROMPT, "newsletter_check", subject, body)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    body = prepare_body(body)
+    model = model_router.route("newsletter_check")
+
+    try:
+        prompt = NEWSLETTER_CHECK_PROMPT.format(subject=subject, body=body[:500])
+
+        with model_router.measure("newsletter_check", model):
+            response = create_chat_completion(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=10
+            )
+
+        result = response.choices[0].message.content.strip().lower() == 'true'
+        summary_cache.set(cache_key, result)
+        sender_reputation.record(sender, result)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=handle_openai_error(e))
 
 
+@metrics.timed_stage("summarization")
 def summarize_content(subject: str, body: str) -> str:
     """Summarize the newsletter content."""
     if TEST_MODE:
         # In test mode, return a simple summary
         return f"Test Summary of {subject}:\n\nKey points from the content:\n{body[:200]}..."
 
-    try:
-        prompt = f"""
-        Summarize this newsletter in a concise way:
-        Subject: {subject}
-        Content: {body}
+    cache_key = summary_cache_key(NEWSLETTER_SUMMARY_PROMPT, "newsletter_summary", subject, body)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-        Include:
-        1. Main topics
-        2. Key points
-        3. Any important links or resources
-        """
+    body = prepare_body(body)
+    with tracing.span("prompt_build"):
+        prompt = NEWSLETTER_SUMMARY_PROMPT.format(subject=subject, body=body)
+        model = route_model("newsletter_summary", prompt)
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=500
-        )
+    try:
+        with model_router.measure("newsletter_summary", model):
+            response = create_chat_completion(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=500
+            )
 
-        return response.choices[0].message.content
+        summary = response.choices[0].message.content
+        summary_cache.set(cache_key, summary)
+        return summary
     except Exception as e:
         raise HTTPException(status_code=500, detail=handle_openai_error(e))
 
 
+def build_notion_page(summary: str, subject: str, sender: str, database_id: str) -> dict:
+    """Build the Notion page body for an email summary."""
+    return {
+        "parent": {"database_id": database_id},
+        "properties": {
+            "Title": {"title": [{"text": {"content": subject}}]},
+            "Source": {"rich_text": [{"text": {"content": sender}}]},
+        },
+        "children": [
+            {
+                "object": "block",
+                "type": "paragraph",
+                "paragraph": {
+                    "rich_text": [{"type": "text", "text": {"content": summary}}]
+                }
+            }
+        ]
+    }
+
+
+@metrics.timed_stage("notion_write")
 def add_to_notion(summary: str, subject: str, sender: str):
     """Add the summary to Notion database."""
     if TEST_MODE:
@@ -333,69 +777,261 @@ def add_to_notion(summary: str, subject: str, sender: str):
         if not database_id:
             raise HTTPException(status_code=500, detail="Notion database ID not found in environment variables")
 
-        new_page = {
-            "parent": {"database_id": database_id},
-            "properties": {
-                "Title": {"title": [{"text": {"content": subject}}]},
-                "Source": {"rich_text": [{"text": {"content": sender}}]},
-            },
-            "children": [
-                {
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [{"type": "text", "text": {"content": summary}}]
-                    }
-                }
-            ]
-        }
+        new_page = build_notion_page(summary, subject, sender, database_id)
+
+        notion = notion_transport.get_notion_client()
+        with tracing.span("notion.pages.create"):
+            notion.pages.create(**new_page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        metrics.record_upstream_error("notion", e)
+        raise HTTPException(status_code=500, detail=f"Notion API error: {str(e)}")
+
+
+@metrics.timed_stage("notion_write")
+async def add_to_notion_async(summary: str, subject: str, sender: str):
+    """Add the summary to Notion database without blocking the event loop."""
+    if TEST_MODE:
+        # In test mode, just print the summary
+        print(f"Test Mode - Would add to Notion:\nSubject: {subject}\nSender: {sender}\nSummary: {summary}")
+        return
+
+    try:
+        database_id = os.getenv("NOTION_DATABASE_ID")
+        if not database_id:
+            raise HTTPException(status_code=500, detail="Notion database ID not found in environment variables")
 
-        notion = Client(auth=NOTION_KEY)
-        notion.pages.create(**new_page)
+        new_page = build_notion_page(summary, subject, sender, database_id)
+
+        notion = notion_transport.get_async_notion_client()
+        with tracing.span("notion.pages.create"):
+            await notion.pages.create(**new_page)
+    except HTTPException:
+        raise
     except Exception as e:
+        metrics.record_upstream_error("notion", e)
         raise HTTPException(status_code=500, detail=f"Notion API error: {str(e)}")
 
 
+def queue_notion_page(summary: str, subject: str, sender: str):
+    """
+    Queue the summary for Notion in the write-behind outbox.
+
+    Returns:
+        int: The outbox entry ID, or None in test mode.
+    """
+    if TEST_MODE:
+        # In test mode, just print the summary
+        print(f"Test Mode - Would queue for Notion:\nSubject: {subject}\nSender: {sender}\nSummary: {summary}")
+        return None
+
+    database_id = os.getenv("NOTION_DATABASE_ID")
+    if not database_id:
+        raise HTTPException(status_code=500, detail="Notion database ID not found in environment variables")
+
+    return notion_outbox.enqueue(build_notion_page(summary, subject, sender, database_id))
+
+
+@metrics.timed_stage("notion_write")
+async def deliver_notion_page(page: dict):
+    """Create a queued page in Notion; client errors other than rate limits are not retried."""
+    try:
+        await notion_transport.get_async_notion_client().pages.create(**page)
+    except Exception as e:
+        from notion_client import APIResponseError
+
+        metrics.record_upstream_error("notion", e)
+        if isinstance(e, APIResponseError) and 400 <= e.status < 500 and e.status not in (408, 409, 429):
+            raise PermanentDeliveryError(f"Notion API error: {str(e)}") from e
+        raise
+
+
+def complete_once(**kwargs):
+    """
+    Make one chat completion request once the rate limiter admits it, without retrying.
+
+    Its token usage and failures are recorded in the metrics.
+
+    Args:
+        **kwargs: Arguments passed to ``chat.completions.create``.
+
+    Returns:
+        The completion returned by the OpenAI client.
+    """
+    return openai_completions.complete_once(
+        get_openai_client(), openai_rate_limiter, openai_retry_policy.attempt_timeout, **kwargs
+    )
+
+
+def create_chat_completion(**kwargs):
+    """
+    Create a chat completion once the rate limiter admits it.
+
+    Transient failures are retried with backoff by openai_retry_policy, and
+    each attempt is bounded by its per-attempt timeout.
+
+    Args:
+        **kwargs: Arguments passed to ``chat.completions.create``.
+
+    Returns:
+        The completion returned by the OpenAI client.
+    """
+    return openai_retry_policy.call(complete_once, **kwargs)
+
+
+_openai_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_openai_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore capping in-flight completions on the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _openai_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+        _openai_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def complete_once_async(**kwargs):
+    """Async version of ``complete_once``; holds one of the OPENAI_MAX_CONCURRENCY slots while in flight."""
+    await openai_rate_limiter.acquire_async(estimate_request_tokens(kwargs))
+    async with get_openai_semaphore():
+        with metrics.LLM_IN_FLIGHT.track_inprogress(), tracing.span("openai.chat.completions", model=kwargs.get("model", "")):
+            try:
+                response = await get_async_openai_client().chat.completions.create(
+                    timeout=openai_retry_policy.attempt_timeout, **kwargs
+                )
+            except Exception as e:
+                metrics.record_upstream_error("openai", e)
+                raise
+    metrics.record_token_usage(kwargs.get("model", ""), getattr(response, "usage", None))
+    return response
+
+
+async def create_chat_completion_async(**kwargs):
+    """
+    Create a chat completion without blocking the event loop.
+
+    The request first waits for the rate limiter to admit it. At most
+    OPENAI_MAX_CONCURRENCY completions are in flight at once; further
+    callers wait for a free slot instead of piling up on the API. Transient
+    failures are retried by openai_retry_policy.
+
+    Args:
+        **kwargs: Arguments passed to ``chat.completions.create``.
+
+    Returns:
+        The completion returned by the async OpenAI client.
+    """
+    return await openai_retry_policy.call_async(complete_once_async, **kwargs)
+
+
+async def stream_chat_completion_async(**kwargs):
+    """
+    Stream a chat completion, yielding content deltas as the model produces them.
+
+    As in create_chat_completion_async, a concurrency slot is only taken once
+    the rate limiter admits an attempt, and is not held while backing off
+    between retries; once the stream is open it is held until the stream is
+    exhausted. Opening the stream is retried on transient failures; once
+    content has been sent a failure is raised to the caller.
+
+    Args:
+        **kwargs: Arguments passed to ``chat.completions.create``.
+
+    Yields:
+        str: The next piece of generated content.
+    """
+    semaphore = get_openai_semaphore()
+
+    async def open_stream():
+        await openai_rate_limiter.acquire_async(estimate_request_tokens(kwargs))
+        await semaphore.acquire()
+        opened = False
+        try:
+            with tracing.span("openai.chat.completions.stream", model=kwargs.get("model", "")):
+                stream = await get_async_openai_client().chat.completions.create(
+                    stream=True, timeout=openai_retry_policy.attempt_timeout, **kwargs
+                )
+            opened = True
+            return stream
+        except Exception as e:
+            metrics.record_upstream_error("openai", e)
+            raise
+        finally:
+            if not opened:
+                semaphore.release()
+
+    stream = await openai_retry_policy.call_async(open_stream)
+    try:
+        with metrics.LLM_IN_FLIGHT.track_inprogress():
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                metrics.record_upstream_error("openai", e)
+                raise
+    finally:
+        semaphore.release()
+
+
+def openai_connection_error_status(e: Exception) -> dict:
+    """Build the connection status returned when the OpenAI check fails."""
+    error_message = str(e)
+    if "insufficient_quota" in error_message:
+        return {
+            "status": "error",
+            "message": "OpenAI API quota exceeded. Please check your billing status at https://platform.openai.com/account/billing"
+        }
+    elif "invalid_api_key" in error_message:
+        return {
+            "status": "error",
+            "message": "Invalid OpenAI API key. Please check your API key in the .env file"
+        }
+    else:
+        return {
+            "status": "error",
+            "message": f"OpenAI API error: {error_message}"
+        }
+
+
+OPENAI_CONNECTED_STATUS = {
+    "status": "connected",
+    "model": models[0],
+    "message": "OpenAI API is working correctly"
+}
+
+
 def check_openai_connection():
     """Check if OpenAI API is accessible and working."""
     try:
         # Try a simple API call
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response = create_chat_completion(
+            model=models[0],
             messages=[{"role": "user", "content": "Hello"}],
             max_tokens=5
         )
-        return {
-            "status": "connected",
-            "model": "gpt-3.5-turbo",
-            "message": "OpenAI API is working correctly"
-        }
+        return dict(OPENAI_CONNECTED_STATUS)
     except Exception as e:
-        error_message = str(e)
-        if "insufficient_quota" in error_message:
-            return {
-                "status": "error",
-                "message": "OpenAI API quota exceeded. Please check your billing status at https://platform.openai.com/account/billing"
-            }
-        elif "invalid_api_key" in error_message:
-            return {
-                "status": "error",
-                "message": "Invalid OpenAI API key. Please check your API key in the .env file"
-            }
-        else:
-            return {
-                "status": "error",
-                "message": f"OpenAI API error: {error_message}"
-            }
+        return openai_connection_error_status(e)
 
 
-def process_email_content(subject: str, body: str) -> str:
-    """Process email content and return a summary."""
-    if TEST_MODE:
-        return f"Test Summary of {subject}:\n\nKey points from the content:\n{body[:200]}..."
-
+async def check_openai_connection_async():
+    """Check if OpenAI API is accessible without blocking the event loop."""
     try:
-        prompt = f"""
+        await create_chat_completion_async(
+            model=models[0],
+            messages=[{"role": "user", "content": "Hello"}],
+            max_tokens=5
+        )
+        return dict(OPENAI_CONNECTED_STATUS)
+    except Exception as e:
+        return openai_connection_error_status(e)
+
+
+EMAIL_SUMMARY_PROMPT = """
         Summarize this email content in a concise way:
         Subject: {subject}
         Content: {body}
@@ -406,32 +1042,251 @@ def process_email_content(subject: str, body: str) -> str:
         3. Any important links or resources
         """
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=500
-        )
 
-        return response.choices[0].message.content
+async def check_openai_reachability():
+    """Check that the OpenAI API is reachable without paying for a completion."""
+    try:
+        await get_async_openai_client().models.retrieve(models[0])
+        return dict(OPENAI_CONNECTED_STATUS)
     except Exception as e:
-        error_message = str(e)
-        if "insufficient_quota" in error_message:
-            raise HTTPException(
-                status_code=402,
-                detail="OpenAI API quota exceeded. Please check your billing status at https://platform.openai.com/account/billing"
-            )
-        elif "invalid_api_key" in error_message:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid OpenAI API key. Please check your API key in the .env file"
+        return openai_connection_error_status(e)
+
+
+async def check_notion_reachability():
+    """Check that the Notion database is reachable."""
+    if TEST_MODE:
+        return {"status": "skipped", "message": "Notion check skipped in test mode"}
+
+    try:
+        notion = notion_transport.get_async_notion_client()
+        await notion.databases.retrieve(database_id=NOTION_DATABASE_ID)
+        return {"status": "connected", "message": "Notion API is working correctly"}
+    except Exception as e:
+        return {"status": "error", "message": f"Notion API error: {str(e)}"}
+
+
+health_monitor = HealthMonitor(
+    checks={"openai": check_openai_reachability, "notion": check_notion_reachability},
+    interval=HEALTH_CHECK_INTERVAL,
+    timeout=HEALTH_CHECK_TIMEOUT
+)
+
+
+def build_email_prompt(subject: str, body: str) -> str:
+    """Build the summarization prompt for an email."""
+    return EMAIL_SUMMARY_PROMPT.format(subject=subject, body=body)
+
+
+def openai_http_exception(e: Exception) -> HTTPException:
+    """Map an OpenAI error to the HTTPException returned by the API."""
+    import openai
+
+    error_message = str(e)
+    if "insufficient_quota" in error_message:
+        return HTTPException(
+            status_code=402,
+            detail="OpenAI API quota exceeded. Please check your billing status at https://platform.openai.com/account/billing"
+        )
+    elif "invalid_api_key" in error_message:
+        return HTTPException(
+            status_code=401,
+            detail="Invalid OpenAI API key. Please check your API key in the .env file"
+        )
+    elif isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail=f"OpenAI is temporarily unavailable: {error_message}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    elif isinstance(e, RateLimitWaitExceeded):
+        return HTTPException(
+            status_code=429,
+            detail="OpenAI rate limit reached. Please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.wait_seconds))}
+        )
+    elif isinstance(e, openai.RateLimitError):
+        return HTTPException(
+            status_code=429,
+            detail=f"OpenAI rate limit reached: {error_message}",
+            headers={"Retry-After": e.response.headers.get("retry-after", "1")}
+        )
+    else:
+        return HTTPException(
+            status_code=500,
+            detail=f"OpenAI API error: {error_message}"
+        )
+
+
+@metrics.timed_stage("summarization")
+def process_email_content(subject: str, body: str) -> str:
+    """Process email content and return a summary."""
+    if TEST_MODE:
+        return f"Test Summary of {subject}:\n\nKey points from the content:\n{body[:200]}..."
+
+    cache_key = summary_cache_key(EMAIL_SUMMARY_PROMPT, "email_summary", subject, body)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    body = prepare_body(body)
+    with tracing.span("prompt_build"):
+        prompt = build_email_prompt(subject, body)
+        model = route_model("email_summary", prompt)
+
+    try:
+        with model_router.measure("email_summary", model):
+            response = create_chat_completion(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=500
             )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"OpenAI API error: {error_message}"
+
+        summary = response.choices[0].message.content
+        summary_cache.set(cache_key, summary)
+        return summary
+    except Exception as e:
+        raise openai_http_exception(e)
+
+
+@metrics.timed_stage("summarization")
+async def process_email_content_async(subject: str, body: str) -> str:
+    """Process email content and return a summary without blocking the event loop."""
+    if TEST_MODE:
+        return f"Test Summary of {subject}:\n\nKey points from the content:\n{body[:200]}..."
+
+    cache_key = summary_cache_key(EMAIL_SUMMARY_PROMPT, "email_summary", subject, body)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    body = prepare_body(body)
+    with tracing.span("prompt_build"):
+        prompt = build_email_prompt(subject, body)
+        model = route_model("email_summary", prompt)
+
+    try:
+        with model_router.measure("email_summary", model):
+            response = await create_chat_completion_async(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=500
             )
 
+        summary = response.choices[0].message.content
+        summary_cache.set(cache_key, summary)
+        return summary
+    except Exception as e:
+        raise openai_http_exception(e)
+
+
+@app.on_event("startup")
+async def preload_openai_client():
+    """Import the OpenAI SDK in a background thread so neither startup nor the first request waits for it."""
+    threading.Thread(target=importlib.import_module, args=("openai",), name="openai-preload", daemon=True).start()
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    """Start consuming queued email jobs in this process."""
+    job_manager.start(JOB_WORKERS)
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    """Stop consuming; jobs still running are handed back to the queue."""
+    await job_manager.stop()
+
+
+@app.on_event("startup")
+async def start_health_monitor():
+    """Start refreshing dependency health in the background."""
+    health_monitor.start()
+
+
+@app.on_event("shutdown")
+async def stop_health_monitor():
+    """Stop the background health refresh."""
+    await health_monitor.stop()
+
+
+@app.on_event("startup")
+async def start_notion_outbox():
+    """Start the workers draining the Notion outbox."""
+    notion_outbox.start(
+        deliver_notion_page,
+        workers=NOTION_OUTBOX_WORKERS,
+        poll_interval=NOTION_OUTBOX_POLL_INTERVAL
+    )
+
+
+@app.on_event("shutdown")
+async def stop_notion_outbox():
+    """Stop the Notion outbox workers; undelivered entries stay in the outbox."""
+    await notion_outbox.stop()
+
+
+@app.on_event("shutdown")
+async def close_notion_client():
+    """Release the pooled Notion connections."""
+    await notion_transport.close_async_notion_client()
+
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    """Release the pooled OpenAI connections."""
+    await close_async_openai_client()
+
+
+metrics.register_stats("cache", summary_cache.stats)
+metrics.register_stats("rate_limiter", openai_rate_limiter.stats)
+metrics.register_stats("retry_policy", openai_retry_policy.stats)
+metrics.register_stats("newsletter_classifier", newsletter_classifier.stats)
+metrics.register_stats("sender_reputation", sender_reputation.stats)
+metrics.register_stats("preprocessor", email_preprocessor.stats)
+metrics.register_stats("notion_outbox", notion_outbox.stats)
+metrics.register_stats("idempotency", idempotency_store.stats)
+metrics.register_stats("jobs", job_manager.stats)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and record their latency per route."""
+    in_flight = metrics.HTTP_IN_FLIGHT.labels(app="fastapi")
+    in_flight.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        # Label by route template so path parameters do not explode the label set
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.HTTP_LATENCY.labels(app="fastapi", method=request.method, path=path).observe(
+            time.perf_counter() - start
+        )
+        metrics.HTTP_REQUESTS.labels(
+            app="fastapi", method=request.method, path=path, status=str(status_code)
+        ).inc()
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Record a trace for requests sent with the debug timing header, or sampled for export."""
+    debug = request.headers.get(tracing.DEBUG_TIMING_HEADER, "").lower() in ("1", "true", "yes")
+    if not tracing.should_trace(debug):
+        return await call_next(request)
+
+    with tracing.trace(f"{request.method} {request.url.path}", debug=debug) as trace:
+        response = await call_next(request)
+        trace.root.set_attribute("http.status_code", response.status_code)
+    response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
 
 @app.get("/")
 async def root():
@@ -442,7 +1297,15 @@ async def root():
         "endpoints": {
             "check_openai": "/api/check-openai",
             "process_email": "/api/process-email",
-            "health": "/api/health"
+            "process_emails": "/api/process-emails",
+            "jobs": "/api/jobs/{job_id}",
+            "cache_stats": "/api/cache-stats",
+            "stats": "/api/stats",
+            "metrics": "/metrics",
+            "outbox": "/api/outbox",
+            "health": "/api/health",
+            "liveness": "/api/health/live",
+            "readiness": "/api/health/ready"
         }
     }
 
@@ -450,26 +1313,194 @@ async def root():
 @app.get("/api/check-openai")
 async def check_openai():
     """Check OpenAI API connection status."""
-    return check_openai_connection()
+    return await check_openai_connection_async()
+
+
+def build_process_response(email: EmailContent, summary: str) -> dict:
+    """Build the response body returned for a processed email."""
+    return {
+        "status": "success",
+        "message": "Email processed successfully",
+        "summary": summary,
+        "metadata": {
+            "subject": email.subject,
+            "sender": email.sender,
+            "processed_at": datetime.now().isoformat()
+        }
+    }
+
+
+def finish_processing(email: EmailContent, summary: str) -> dict:
+    """Queue the summary for Notion when SAVE_TO_NOTION is set and build the response body."""
+    response = build_process_response(email, summary)
+    if SAVE_TO_NOTION:
+        with tracing.span("notion_outbox.enqueue"):
+            response["metadata"]["notion_outbox_id"] = queue_notion_page(summary, email.subject, email.sender)
+    trace = tracing.current_trace()
+    if trace is not None and trace.debug:
+        response["metadata"]["timings"] = trace.breakdown()
+    return response
+
+
+def format_sse(event: str, data) -> str:
+    """Format a Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_email_summary(email: EmailContent):
+    """
+    Stream the summary of an email as Server-Sent Events.
+
+    Emits a ``token`` event for each piece of the summary, then a ``done``
+    event carrying the same body the JSON endpoint returns. Errors raised
+    after the stream has started are reported as an ``error`` event.
+    """
+    if TEST_MODE:
+        summary = await process_email_content_async(email.subject, email.body)
+        yield format_sse("token", {"content": summary})
+        yield format_sse("done", finish_processing(email, summary))
+        return
+
+    cache_key = summary_cache_key(EMAIL_SUMMARY_PROMPT, "email_summary", email.subject, email.body)
+    summary = summary_cache.get(cache_key)
+    if summary is not None:
+        yield format_sse("token", {"content": summary})
+        yield format_sse("done", finish_processing(email, summary))
+        return
+
+    body = prepare_body(email.body)
+    with tracing.span("prompt_build"):
+        prompt = build_email_prompt(email.subject, body)
+        model = route_model("email_summary", prompt)
+
+    parts = []
+    start = time.perf_counter()
+    try:
+        async for content in stream_chat_completion_async(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=500
+        ):
+            parts.append(content)
+            yield format_sse("token", {"content": content})
+    except Exception as e:
+        error = openai_http_exception(e)
+        yield format_sse("error", {"status_code": error.status_code, "detail": error.detail})
+        return
+    model_router.record("email_summary", model, time.perf_counter() - start)
+    metrics.observe_stage("summarization", time.perf_counter() - start)
+
+    summary = "".join(parts)
+    summary_cache.set(cache_key, summary)
+    yield format_sse("done", finish_processing(email, summary))
+
+
+def wants_event_stream(request: Request, stream: bool) -> bool:
+    """Whether the caller opted into streaming via query flag or Accept header."""
+    return stream or "text/event-stream" in request.headers.get("accept", "")
+
+
+def wants_async_job(request: Request, async_mode: bool) -> bool:
+    """Whether the caller asked for a background job via query flag or ``Prefer: respond-async``."""
+    return async_mode or "respond-async" in request.headers.get("prefer", "").lower()
 
 
 @app.post("/api/process-email")
-async def process_email(email: EmailContent):
-    """Process incoming email and return a summary."""
+async def process_email(email: EmailContent, request: Request, response: Response, stream: bool = False,
+                        async_mode: bool = Query(False, alias="async")):
+    """
+    Process incoming email and return a summary.
+
+    Pass ``?stream=true`` or ``Accept: text/event-stream`` to receive the
+    summary as Server-Sent Events while it is generated.
+
+    Pass ``?async=true`` or ``Prefer: respond-async`` to get ``202`` with a
+    job ID at once; the result is then served at ``/api/jobs/{id}`` and
+    POSTed to ``callback_url`` when one is given.
+
+    Requests with an ``Idempotency-Key`` header, or a ``Message-ID`` in the
+    email headers, are processed once: duplicates get the stored or in-flight
+    result with ``Idempotent-Replayed: true``. Streamed requests are not
+    deduplicated.
+    """
+    if wants_event_stream(request, stream):
+        return StreamingResponse(
+            stream_email_summary(email),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    run_as_job = wants_async_job(request, async_mode)
+    if run_as_job and email.callback_url:
+        try:
+            # Resolves the host, which can take seconds
+            await asyncio.to_thread(validate_callback_url, email.callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    work = partial(submit_email_job, email) if run_as_job else partial(run_email_job, email)
+
+    key = idempotency_key(request.headers, email.headers)
+    if key is None:
+        result, replayed = await work(), False
+    else:
+        payload = {"subject": email.subject, "body": email.body, "sender": email.sender}
+        try:
+            result, replayed = await idempotency_store.run(key, request_fingerprint(payload), work)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    # A replay returns the first response for the key, whether it was queued or processed inline
+    if "status_url" in result:
+        response.status_code = 202
+        response.headers["Location"] = result["status_url"]
+    return result
+
+
+def email_job_payload(email: EmailContent) -> dict:
+    """The job payload for an email, as ``run_summarize_email_job`` expects it."""
+    return {"subject": email.subject, "body": email.body, "sender": email.sender, "headers": email.headers}
+
+
+async def submit_email_job(email: EmailContent) -> dict:
+    """Queue an email for background processing and build the 202 response body."""
+    try:
+        job = await asyncio.to_thread(
+            job_manager.submit, SUMMARIZE_EMAIL_JOB, email_job_payload(email), callback_url=email.callback_url
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return {"status": "accepted", "job_id": job["id"], "status_url": f"/api/jobs/{job['id']}"}
+
+
+async def run_email_job(email: EmailContent) -> dict:
+    """Record the email in the job queue and process it while the client waits."""
+    try:
+        return await job_manager.run_inline_async(SUMMARIZE_EMAIL_JOB, email_job_payload(email))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
+# Job kind for processed emails, consumed here and by worker.py
+SUMMARIZE_EMAIL_JOB = "summarize_email"
+
+
+async def run_summarize_email_job(payload: dict) -> dict:
+    """Job handler: process a queued email exactly as a synchronous request would."""
+    return await process_email_once(EmailContent(**payload))
+
+
+job_manager.register(SUMMARIZE_EMAIL_JOB, run_summarize_email_job)
+
+
+async def process_email_once(email: EmailContent) -> dict:
+    """Summarize an email, queue it for Notion and build the response body."""
     try:
         # Process the email content
-        summary = process_email_content(email.subject, email.body)
+        summary = await process_email_content_async(email.subject, email.body)
 
-        return {
-            "status": "success",
-            "message": "Email processed successfully",
-            "summary": summary,
-            "metadata": {
-                "subject": email.subject,
-                "sender": email.sender,
-                "processed_at": datetime.now().isoformat()
-            }
-        }
+        return finish_processing(email, summary)
 
     except HTTPException as e:
         raise e
@@ -480,13 +1511,128 @@ async def process_email(email: EmailContent):
         )
 
 
+@app.post("/api/process-emails")
+async def process_emails(emails: List[EmailContent]):
+    """
+    Process a batch of emails concurrently.
+
+    At most BATCH_MAX_PARALLELISM items are processed at once. Results are
+    returned in input order, each with its own status, so one failing item
+    does not fail the whole batch.
+    """
+    if len(emails) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(emails)} emails submitted, the limit is {BATCH_MAX_ITEMS}"
+        )
+
+    semaphore = asyncio.Semaphore(BATCH_MAX_PARALLELISM)
+
+    async def process_item(index: int, email: EmailContent) -> dict:
+        async with semaphore:
+            try:
+                # Recorded in the job queue like single requests, so a crash hands the item to a consumer
+                return {"index": index, **await run_email_job(email)}
+            except HTTPException as e:
+                status_code, message = e.status_code, e.detail
+            except Exception as e:
+                status_code, message = 500, f"Error processing email: {str(e)}"
+
+        return {
+            "index": index,
+            "status": "error",
+            "status_code": status_code,
+            "message": message,
+            "metadata": {
+                "subject": email.subject,
+                "sender": email.sender,
+                "processed_at": datetime.now().isoformat()
+            }
+        }
+
+    results = await asyncio.gather(*[process_item(i, email) for i, email in enumerate(emails)])
+    succeeded = sum(1 for result in results if result["status"] == "success")
+
+    return {
+        "status": "success" if succeeded == len(results) else "partial" if succeeded else "error",
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job, with its result once it has succeeded."""
+    job = await asyncio.to_thread(job_manager.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Summary cache hit/miss counters."""
+    return summary_cache.stats()
+
+
+@app.get("/api/stats")
+async def stats():
+    """Counters for tuning cost and latency."""
+    return {
+        "cache": summary_cache.stats(),
+        "chunker": chunker.stats(),
+        "rate_limiter": openai_rate_limiter.stats(),
+        "retry_policy": openai_retry_policy.stats(),
+        "newsletter_classifier": newsletter_classifier.stats(),
+        "sender_reputation": sender_reputation.stats(),
+        "preprocessor": email_preprocessor.stats(),
+        "model_router": model_router.stats(),
+        "idempotency": idempotency_store.stats(),
+        "jobs": job_manager.stats()
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Metrics in the Prometheus text format."""
+    return Response(content=metrics.latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+@app.get("/api/outbox")
+async def outbox_stats():
+    """Notion outbox depth and the age of its oldest undelivered entry."""
+    return notion_outbox.stats()
+
+
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint."""
-    openai_status = check_openai_connection()
+    """Health check endpoint, served from the last background check."""
+    await health_monitor.ensure_checked()
+    openai_status = health_monitor.results["openai"]
+    notion_status = health_monitor.results["notion"]
     return {
         "status": "healthy",
         "test_mode": TEST_MODE,
         "openai_status": openai_status["status"],
-        "openai_message": openai_status["message"]
+        "openai_message": openai_status["message"],
+        "notion_status": notion_status["status"],
+        "notion_message": notion_status["message"],
+        "last_checked": health_monitor.last_checked,
+        "age_seconds": health_monitor.age_seconds
     }
+
+
+@app.get("/api/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@app.get("/api/health/ready")
+async def readiness():
+    """Readiness probe: the last background check found every dependency reachable."""
+    await health_monitor.ensure_checked()
+    body = {"status": "ready" if health_monitor.ready else "not_ready", **health_monitor.snapshot()}
+    return JSONResponse(status_code=200 if health_monitor.ready else 503, content=body)
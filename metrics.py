@@ -0,0 +1,131 @@
+import functools
+import inspect
+import re
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+import tracing
+
+PREFIX = "email_processor"
+
+# Upstream calls and pipeline stages run from milliseconds to a minute
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+HTTP_REQUESTS = Counter(
+    f"{PREFIX}_http_requests_total", "HTTP requests handled", ["app", "method", "path", "status"]
+)
+HTTP_LATENCY = Histogram(
+    f"{PREFIX}_http_request_duration_seconds", "HTTP request latency", ["app", "method", "path"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(f"{PREFIX}_http_requests_in_flight", "HTTP requests being handled", ["app"])
+STAGE_LATENCY = Histogram(
+    f"{PREFIX}_stage_duration_seconds", "Latency of each processing stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_ERRORS = Counter(
+    f"{PREFIX}_upstream_errors_total", "Failed upstream calls by error type", ["upstream", "error"]
+)
+LLM_TOKENS = Counter(f"{PREFIX}_llm_tokens_total", "Tokens used by LLM calls", ["model", "kind"])
+LLM_IN_FLIGHT = Gauge(f"{PREFIX}_llm_requests_in_flight", "LLM requests awaiting a response")
+PIPELINE_SAVED = Counter(
+    f"{PREFIX}_newsletter_pipeline_saved_seconds_total",
+    "Seconds the newsletter pipeline saved by overlapping its LLM calls", ["mode"]
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record the latency of one run of a stage."""
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a run of the named stage, and as a span when tracing."""
+    start = time.perf_counter()
+    try:
+        with tracing.span(name):
+            yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def timed_stage(name: str):
+    """Decorator timing each call of a function, sync or async, as a run of the named stage."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_upstream_error(upstream: str, e: Exception):
+    """Count a failed call to an upstream service."""
+    UPSTREAM_ERRORS.labels(upstream=upstream, error=type(e).__name__).inc()
+
+
+def record_token_usage(model: str, usage):
+    """Count the prompt and completion tokens reported on a completion."""
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int):
+            LLM_TOKENS.labels(model=model, kind=kind).inc(tokens)
+
+
+class StatsCollector:
+    """
+    Exports the numeric fields of ``stats()`` dictionaries as gauges.
+
+    Components such as the summary cache already keep hit and miss counters;
+    they are read at scrape time instead of being duplicated in metrics.
+    """
+
+    def __init__(self):
+        self.sources = {}
+
+    def collect(self):
+        for name, stats in list(self.sources.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"metrics: could not read {name} stats: {str(e)}")
+                continue
+            yield from self._families(f"{PREFIX}_{name}", values)
+
+    def _families(self, prefix: str, values: dict):
+        for field, value in values.items():
+            if isinstance(value, dict):
+                yield from self._families(f"{prefix}_{field}", value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{field}")
+                family = GaugeMetricFamily(name, f"{field} from {prefix} stats")
+                family.add_metric([], value)
+                yield family
+
+
+_stats_collector = StatsCollector()
+REGISTRY.register(_stats_collector)
+
+
+def register_stats(name: str, stats):
+    """Export a component's ``stats()`` callable under ``email_processor_<name>_*``."""
+    _stats_collector.sources[name] = stats
+
+
+def latest() -> bytes:
+    """Render all metrics in the Prometheus text format."""
+    return generate_latest(REGISTRY)
+
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Tasks with short, bounded prompts that never need a large-context model
+CLASSIFICATION_TASKS = {"newsletter_check", "title"}
+
+# Latency samples kept per route for percentile reporting
+LATENCY_WINDOW = 500
+
+
+def parse_task_models(value: str) -> dict:
+    """Parse ``"task=model,task=model"`` into a task-to-model mapping."""
+    routes = {}
+    for item in (value or "").split(","):
+        task, _, model = item.partition("=")
+        if task.strip() and model.strip():
+            routes[task.strip()] = model.strip()
+    return routes
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class ModelRouter:
+    """
+    Picks the model for each LLM call from the task and prompt size.
+
+    Classification tasks and prompts up to ``large_threshold`` tokens go to
+    ``small_model``; longer prompts go to ``large_model``. ``task_models``
+    pins a task to a model regardless of size. Latency is recorded per task
+    and model so the threshold can be tuned against p95 latency and cost.
+    """
+
+    def __init__(self, small_model: str, large_model: str, large_threshold: int = 3000,
+                 task_models: dict = None):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.large_threshold = large_threshold
+        self.task_models = dict(task_models or {})
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._calls = {}
+
+    def route(self, task: str, prompt_tokens: int = 0) -> str:
+        """
+        Return the model to use.
+
+        Args:
+            task (str): The kind of call, e.g. ``"email_summary"``.
+            prompt_tokens (int): Tokens in the preprocessed prompt.
+
+        Returns:
+            str: The model name.
+        """
+        if task in self.task_models:
+            return self.task_models[task]
+        if task in CLASSIFICATION_TASKS or prompt_tokens <= self.large_threshold:
+            return self.small_model
+        return self.large_model
+
+    def record(self, task: str, model: str, seconds: float):
+        """Record the latency of a call made on a route."""
+        key = (task, model)
+        with self._lock:
+            self._calls[key] = self._calls.get(key, 0) + 1
+            self._latencies.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    @contextmanager
+    def measure(self, task: str, model: str):
+        """Record how long the enclosed call takes on the route."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(task, model, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        """Return the routing rules and per-route call counts and latency."""
+        with self._lock:
+            routes = {}
+            for (task, model), samples in self._latencies.items():
+                samples = list(samples)
+                routes.setdefault(task, {})[model] = {
+                    "calls": self._calls[(task, model)],
+                    "avg_seconds": round(sum(samples) / len(samples), 3),
+                    "p50_seconds": round(_percentile(samples, 0.5), 3),
+                    "p95_seconds": round(_percentile(samples, 0.95), 3)
+                }
+            return {
+                "small_model": self.small_model,
+                "large_model": self.large_model,
+                "large_threshold": self.large_threshold,
+                "task_models": dict(self.task_models),
+                "routes": routes
+            }
+
+
+def openai_models() -> list:
+    """The chat models in OPENAI_MODELS, smallest and fastest first."""
+    return [m.strip() for m in os.getenv("OPENAI_MODELS", "gpt-3.5-turbo,gpt-3.5-turbo-16k").split(",") if m.strip()]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide router configured from the environment."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            models = openai_models()
+            # Short and classification prompts use the first model; prompts over the threshold use the last
+            _router = ModelRouter(
+                small_model=models[0],
+                large_model=models[-1],
+                large_threshold=int(os.getenv("MODEL_ROUTER_LARGE_THRESHOLD", "3000")),
+                task_models=parse_task_models(os.getenv("MODEL_ROUTER_TASK_MODELS", ""))
+            )
+        return _router
@@ -0,0 +1,136 @@
+import math
+import re
+import threading
+
+# Local parts commonly used by bulk senders
+BULK_SENDER_NAMES = {
+    "newsletter", "newsletters", "news", "digest", "updates", "update", "noreply", "no-reply",
+    "donotreply", "do-not-reply", "hello", "info", "marketing", "team", "weekly", "editor", "editors"
+}
+
+# Domains of email service providers that send on behalf of newsletters
+BULK_SENDER_DOMAINS = (
+    "substack.com", "beehiiv.com", "mailchimp.com", "mcsv.net", "mcdlv.net", "convertkit.com",
+    "ck.page", "sendgrid.net", "mailerlite.com", "buttondown.email", "ghost.io", "revue.email",
+    "campaign-archive.com", "createsend.com", "hubspotemail.net", "list-manage.com"
+)
+
+# Evidence weights, in log-odds, for and against an email being a newsletter
+WEIGHTS = {
+    "list_unsubscribe_header": 2.5,
+    "list_id_header": 1.5,
+    "bulk_precedence": 1.5,
+    "bulk_sender_name": 1.0,
+    "bulk_sender_domain": 2.0,
+    "unsubscribe_link": 1.5,
+    "view_in_browser": 1.5,
+    "newsletter_subject": 1.0,
+    "reply_or_forward": -2.0,
+    "short_plain_body": -1.5,
+    "no_bulk_signals": -1.5,
+}
+
+_VIEW_IN_BROWSER = re.compile(r"view (this email )?(it )?(in (your|a|the) )?(web )?browser|view (it )?online|view as a web ?page", re.I)
+_NEWSLETTER_SUBJECT = re.compile(r"newsletter|digest|weekly|monthly|issue\s*#?\d+|edition|roundup|this week in", re.I)
+_REPLY_SUBJECT = re.compile(r"^\s*(re|fwd?|aw|wg)\s*:", re.I)
+
+
+def _sender_parts(sender: str):
+    match = re.search(r"([\w.+-]+)@([\w.-]+)", sender or "")
+    if not match:
+        return "", ""
+    return match.group(1).lower(), match.group(2).lower()
+
+
+class NewsletterClassifier:
+    """
+    Scores how likely an email is a newsletter from headers and content alone.
+
+    Emails scoring at or above ``threshold`` are classified as newsletters,
+    and at or below ``1 - threshold`` as not newsletters, without calling the
+    LLM. Only the ambiguous middle band is left for the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.85):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.classified = 0
+        self.local_newsletter = 0
+        self.local_not_newsletter = 0
+        self.deferred_to_llm = 0
+
+    def signals(self, subject: str, body: str, sender: str = "", headers: dict = None) -> dict:
+        """Return the evidence found in the email, keyed by WEIGHTS name."""
+        headers = {key.lower(): str(value) for key, value in (headers or {}).items()}
+        body = body or ""
+        lowered_body = body.lower()
+        local_part, domain = _sender_parts(sender)
+
+        found = {
+            "list_unsubscribe_header": "list-unsubscribe" in headers,
+            "list_id_header": "list-id" in headers,
+            "bulk_precedence": headers.get("precedence", "").strip().lower() in ("bulk", "list", "junk"),
+            "bulk_sender_name": local_part in BULK_SENDER_NAMES,
+            "bulk_sender_domain": any(domain == d or domain.endswith("." + d) for d in BULK_SENDER_DOMAINS),
+            "unsubscribe_link": "unsubscribe" in lowered_body,
+            "view_in_browser": bool(_VIEW_IN_BROWSER.search(body)),
+            "newsletter_subject": bool(_NEWSLETTER_SUBJECT.search(subject or "")),
+            "reply_or_forward": bool(_REPLY_SUBJECT.search(subject or "")),
+            "short_plain_body": len(body) < 500 and "http" not in lowered_body,
+        }
+        found["no_bulk_signals"] = not any(
+            found[name] for name in (
+                "list_unsubscribe_header", "list_id_header", "bulk_precedence",
+                "bulk_sender_domain", "unsubscribe_link", "view_in_browser"
+            )
+        )
+        return found
+
+    def score(self, subject: str, body: str, sender: str = "", headers: dict = None) -> float:
+        """
+        Return the probability that the email is a newsletter.
+
+        Args:
+            subject (str): The email subject.
+            body (str): The email body.
+            sender (str): The sender address, optionally with a display name.
+            headers (dict): Raw email headers, if available.
+
+        Returns:
+            float: A confidence between 0 and 1.
+        """
+        found = self.signals(subject, body, sender, headers)
+        logit = sum(WEIGHTS[name] for name, present in found.items() if present)
+        return 1 / (1 + math.exp(-logit))
+
+    def classify(self, subject: str, body: str, sender: str = "", headers: dict = None):
+        """
+        Classify the email locally when the score is confident enough.
+
+        Returns:
+            bool: The verdict, or None when the LLM should decide.
+        """
+        confidence = self.score(subject, body, sender, headers)
+        with self._lock:
+            self.classified += 1
+            if confidence >= self.threshold:
+                self.local_newsletter += 1
+                return True
+            if confidence <= 1 - self.threshold:
+                self.local_not_newsletter += 1
+                return False
+            self.deferred_to_llm += 1
+            return None
+
+    def stats(self) -> dict:
+        """Return how many classifications were answered locally."""
+        with self._lock:
+            avoided = self.local_newsletter + self.local_not_newsletter
+            return {
+                "threshold": self.threshold,
+                "classified": self.classified,
+                "local_newsletter": self.local_newsletter,
+                "local_not_newsletter": self.local_not_newsletter,
+                "deferred_to_llm": self.deferred_to_llm,
+                "llm_calls_avoided_ratio": round(avoided / self.classified, 4) if self.classified else 0.0
+            }
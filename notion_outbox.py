@@ -0,0 +1,209 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a delivery function when retrying the entry cannot succeed."""
+
+
+class NotionOutbox:
+    """
+    Durable write-behind queue for Notion pages.
+
+    Pages are stored in a SQLite table and delivered by background workers.
+    Failed deliveries are retried with jittered exponential backoff; entries
+    that fail permanently or exhaust their attempts are kept as ``dead`` so
+    they can be inspected instead of being lost.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 8, base_delay: float = 2,
+                 max_delay: float = 300, claim_timeout: float = 120):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._db = None
+        self._tasks = []
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so importing the app does not create the database file
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS notion_outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, "
+                "next_attempt_at REAL NOT NULL, "
+                "claimed_until REAL, "
+                "last_error TEXT)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS notion_outbox_due ON notion_outbox (status, next_attempt_at)"
+            )
+        return self._db
+
+    def enqueue(self, page: dict) -> int:
+        """
+        Store a page for delivery.
+
+        Args:
+            page (dict): The body passed to ``pages.create``.
+
+        Returns:
+            int: The outbox entry ID.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO notion_outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+                (json.dumps(page), now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self):
+        """
+        Claim the oldest due entry for delivery.
+
+        Entries claimed by a worker that died are reclaimed once their claim
+        has not been extended for ``claim_timeout`` seconds.
+
+        Returns:
+            tuple: ``(id, page, attempts)``, or None when nothing is due.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, payload, attempts FROM notion_outbox "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "OR (status = 'delivering' AND claimed_until <= ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE notion_outbox SET status = 'delivering', claimed_until = ? WHERE id = ?",
+                        (now + self.claim_timeout, row[0])
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def extend(self, entry_id: int):
+        """Keep a claim held while its delivery is still in flight."""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE notion_outbox SET claimed_until = ? WHERE id = ? AND status = 'delivering'",
+                (time.time() + self.claim_timeout, entry_id)
+            )
+
+    def mark_delivered(self, entry_id: int):
+        """Remove a delivered entry."""
+        with self._lock:
+            self._connection().execute("DELETE FROM notion_outbox WHERE id = ?", (entry_id,))
+
+    def mark_failed(self, entry_id: int, attempts: int, error: str, permanent: bool = False):
+        """Schedule a retry with backoff, or mark the entry dead."""
+        attempts += 1
+        if permanent or attempts >= self.max_attempts:
+            status, next_attempt_at = "dead", time.time()
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            status, next_attempt_at = "pending", time.time() + random.uniform(delay / 2, delay)
+        with self._lock:
+            self._connection().execute(
+                "UPDATE notion_outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "claimed_until = NULL, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, error[:1000], entry_id)
+            )
+
+    def stats(self) -> dict:
+        """Return the outbox depth and the age of its oldest undelivered entry."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT status, COUNT(*), MIN(created_at) FROM notion_outbox GROUP BY status"
+            ).fetchall()
+        counts = {status: count for status, count, _ in rows}
+        oldest = [created_at for status, _, created_at in rows if status != "dead"]
+        return {
+            "depth": counts.get("pending", 0) + counts.get("delivering", 0),
+            "pending": counts.get("pending", 0),
+            "delivering": counts.get("delivering", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_age_seconds": round(time.time() - min(oldest), 3) if oldest else None
+        }
+
+    async def deliver_next(self, deliver) -> bool:
+        """
+        Claim and deliver one entry.
+
+        Args:
+            deliver: Async callable taking the page dict.
+
+        Returns:
+            bool: Whether an entry was claimed.
+        """
+        claimed = self.claim()
+        if claimed is None:
+            return False
+        entry_id, page, attempts = claimed
+        # A slow delivery can outlast claim_timeout, so keep the entry from being claimed twice
+        heartbeat = asyncio.create_task(self._heartbeat(entry_id))
+        try:
+            await deliver(page)
+        except PermanentDeliveryError as e:
+            print(f"Notion outbox entry {entry_id} failed permanently: {str(e)}")
+            self.mark_failed(entry_id, attempts, str(e), permanent=True)
+        except Exception as e:
+            print(f"Notion outbox entry {entry_id} failed (attempt {attempts + 1}): {str(e)}")
+            self.mark_failed(entry_id, attempts, str(e))
+        else:
+            self.mark_delivered(entry_id)
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def _heartbeat(self, entry_id: int):
+        while True:
+            await asyncio.sleep(self.claim_timeout / 3)
+            self.extend(entry_id)
+
+    async def _worker(self, deliver, poll_interval: float):
+        while True:
+            try:
+                if not await self.deliver_next(deliver):
+                    await asyncio.sleep(poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Notion outbox worker error: {str(e)}")
+                await asyncio.sleep(poll_interval)
+
+    def start(self, deliver, workers: int = 2, poll_interval: float = 1.0):
+        """Start draining the outbox with ``workers`` background tasks."""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(deliver, poll_interval)) for _ in range(workers)]
+
+    async def stop(self):
+        """Stop the background workers."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+
+# Root URL of the Notion API; point it at a stand-in server for offline runs
+NOTION_API_BASE = os.getenv("NOTION_API_BASE", "https://api.notion.com").rstrip("/")
+NOTION_VERSION = "2022-06-28"
+
+# Keep-alive connections kept per client, and connect/read timeouts in seconds
+NOTION_POOL_SIZE = int(os.getenv("NOTION_POOL_SIZE", "10"))
+NOTION_CONNECT_TIMEOUT = float(os.getenv("NOTION_CONNECT_TIMEOUT", "5"))
+NOTION_READ_TIMEOUT = float(os.getenv("NOTION_READ_TIMEOUT", "30"))
+
+_lock = threading.Lock()
+_session = None
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def notion_url(path: str) -> str:
+    """Build the full URL for a Notion API path such as ``/v1/pages``."""
+    return f"{NOTION_API_BASE}{path}"
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=NOTION_POOL_SIZE, max_keepalive_connections=NOTION_POOL_SIZE)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(NOTION_READ_TIMEOUT, connect=NOTION_CONNECT_TIMEOUT)
+
+
+def _client_options() -> dict:
+    return {
+        "auth": os.getenv("NOTION_KEY"),
+        "base_url": NOTION_API_BASE,
+        "timeout_ms": int(NOTION_READ_TIMEOUT * 1000),
+        "notion_version": NOTION_VERSION,
+        # Retries are handled by the outbox; the SDK's own would stack on top of them
+        "retry": False
+    }
+
+
+def _configure(notion):
+    # The SDK replaces the HTTP client's timeout with a single read timeout, dropping the connect timeout
+    notion.client.timeout = _timeout()
+    return notion
+
+
+def get_session():
+    """
+    Return the process-wide keep-alive ``requests.Session`` for raw Notion API requests.
+
+    The session carries the authorization and version headers, so callers
+    only supply the path and body.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            # requests and notion_client are imported on first use, so importing the apps does not load them
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=NOTION_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Authorization": f"Bearer {os.getenv('NOTION_KEY')}",
+                "Content-Type": "application/json",
+                "Notion-Version": NOTION_VERSION
+            })
+            _session = session
+        return _session
+
+
+def request_timeout() -> tuple:
+    """Return the (connect, read) timeout used with the shared session."""
+    return (NOTION_CONNECT_TIMEOUT, NOTION_READ_TIMEOUT)
+
+
+def get_notion_client():
+    """Return the process-wide ``notion_client.Client`` backed by a pooled HTTP client."""
+    global _client
+    with _lock:
+        if _client is None:
+            from notion_client import Client
+            _client = _configure(Client(client=httpx.Client(limits=_limits()), **_client_options()))
+        return _client
+
+
+def get_async_notion_client():
+    """
+    Return the ``notion_client.AsyncClient`` for the running event loop.
+
+    Async connection pools cannot be shared between event loops, so one
+    client is kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+    notion = _async_clients.get(loop)
+    if notion is None:
+        from notion_client import AsyncClient
+        notion = _configure(AsyncClient(client=httpx.AsyncClient(limits=_limits()), **_client_options()))
+        _async_clients[loop] = notion
+    return notion
+
+
+async def close_async_notion_client():
+    """Close the running loop's async client and release its connections."""
+    notion = _async_clients.pop(asyncio.get_running_loop(), None)
+    if notion is not None:
+        await notion.aclose()
+
+
+def close():
+    """Close the synchronous session and client."""
+    global _session, _client
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        if _client is not None:
+            _client.close()
+            _client = None
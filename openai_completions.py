@@ -0,0 +1,31 @@
+import metrics
+import tracing
+from rate_limiter import OpenAIRateLimiter, estimate_request_tokens
+
+
+def complete_once(client, rate_limiter: OpenAIRateLimiter, timeout: float, **kwargs):
+    """
+    Make one chat completion request once the rate limiter admits it, without retrying.
+
+    Shared by the FastAPI and Flask apps so every OpenAI call is limited,
+    traced and recorded in the metrics the same way; callers retry it with
+    their ``RetryPolicy``.
+
+    Args:
+        client: The OpenAI client to call.
+        rate_limiter (OpenAIRateLimiter): The limiter the request waits for.
+        timeout (float): Seconds the request may take, usually the retry policy's ``attempt_timeout``.
+        **kwargs: Arguments passed to ``chat.completions.create``.
+
+    Returns:
+        The completion returned by the OpenAI client.
+    """
+    rate_limiter.acquire(estimate_request_tokens(kwargs))
+    with metrics.LLM_IN_FLIGHT.track_inprogress(), tracing.span("openai.chat.completions", model=kwargs.get("model", "")):
+        try:
+            response = client.chat.completions.create(timeout=timeout, **kwargs)
+        except Exception as e:
+            metrics.record_upstream_error("openai", e)
+            raise
+    metrics.record_token_usage(kwargs.get("model", ""), getattr(response, "usage", None))
+    return response
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+
+import httpx
+
+from token_utils import count_tokens
+
+# Completion tokens assumed for requests that do not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimitWaitExceeded(Exception):
+    """Raised when a request would have to queue longer than the limiter allows."""
+
+    def __init__(self, wait_seconds: float):
+        self.wait_seconds = wait_seconds
+        super().__init__(f"OpenAI rate limit: request would wait {wait_seconds:.1f}s for capacity")
+
+
+def parse_reset_duration(value: str):
+    """Parse an OpenAI reset header such as ``"6m0s"`` or ``"17ms"`` into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def estimate_request_tokens(kwargs: dict, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Estimate the tokens a chat completion request counts against the TPM limit.
+
+    Counts the prompt messages and any function definitions, plus the
+    requested completion budget.
+
+    Args:
+        kwargs (dict): The arguments passed to ``chat.completions.create``.
+        model (str): The model used for token counting.
+
+    Returns:
+        int: The estimated token count.
+    """
+    tokens = 0
+    for message in kwargs.get("messages", []):
+        tokens += 4 + count_tokens(message.get("content") or "", model)
+    if kwargs.get("functions"):
+        tokens += count_tokens(json.dumps(kwargs["functions"]), model)
+    return tokens + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    """A bucket holding up to ``capacity`` units that refills continuously per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` units are available."""
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class OpenAIRateLimiter:
+    """
+    Client-side limiter for the OpenAI requests-per-minute and tokens-per-minute budgets.
+
+    Each request reserves one request and its estimated tokens before it is
+    sent. When either budget is exhausted the caller waits for it to refill
+    instead of receiving a 429. Rate-limit headers on API responses
+    resynchronize the budgets with what the account actually has left.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_wait: float = 60):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve capacity if available; otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            # A request larger than the whole budget can never fit; let it use the full bucket
+            tokens = min(tokens, self.tokens.capacity)
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait == 0:
+                self.requests.tokens -= 1
+                self.tokens.tokens -= tokens
+                self.admitted += 1
+            return wait
+
+    def _check_wait(self, waited: float, wait: float):
+        if waited + wait > self.max_wait:
+            with self._lock:
+                self.rejected += 1
+            raise RateLimitWaitExceeded(waited + wait)
+
+    def _record_wait(self, waited: float):
+        if waited:
+            with self._lock:
+                self.delayed += 1
+                self.total_wait += waited
+
+    def acquire(self, tokens: int):
+        """Block until the request fits both budgets."""
+        waited = 0.0
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0:
+                self._record_wait(waited)
+                return
+            self._check_wait(waited, wait)
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens: int):
+        """Wait without blocking the event loop until the request fits both budgets."""
+        waited = 0.0
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0:
+                self._record_wait(waited)
+                return
+            self._check_wait(waited, wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def update_from_headers(self, headers):
+        """Adjust the budgets from ``x-ratelimit-*`` response headers."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                try:
+                    if limit is not None:
+                        bucket.capacity = float(limit)
+                    if remaining is not None:
+                        bucket.refill(now)
+                        bucket.tokens = min(bucket.capacity, float(remaining))
+                except ValueError:
+                    continue
+
+            # After a 429, hold further requests until the server says capacity is back
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests", ""))
+            if headers.get("x-ratelimit-remaining-requests") == "0" and reset:
+                self.requests.tokens = -reset * self.requests.rate
+
+    def reset(self):
+        """Refill both budgets and clear the counters."""
+        with self._lock:
+            for bucket in (self.requests, self.tokens):
+                bucket.tokens = bucket.capacity
+                bucket.updated = time.monotonic()
+            self.admitted = 0
+            self.delayed = 0
+            self.rejected = 0
+            self.total_wait = 0.0
+
+    def stats(self) -> dict:
+        """Return the current budgets and admission counters."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                "available_requests": round(self.requests.tokens, 2),
+                "available_tokens": round(self.tokens.tokens, 2),
+                "admitted": self.admitted,
+                "delayed": self.delayed,
+                "rejected": self.rejected,
+                "total_wait_seconds": round(self.total_wait, 3)
+            }
+
+    def http_client(self) -> httpx.Client:
+        """Build an httpx client for ``OpenAI`` that feeds response headers back to the limiter."""
+        return httpx.Client(event_hooks={"response": [lambda response: self.update_from_headers(response.headers)]})
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        """Build an httpx client for ``AsyncOpenAI`` that feeds response headers back to the limiter."""
+        async def observe(response):
+            self.update_from_headers(response.headers)
+
+        return httpx.AsyncClient(event_hooks={"response": [observe]})
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_openai_rate_limiter() -> OpenAIRateLimiter:
+    """Return the process-wide limiter configured from the environment."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = OpenAIRateLimiter(
+                requests_per_minute=float(os.getenv("OPENAI_RPM_LIMIT", "3500")),
+                tokens_per_minute=float(os.getenv("OPENAI_TPM_LIMIT", "90000")),
+                max_wait=float(os.getenv("OPENAI_RATE_LIMIT_MAX_WAIT", "60"))
+            )
+        return _limiter
+
+
+def reset_openai_rate_limiter():
+    """Refill the shared OpenAI budgets and clear their counters, e.g. between tests."""
+    get_openai_rate_limiter().reset()
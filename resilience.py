@@ -0,0 +1,225 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} circuit is open after repeated failures; retry in {retry_after:.0f}s")
+
+
+def is_transient_error(e: Exception) -> bool:
+    """Whether an error is worth retrying: timeouts, connection errors, 5xx and rate limits."""
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # Imported here so importing this module does not load the OpenAI SDK
+    import openai
+
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(e, openai.RateLimitError):
+        # Quota exhaustion will not clear by retrying
+        return "insufficient_quota" not in str(e)
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code >= 500 or e.status_code in (408, 409)
+    return False
+
+
+def is_upstream_response(e: Exception) -> bool:
+    """Whether an error carries a reply from upstream, as opposed to failing before the request was sent."""
+    import openai
+
+    return isinstance(e, openai.APIStatusError)
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures.
+
+    After ``failure_threshold`` consecutive transient failures the circuit
+    opens and calls are rejected for ``reset_timeout`` seconds. It then lets
+    one trial call through (half-open); success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may proceed."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == "open" and elapsed >= self.reset_timeout:
+                self.state = "half_open"
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.name, max(self.reset_timeout - elapsed, 0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def release_trial(self):
+        """Give back the half-open trial when it ended without a result (e.g. it was cancelled)."""
+        with self._lock:
+            if self.state == "half_open":
+                # opened_at is still past the reset timeout, so the next call becomes the trial
+                self.state = "open"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def reset(self):
+        """Close the circuit and clear its counters."""
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.opened_at = None
+            self.times_opened = 0
+            self.rejected = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
+
+
+class RetryPolicy:
+    """
+    Retries transient failures with jittered exponential backoff behind a circuit breaker.
+
+    Every attempt first checks the breaker, so an open circuit fails fast
+    instead of tying up a worker for the full retry schedule.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8, attempt_timeout: float = 60):
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.retries = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt`` (starting at 1)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _should_retry(self, e: Exception, attempt: int) -> bool:
+        if is_transient_error(e):
+            self.breaker.record_failure()
+            return attempt < self.max_attempts
+        if is_upstream_response(e):
+            # The upstream answered; the failure is about this request, not availability
+            self.breaker.record_success()
+        else:
+            # Failed locally (e.g. a rate limiter wait or a bad argument), so upstream health is unknown
+            self.breaker.release_trial()
+        return False
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func, retrying transient failures.
+
+        Callers enforce the per-attempt timeout by passing ``attempt_timeout``
+        as the request timeout of the client they call, so time spent queueing
+        for a rate limiter or concurrency slot does not count against it.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                self.retries += 1
+                time.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """Await func(), retrying transient failures; see ``call`` for timeouts."""
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                # Cancelled or interrupted: no verdict on upstream health, but a half-open trial must not stay taken
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        return {"retries": self.retries, "max_attempts": self.max_attempts, "circuit": self.breaker.stats()}
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_openai_retry_policy() -> RetryPolicy:
+    """Return the process-wide retry policy and circuit breaker for OpenAI calls."""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = RetryPolicy(
+                breaker=CircuitBreaker(
+                    "OpenAI",
+                    failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")),
+                    reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_TIMEOUT", "30"))
+                ),
+                max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+                base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+                max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8")),
+                attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "60"))
+            )
+        return _policy
+
+
+def reset_openai_retry_policy():
+    """Close the shared OpenAI circuit and clear its counters, e.g. between tests."""
+    policy = get_openai_retry_policy()
+    policy.breaker.reset()
+    policy.retries = 0
@@ -0,0 +1,161 @@
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+
+# Shared mailbox providers; a verdict for one of their users says nothing about the others
+FREEMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "yahoo.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "fastmail.com"
+}
+
+
+def sender_keys(sender: str) -> list:
+    """
+    Return the reputation keys for a sender, most specific first.
+
+    Args:
+        sender (str): The sender address, optionally with a display name.
+
+    Returns:
+        list: ``["sender:<address>", "domain:<domain>"]``, or fewer when the
+        address cannot be parsed or the domain is a shared mailbox provider.
+    """
+    match = re.search(r"([\w.+-]+)@([\w.-]+)", sender or "")
+    if not match:
+        return []
+    address = f"{match.group(1)}@{match.group(2)}".lower()
+    domain = match.group(2).lower()
+    keys = [f"sender:{address}"]
+    if domain not in FREEMAIL_DOMAINS:
+        keys.append(f"domain:{domain}")
+    return keys
+
+
+class SenderReputation:
+    """
+    Persistent per-sender and per-domain newsletter verdicts.
+
+    Each classification adds one vote for its verdict. Votes decay with a
+    half-life of ``half_life_days`` so a sender that changes what it sends is
+    eventually judged on its recent mail. Once a key holds at least
+    ``min_observations`` decayed votes and one verdict has ``confidence`` of
+    them, that verdict is returned without classifying the email. A
+    ``recheck_rate`` share of confident lookups is still sent to the
+    classifier so drift is noticed.
+    """
+
+    def __init__(self, db_path: str, min_observations: float = 3, confidence: float = 0.9,
+                 half_life_days: float = 30, recheck_rate: float = 0.05):
+        self.db_path = db_path
+        self.min_observations = min_observations
+        self.confidence = confidence
+        self.half_life = half_life_days * 86400
+        self.recheck_rate = recheck_rate
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        self.rechecks = 0
+        self.recorded = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so importing the app does not create the database file
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sender_reputation ("
+                "key TEXT PRIMARY KEY, "
+                "newsletter REAL NOT NULL DEFAULT 0, "
+                "not_newsletter REAL NOT NULL DEFAULT 0, "
+                "updated_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _decay(self, updated_at: float, now: float) -> float:
+        if self.half_life <= 0:
+            return 1.0
+        return math.pow(0.5, max(now - updated_at, 0) / self.half_life)
+
+    def _votes(self, key: str, now: float):
+        row = self._connection().execute(
+            "SELECT newsletter, not_newsletter, updated_at FROM sender_reputation WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 0.0, 0.0
+        factor = self._decay(row[2], now)
+        return row[0] * factor, row[1] * factor
+
+    def lookup(self, sender: str):
+        """
+        Return the confident verdict for a sender, if there is one.
+
+        The sender's own history is preferred; the domain's history is used
+        when the sender has too few votes.
+
+        Returns:
+            bool: The verdict, or None when the email should be classified.
+        """
+        keys = sender_keys(sender)
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                newsletter, not_newsletter = self._votes(key, now)
+                total = newsletter + not_newsletter
+                # Round so votes cast moments ago still count in full
+                if round(total, 6) < self.min_observations:
+                    continue
+                if max(newsletter, not_newsletter) / total < self.confidence:
+                    # Mixed history; a broader key would not be more trustworthy
+                    break
+                if random.random() < self.recheck_rate:
+                    self.rechecks += 1
+                    return None
+                self.hits += 1
+                return newsletter > not_newsletter
+            self.misses += 1
+            return None
+
+    def record(self, sender: str, verdict: bool):
+        """Add a classification result to the sender's and domain's history."""
+        keys = sender_keys(sender)
+        if not keys:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for key in keys:
+                    newsletter, not_newsletter = self._votes(key, now)
+                    if verdict:
+                        newsletter += 1
+                    else:
+                        not_newsletter += 1
+                    db.execute(
+                        "INSERT OR REPLACE INTO sender_reputation (key, newsletter, not_newsletter, updated_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, newsletter, not_newsletter, now)
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            self.recorded += 1
+
+    def stats(self) -> dict:
+        """Return how many lookups were answered from the store."""
+        with self._lock:
+            keys = self._connection().execute("SELECT COUNT(*) FROM sender_reputation").fetchone()[0]
+            lookups = self.hits + self.misses + self.rechecks
+            return {
+                "keys": keys,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rechecks": self.rechecks,
+                "recorded": self.recorded,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
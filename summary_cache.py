@@ -0,0 +1,141 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace so trivially different copies share a key."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+class SummaryCache:
+    """
+    Content-addressed cache for LLM results.
+
+    Entries live in an in-memory LRU tier with a TTL. When a database path is
+    given, entries are also written to SQLite so they survive restarts; a
+    memory miss falls through to SQLite and promotes the entry back into memory.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS summary_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(template: str, model: str, subject: str, body: str) -> str:
+        """
+        Build the cache key for a prompt.
+
+        Args:
+            template (str): The prompt template the result was generated from.
+            model (str): The model name.
+            subject (str): The email subject.
+            body (str): The email body.
+
+        Returns:
+            str: A SHA-256 hex digest identifying the request.
+        """
+        payload = json.dumps(
+            [template, model, normalize_text(subject), normalize_text(body)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM summary_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = json.loads(row[0]), row[1]
+                    if not self._expired(created_at):
+                        self._store_in_memory(key, value, created_at)
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM summary_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        """Store a JSON-serializable value under key."""
+        created_at = time.time()
+        with self._lock:
+            self._store_in_memory(key, value, created_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO summary_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), created_at)
+                )
+                self._db.commit()
+
+    def _store_in_memory(self, key, value, created_at):
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM summary_cache")
+                self._db.commit()
+            self.memory_hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            stats = {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None
+            }
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(
+                    "SELECT COUNT(*) FROM summary_cache"
+                ).fetchone()[0]
+            return stats
@@ -1,10 +1,13 @@
 import unittest
+import time
+from test_support import OpenAITestCase
 from app import app
 import json
 
-class TestFlaskApp(unittest.TestCase):
+class TestFlaskApp(OpenAITestCase):
     def setUp(self):
         """Set up test client"""
+        super().setUp()
         self.app = app.test_client()
         self.app.testing = True
 
@@ -74,6 +77,49 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         print("✅ Invalid webhook test passed")
 
+    def test_async_webhook(self):
+        """Test webhook job mode"""
+        print("\n=== Testing Async Webhook ===")
+
+        test_data = {
+            "type": "email",
+            "data": {
+                "subject": "Webhook Test",
+                "body": "Testing webhook functionality",
+                "sender": "webhook@example.com"
+            }
+        }
+        response = self.app.post('/webhook?async=true',
+                               data=json.dumps(test_data),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        accepted = json.loads(response.data)
+        self.assertEqual(response.headers['Location'], accepted['status_url'])
+
+        deadline = time.monotonic() + 5
+        while True:
+            job = json.loads(self.app.get(accepted['status_url']).data)
+            if job['status'] in ('succeeded', 'failed') or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertIn('summary', job['result'])
+
+        self.assertEqual(self.app.get('/api/jobs/unknown').status_code, 404)
+        print("✅ Async webhook test passed")
+
+    def test_metrics(self):
+        """Test Prometheus metrics endpoint"""
+        print("\n=== Testing Metrics Endpoint ===")
+
+        self.app.get('/api/health')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.data.decode()
+        self.assertIn('email_processor_http_requests_total{app="flask",method="GET",path="/api/health",status="200"}', text)
+        self.assertIn('email_processor_http_requests_in_flight{app="flask"}', text)
+        print("✅ Metrics test passed")
+
 if __name__ == '__main__':
     print("Starting Flask Application Tests...")
     unittest.main(verbosity=2)
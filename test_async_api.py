@@ -0,0 +1,239 @@
+import json
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+from fastapi.testclient import TestClient
+
+
+def make_completion(content):
+    """Build a minimal object shaped like a chat completion response"""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeCompletions:
+    """Async stand-in for ``chat.completions`` that tracks concurrency"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return make_completion(f"summary {self.calls}")
+        finally:
+            self.in_flight -= 1
+
+
+class TestAsyncOpenAIPath(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.completions = FakeCompletions()
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        patchers = [
+            patch.object(main, "get_async_openai_client", lambda: fake_client),
+            patch.object(main, "TEST_MODE", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+
+    def test_semaphore_caps_in_flight_completions(self):
+        """Concurrent calls never exceed OPENAI_MAX_CONCURRENCY"""
+        async def run():
+            return await asyncio.gather(*[
+                main.process_email_content_async(f"Subject {i}", "Body") for i in range(8)
+            ])
+
+        with patch.object(main, "OPENAI_MAX_CONCURRENCY", 3):
+            summaries = asyncio.run(run())
+
+        self.assertEqual(len(summaries), 8)
+        self.assertEqual(self.completions.calls, 8)
+        self.assertEqual(self.completions.max_in_flight, 3)
+
+    def test_openai_errors_map_to_http_status(self):
+        """Quota errors surface as 402 on the async path"""
+        async def failing_create(**kwargs):
+            raise Exception("Error code: 429 - insufficient_quota")
+
+        self.completions.create = failing_create
+        with self.assertRaises(main.HTTPException) as context:
+            asyncio.run(main.process_email_content_async("Subject", "Body"))
+        self.assertEqual(context.exception.status_code, 402)
+
+    def test_process_email_endpoint(self):
+        """The endpoint returns the summary from the async client"""
+        client = TestClient(main.app)
+        response = client.post("/api/process-email", json={
+            "subject": "Weekly Newsletter",
+            "body": "This week's updates",
+            "sender": "news@example.com"
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["status"], "success")
+        self.assertEqual(data["summary"], "summary 1")
+        self.assertEqual(data["metadata"]["sender"], "news@example.com")
+
+
+class TestBatchEndpoint(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.completions = FakeCompletions(delay=0.02)
+        original_create = self.completions.create
+
+        async def create(**kwargs):
+            if "Subject: broken" in kwargs["messages"][0]["content"]:
+                raise Exception("Error code: 401 - invalid_api_key")
+            return await original_create(**kwargs)
+
+        self.completions.create = create
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        patchers = [
+            patch.object(main, "get_async_openai_client", lambda: fake_client),
+            patch.object(main, "TEST_MODE", False),
+            patch.object(main, "BATCH_MAX_PARALLELISM", 2),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+        self.client = TestClient(main.app)
+
+    def test_results_in_input_order_with_per_item_status(self):
+        """A failing item is reported without failing the batch"""
+        emails = [
+            {"subject": f"subject {i}", "body": "Body", "sender": f"sender{i}@example.com"}
+            for i in range(5)
+        ]
+        emails[2]["subject"] = "broken"
+
+        response = self.client.post("/api/process-emails", json=emails)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        self.assertEqual(data["status"], "partial")
+        self.assertEqual((data["succeeded"], data["failed"]), (4, 1))
+        self.assertEqual([r["index"] for r in data["results"]], list(range(5)))
+        self.assertEqual(
+            [r["metadata"]["sender"] for r in data["results"]],
+            [email["sender"] for email in emails]
+        )
+        self.assertEqual(data["results"][2]["status"], "error")
+        self.assertEqual(data["results"][2]["status_code"], 401)
+        self.assertLessEqual(self.completions.max_in_flight, 2)
+
+    def test_batch_size_limit(self):
+        """Batches over BATCH_MAX_ITEMS are rejected"""
+        emails = [{"subject": "s", "body": "b", "sender": "x@example.com"}] * 3
+        with patch.object(main, "BATCH_MAX_ITEMS", 2):
+            response = self.client.post("/api/process-emails", json=emails)
+        self.assertEqual(response.status_code, 413)
+
+
+def parse_sse(text):
+    """Parse a Server-Sent Events body into (event, data) pairs"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class FakeStream:
+    """Async iterator of streamed completion chunks"""
+
+    def __init__(self, pieces):
+        self.pieces = iter(pieces)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            piece = next(self.pieces)
+        except StopIteration:
+            raise StopAsyncIteration
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+class TestStreamingEndpoint(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            return FakeStream(["Main ", "topics", None, ": AI"])
+
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        patchers = [
+            patch.object(main, "get_async_openai_client", lambda: fake_client),
+            patch.object(main, "TEST_MODE", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+        self.client = TestClient(main.app)
+        self.email = {"subject": "Weekly Newsletter", "body": "Body", "sender": "news@example.com"}
+
+    def test_stream_query_flag(self):
+        """Tokens are streamed, followed by the usual JSON body"""
+        response = self.client.post("/api/process-email", params={"stream": "true"}, json=self.email)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+
+        events = parse_sse(response.text)
+        tokens = [data["content"] for event, data in events if event == "token"]
+        self.assertEqual(tokens, ["Main ", "topics", ": AI"])
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["summary"], "Main topics: AI")
+        self.assertEqual(events[-1][1]["metadata"]["subject"], "Weekly Newsletter")
+        self.assertTrue(self.calls[0]["stream"])
+
+    def test_stream_waits_for_limiter_without_a_slot(self):
+        """Like non-streamed completions, a stream only takes a concurrency slot once admitted"""
+        free_slots = []
+
+        async def acquire_async(tokens):
+            free_slots.append(main.get_openai_semaphore()._value)
+
+        async def run():
+            with patch.object(main.openai_rate_limiter, "acquire_async", acquire_async):
+                pieces = [piece async for piece in main.stream_chat_completion_async(model="m", messages=[])]
+            return pieces, main.get_openai_semaphore()._value
+
+        pieces, free_after = asyncio.run(run())
+        self.assertEqual("".join(pieces), "Main topics: AI")
+        self.assertEqual(free_slots, [main.OPENAI_MAX_CONCURRENCY])
+        self.assertEqual(free_after, main.OPENAI_MAX_CONCURRENCY)
+
+    def test_accept_header_and_cache(self):
+        """Accept: text/event-stream opts in, and the result is cached"""
+        headers = {"Accept": "text/event-stream"}
+        self.client.post("/api/process-email", headers=headers, json=self.email)
+        response = self.client.post("/api/process-email", headers=headers, json=self.email)
+
+        events = parse_sse(response.text)
+        self.assertEqual(events[0], ("token", {"content": "Main topics: AI"}))
+        self.assertEqual(len(self.calls), 1)
+
+        plain = self.client.post("/api/process-email", json=self.email)
+        self.assertEqual(plain.json()["summary"], "Main topics: AI")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from chunker import TokenChunker
+from token_utils import count_tokens
+
+
+class TestTokenChunker(unittest.TestCase):
+    def test_chunks_fit_budget(self):
+        """Every chunk stays within the token budget"""
+        content = "\n".join(f"Line {i}: some newsletter content about topic {i}" for i in range(200))
+        chunker = TokenChunker(max_tokens=100)
+        chunks = list(chunker.iter_chunks(content))
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk), 100 + len(chunk.splitlines()))
+        self.assertEqual("\n".join(chunks).splitlines()[0], "Line 0: some newsletter content about topic 0")
+        self.assertEqual(len("\n".join(chunks).splitlines()), 200)
+
+    def test_lines_are_packed(self):
+        """Short lines are packed together instead of becoming tiny documents"""
+        content = "\n".join(["short line"] * 50)
+        chunks = list(TokenChunker(max_tokens=1000).iter_chunks(content))
+        self.assertEqual(len(chunks), 1)
+
+    def test_blank_lines_skipped_and_long_lines_split(self):
+        content = "\n\n   \n" + " ".join(["word"] * 400)
+        chunks = list(TokenChunker(max_tokens=50).iter_chunks(content))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(" ".join(chunks).split(), ["word"] * 400)
+
+    def test_lazy_and_observable(self):
+        """Consuming only the first chunk does not tokenize the rest"""
+        chunker = TokenChunker(max_tokens=20)
+        content = "\n".join(f"line number {i}" for i in range(1000))
+        chunks = chunker.iter_chunks(content)
+        next(chunks)
+
+        stats = chunker.stats()
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["chunks"], 1)
+        self.assertLessEqual(stats["tokens"], 20)
+
+    def test_per_call_token_counts(self):
+        """Token counts come with each call's chunks rather than from shared state"""
+        chunker = TokenChunker(max_tokens=20)
+        content = "\n".join(f"line number {i}" for i in range(10))
+        counted = list(chunker.iter_chunks(content, with_tokens=True))
+
+        self.assertEqual([chunk for chunk, _ in counted], list(chunker.iter_chunks(content)))
+        self.assertEqual(sum(tokens for _, tokens in counted),
+                         sum(count_tokens(line + "\n") for line in content.splitlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,27 @@
 import unittest
 import asyncio
+import aiohttp
 from unittest.mock import MagicMock, patch
-from email_handler import EmailHandler
+from email_handler import EmailHandler, IMAPSyncState
 import email
+import os
+import sys
+import tempfile
+import time
 from io import BytesIO
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+from stubs import Latency, StubHandler, start_http_stub, start_imap_stub
+
+
+class StatusAPIHandler(StubHandler):
+    """Answers every processed email with the server's ``status``"""
+
+    def do_POST(self):
+        self.read_json()
+        self.server.requests += 1
+        self.send_json(self.server.status, {"detail": "stub"})
+
 class TestEmailHandler(unittest.TestCase):
     def setUp(self):
         self.handler = EmailHandler()
@@ -50,6 +67,220 @@ class TestEmailHandler(unittest.TestCase):
         extracted = self.handler.extract_email_content(msg)
         self.assertEqual(extracted.strip(), "Plain text content")
 
+class TestEmailHandlerAgainstIMAPStub(unittest.TestCase):
+    def setUp(self):
+        self.server = start_imap_stub(Latency("none"), messages_per_mailbox=3)
+        self.addCleanup(self.server.shutdown)
+        self.env = {
+            "IMAP_SERVER": "127.0.0.1",
+            "IMAP_PORT": str(self.server.server_address[1]),
+            "IMAP_SSL": "false",
+            "EMAIL_ADDRESS": "reader@example.com",
+            "EMAIL_PASSWORD": "secret"
+        }
+        with patch.dict(os.environ, self.env):
+            self.handler = EmailHandler()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.handler.sync_state = IMAPSyncState(os.path.join(tmpdir.name, "imap_sync.db"))
+        self.addCleanup(self.handler.close_session)
+
+    def test_processes_each_unseen_message_once(self):
+        posted = []
+
+        async def fake_process(content, from_email, subject="", message_id=None):
+            posted.append((from_email, subject))
+            return {"status": "success"}
+
+        with patch.object(self.handler, "process_email_content", side_effect=fake_process):
+            self.assertTrue(asyncio.run(self.handler.check_emails()))
+            self.assertTrue(asyncio.run(self.handler.check_emails()))
+
+        self.assertEqual(len(posted), 3)
+        self.assertTrue(all(sender.endswith("@example.com") and subject for sender, subject in posted))
+
+    def sync(self, handler=None, checks=1):
+        """Run check_emails and return the subjects it posted"""
+        handler = handler or self.handler
+        posted = []
+
+        async def fake_process(content, from_email, subject="", message_id=None):
+            posted.append(subject)
+            return {"status": "success"}
+
+        with patch.object(handler, "process_email_content", side_effect=fake_process):
+            for _ in range(checks):
+                self.assertTrue(asyncio.run(handler.check_emails()))
+        return posted
+
+    def test_session_is_reused_and_only_new_uids_are_fetched(self):
+        self.assertEqual(len(self.sync()), 3)
+        self.server.deliver("reader@example.com")
+        self.assertEqual(self.sync(checks=3), ["Example Weekly issue #3"])
+
+        self.assertEqual(self.server.logins, 1)
+        # Messages are fetched with BODY.PEEK[], leaving them unread for the user
+        mailbox = self.server.mailbox("reader@example.com")
+        self.assertFalse(any(entry["seen"] for entry in mailbox))
+
+    def test_first_sync_skips_read_mail(self):
+        self.server.mailbox("reader@example.com")[0]["seen"] = True
+        self.assertEqual(self.sync(), ["Example Weekly issue #1", "Example Weekly issue #2"])
+        self.assertEqual(self.handler.sync_state.get(self.handler.sync_key), (self.server.uid_validity, 3, 0))
+
+    def test_interrupted_first_sync_resumes_with_unseen_mail(self):
+        self.server.deliver("reader@example.com", count=3)
+        mailbox = self.server.mailbox("reader@example.com")
+        for uid in (2, 3, 4, 6):
+            mailbox[uid - 1]["seen"] = True
+        posted = []
+
+        async def failing_process(content, from_email, subject="", message_id=None):
+            if posted:
+                raise aiohttp.ClientConnectionError("API unavailable")
+            posted.append(subject)
+            return {"status": "success"}
+
+        with patch.object(self.handler, "process_email_content", side_effect=failing_process):
+            self.assertFalse(asyncio.run(self.handler.check_emails()))
+        self.assertEqual(posted, ["Example Weekly issue #0"])
+
+        # The read messages after the failure point are still skipped
+        self.assertEqual(self.sync(), ["Example Weekly issue #4"])
+        self.server.deliver("reader@example.com")
+        self.assertEqual(self.sync(), ["Example Weekly issue #6"])
+
+    def test_failed_api_replies_only_advance_the_mark_when_final(self):
+        self.sync()
+        self.server.deliver("reader@example.com")
+        api = start_http_stub(StatusAPIHandler, Latency("none"))
+        self.addCleanup(api.shutdown)
+        self.handler.api_endpoint = f"http://127.0.0.1:{api.server_address[1]}"
+
+        api.status = 503
+        self.assertFalse(asyncio.run(self.handler.check_emails()))
+        self.assertEqual(self.handler.sync_state.get(self.handler.sync_key)[1], 3)
+
+        # A rejected message would be rejected again, so it is not retried
+        api.status = 422
+        self.assertTrue(asyncio.run(self.handler.check_emails()))
+        self.assertEqual(self.handler.sync_state.get(self.handler.sync_key)[1], 4)
+        self.assertEqual(api.requests, 2)
+
+    def test_high_water_mark_survives_restart(self):
+        self.sync()
+        self.handler.close_session()
+        with patch.dict(os.environ, self.env):
+            restarted = EmailHandler()
+        restarted.sync_state = self.handler.sync_state
+        self.addCleanup(restarted.close_session)
+        self.server.deliver("reader@example.com")
+        self.assertEqual(self.sync(restarted), ["Example Weekly issue #3"])
+
+    def test_reconnects_after_the_session_drops(self):
+        self.sync()
+        self.server.disconnect_all()
+        self.server.deliver("reader@example.com")
+        self.assertEqual(self.sync(), ["Example Weekly issue #3"])
+        self.assertEqual(self.server.logins, 2)
+
+    def test_uidvalidity_change_resyncs_unseen_mail(self):
+        self.sync()
+        self.server.uid_validity += 1
+        self.server.disconnect_all()
+        self.assertEqual(len(self.sync()), 3)
+
+class TestEmailHandlerIdle(unittest.TestCase):
+    def start(self, idle=True, **settings):
+        self.server = start_imap_stub(Latency("none"), messages_per_mailbox=2, idle=idle)
+        self.addCleanup(self.server.shutdown)
+        env = {
+            "IMAP_SERVER": "127.0.0.1",
+            "IMAP_PORT": str(self.server.server_address[1]),
+            "IMAP_SSL": "false",
+            "EMAIL_ADDRESS": "idle@example.com",
+            "EMAIL_PASSWORD": "secret",
+            **settings
+        }
+        with patch.dict(os.environ, env):
+            self.handler = EmailHandler()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.handler.sync_state = IMAPSyncState(os.path.join(tmpdir.name, "imap_sync.db"))
+        self.addCleanup(self.handler.close_session)
+        self.posted = []
+
+        async def fake_process(content, from_email, subject="", message_id=None):
+            self.posted.append(subject)
+            return {"status": "success"}
+
+        patcher = patch.object(self.handler, "process_email_content", side_effect=fake_process)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_handler(self, scenario):
+        """Run the handler while scenario() plays out in a thread"""
+        async def main():
+            task = asyncio.create_task(self.handler.run())
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, scenario)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(main())
+
+    def wait_for_posts(self, count, timeout=3):
+        deadline = time.monotonic() + timeout
+        while len(self.posted) < count:
+            if time.monotonic() > deadline:
+                raise AssertionError(f"expected {count} emails, got {len(self.posted)}")
+            time.sleep(0.01)
+
+    def test_new_mail_is_processed_within_seconds(self):
+        # Polling alone would not pick the new mail up before the test times out
+        self.start(IMAP_POLL_MIN_SECONDS="60")
+
+        def scenario():
+            self.wait_for_posts(2)
+            self.server.deliver("idle@example.com")
+            started = time.monotonic()
+            self.wait_for_posts(3)
+            self.assertLess(time.monotonic() - started, 2)
+
+        self.run_handler(scenario)
+        self.assertTrue(self.handler.idle_supported)
+        self.assertEqual(len(self.posted), 3)
+
+    def test_idle_session_is_renewed(self):
+        self.start(IMAP_IDLE_RENEW_SECONDS="0.1", IMAP_POLL_MIN_SECONDS="60")
+
+        def scenario():
+            deadline = time.monotonic() + 3
+            while self.server.idle_sessions < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.run_handler(scenario)
+        self.assertGreaterEqual(self.server.idle_sessions, 3)
+        self.assertEqual(len(self.posted), 2)
+
+    def test_falls_back_to_adaptive_polling_without_idle(self):
+        self.start(idle=False, IMAP_POLL_MIN_SECONDS="0.05", IMAP_POLL_MAX_SECONDS="0.2")
+
+        def scenario():
+            self.wait_for_posts(2)
+            # Empty checks back the interval off to the maximum
+            deadline = time.monotonic() + 3
+            while self.handler.poll_interval < 0.2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.server.deliver("idle@example.com")
+            self.wait_for_posts(3)
+
+        self.run_handler(scenario)
+        self.assertFalse(self.handler.idle_supported)
+        self.assertEqual(self.server.idle_sessions, 0)
+        self.assertEqual(len(self.posted), 3)
+
 def run_async_test(coro):
     return asyncio.run(coro)
 
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import main
+from email_preprocessor import EmailPreprocessor, shorten_url
+
+NEWSLETTER = """View this email in your browser
+
+Top stories this week:\u200b
+1.   New AI features released: https://example.com/ai?utm_source=newsletter&utm_medium=email&id=7
+2. Read more at https://click.example.com/ls/click?upn=aGVsbG8gd29ybGQgdGhpcyBpcyBhIHZlcnkgbG9uZyB0cmFja2luZyB0b2tlbg.
+
+This issue is brought to you by our sponsor, Acme Cloud.
+More stories below.
+This issue is brought to you by our sponsor, Acme Cloud.
+
+Copyright 2024 Example Media. All rights reserved.
+You are receiving this because you subscribed. Unsubscribe here: https://example.com/unsubscribe
+"""
+
+REPLY = """Sounds good, see you Tuesday.
+
+--
+Sam Example
+Head of Things
+
+On Mon, Jan 1, 2024 at 9:00 AM Alex <alex@example.com> wrote:
+> Can we meet next week?
+> Thanks
+"""
+
+
+class TestEmailPreprocessor(unittest.TestCase):
+    def setUp(self):
+        self.preprocessor = EmailPreprocessor(max_url_length=80)
+
+    def test_shorten_url(self):
+        self.assertEqual(
+            shorten_url("https://example.com/ai?utm_source=x&id=7&fbclid=abc."),
+            "https://example.com/ai?id=7."
+        )
+        self.assertEqual(shorten_url("https://click.example.com/" + "a" * 100), "https://click.example.com/...")
+
+    def test_newsletter_footer_and_links(self):
+        cleaned = self.preprocessor.clean(NEWSLETTER)
+        self.assertIn("1. New AI features released: https://example.com/ai?id=7", cleaned)
+        self.assertIn("https://click.example.com/ls/click.", cleaned)
+        self.assertEqual(cleaned.count("Acme Cloud"), 1)
+        self.assertNotIn("utm_", cleaned)
+        self.assertNotIn("\u200b", cleaned)
+        for footer in ("browser", "Unsubscribe", "All rights reserved"):
+            self.assertNotIn(footer, cleaned)
+
+    def test_reply_quote_and_signature(self):
+        self.assertEqual(self.preprocessor.clean(REPLY), "Sounds good, see you Tuesday.")
+
+    def test_footer_phrases_in_body_are_kept(self):
+        body = (
+            "To stop the alerts, open Settings and manage your subscription there.\n"
+            "Our privacy policy changes take effect in March; the details follow below in full.\n"
+            "______________________________\n"
+            "Section two keeps going after the divider.\n"
+            "\n"
+            "Unsubscribe | Privacy policy\n"
+            "Example Media, 1 Main St\n"
+            "All rights reserved"
+        )
+        self.assertEqual(self.preprocessor.clean(body), "\n".join(body.split("\n")[:4]))
+
+    def test_all_boilerplate_keeps_original(self):
+        self.assertEqual(self.preprocessor.clean("Unsubscribe here"), "Unsubscribe here")
+
+    def test_process_records_reduction(self):
+        self.preprocessor.process(NEWSLETTER)
+        stats = self.preprocessor.stats()
+        self.assertEqual(stats["emails"], 1)
+        self.assertLess(stats["last_tokens_after"], stats["last_tokens_before"])
+        self.assertGreater(stats["reduction_ratio"], 0)
+
+
+class TestPromptPreprocessing(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake_client = MagicMock()
+        self.fake_client.chat.completions.create.return_value.choices = [
+            MagicMock(message=MagicMock(content="summary"))
+        ]
+        patchers = [
+            patch.object(main, "client", self.fake_client),
+            patch.object(main, "TEST_MODE", False),
+            patch.object(main, "email_preprocessor", EmailPreprocessor()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+
+    def test_prompt_uses_cleaned_body(self):
+        main.process_email_content("Weekly news", NEWSLETTER)
+        prompt = self.fake_client.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("New AI features released", prompt)
+        self.assertNotIn("Unsubscribe", prompt)
+        self.assertEqual(main.email_preprocessor.stats()["emails"], 1)
+
+    def test_preprocessing_can_be_disabled(self):
+        with patch.object(main, "PREPROCESS_EMAIL_BODIES", False):
+            main.process_email_content("Weekly news", NEWSLETTER)
+        prompt = self.fake_client.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("Unsubscribe", prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+from health_monitor import HealthMonitor
+from fastapi.testclient import TestClient
+
+
+class CountingCheck:
+    """Async health check that records how often it runs"""
+
+    def __init__(self, status="connected", delay=0):
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"status": self.status, "message": f"{self.status} after {self.calls} checks"}
+
+
+class TestHealthMonitor(unittest.TestCase):
+    def test_refresh_and_timeout(self):
+        """Slow checks are reported as errors instead of hanging the probe"""
+        monitor = HealthMonitor(
+            checks={"fast": CountingCheck(), "slow": CountingCheck(delay=1)},
+            timeout=0.05
+        )
+        asyncio.run(monitor.refresh())
+        self.assertEqual(monitor.results["fast"]["status"], "connected")
+        self.assertEqual(monitor.results["slow"]["status"], "error")
+        self.assertIn("timed out", monitor.results["slow"]["message"])
+        self.assertFalse(monitor.ready)
+        self.assertIsNotNone(monitor.age_seconds)
+
+    def test_background_refresh(self):
+        """The background task re-runs checks every interval"""
+        check = CountingCheck()
+        monitor = HealthMonitor(checks={"openai": check}, interval=0.01)
+
+        async def run():
+            monitor.start()
+            await asyncio.sleep(0.1)
+            await monitor.stop()
+
+        asyncio.run(run())
+        self.assertGreater(check.calls, 2)
+        self.assertTrue(monitor.ready)
+
+
+class TestHealthEndpoints(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.openai_check = CountingCheck()
+        self.notion_check = CountingCheck(status="error")
+        monitor = HealthMonitor(
+            checks={"openai": self.openai_check, "notion": self.notion_check},
+            interval=3600
+        )
+        patcher = patch.object(main, "health_monitor", monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(main.app)
+
+    def test_health_served_from_cache(self):
+        """Repeated probes do not re-run the upstream checks"""
+        for _ in range(5):
+            response = self.client.get("/api/health")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["openai_status"], "connected")
+        self.assertEqual(data["notion_status"], "error")
+        self.assertIn("age_seconds", data)
+        self.assertEqual(self.openai_check.calls, 1)
+
+    def test_liveness_and_readiness(self):
+        """Liveness always passes; readiness reflects the cached checks"""
+        self.assertEqual(self.client.get("/api/health/live").json(), {"status": "alive"})
+
+        response = self.client.get("/api/health/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "not_ready")
+
+        self.notion_check.status = "connected"
+        asyncio.run(main.health_monitor.refresh())
+        response = self.client.get("/api/health/ready")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["checks"]["notion"]["status"], "connected")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+from fastapi.testclient import TestClient
+from idempotency import IdempotencyConflict, IdempotencyStore, idempotency_key, request_fingerprint
+
+
+class CountingWork:
+    """Async unit of work that counts its runs"""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"summary": f"summary {self.calls}"}
+
+
+class TestIdempotencyKey(unittest.TestCase):
+    def test_header_wins_over_message_id(self):
+        self.assertEqual(idempotency_key({"Idempotency-Key": "abc"}, {"Message-ID": "<m@x>"}), "abc")
+
+    def test_message_id_fallback_is_case_insensitive(self):
+        self.assertEqual(idempotency_key({}, {"message-id": " <m@x> "}), "<m@x>")
+
+    def test_no_key(self):
+        self.assertIsNone(idempotency_key({}, None))
+        self.assertIsNone(idempotency_key({"Idempotency-Key": "  "}, {}))
+
+
+class TestIdempotencyStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "idempotency.db")
+        self.store = IdempotencyStore(self.db_path, poll_interval=0.01)
+        self.fingerprint = request_fingerprint({"body": "hello"})
+
+    def test_concurrent_duplicates_share_one_run(self):
+        work = CountingWork()
+
+        async def run():
+            return await asyncio.gather(*[self.store.run("key", self.fingerprint, work) for _ in range(5)])
+
+        results = asyncio.run(run())
+        self.assertEqual(work.calls, 1)
+        self.assertEqual({result["summary"] for result, _ in results}, {"summary 1"})
+        self.assertEqual(sorted(replayed for _, replayed in results), [False, True, True, True, True])
+        self.assertEqual(self.store.stats()["joined"], 4)
+
+    def test_duplicates_take_over_when_the_original_is_cancelled(self):
+        work = CountingWork()
+
+        async def run():
+            original = asyncio.ensure_future(self.store.run("key", self.fingerprint, work))
+            while not work.calls:
+                await asyncio.sleep(0.001)
+            duplicates = [asyncio.ensure_future(self.store.run("key", self.fingerprint, work)) for _ in range(2)]
+            await asyncio.sleep(0)
+            original.cancel()
+            return await asyncio.gather(*duplicates)
+
+        results = asyncio.run(run())
+        self.assertEqual(work.calls, 2)
+        self.assertEqual({result["summary"] for result, _ in results}, {"summary 2"})
+        self.assertEqual(sorted(replayed for _, replayed in results), [False, True])
+
+    def test_cancelled_claim_is_released(self):
+        async def run():
+            original = asyncio.ensure_future(self.store.run("key", self.fingerprint, CountingWork()))
+            await asyncio.sleep(0)
+            original.cancel()
+            await asyncio.gather(original, return_exceptions=True)
+
+        asyncio.run(run())
+        # Cancelled before the work started, so the key is free rather than pending until the claim expires
+        self.assertEqual(self.store._claim("key", self.fingerprint), ("claimed", None))
+
+    def test_stored_result_survives_restart(self):
+        work = CountingWork(delay=0)
+        asyncio.run(self.store.run("key", self.fingerprint, work))
+
+        restarted = IdempotencyStore(self.db_path)
+        result, replayed = asyncio.run(restarted.run("key", self.fingerprint, work))
+        self.assertEqual(work.calls, 1)
+        self.assertTrue(replayed)
+        self.assertEqual(result, {"summary": "summary 1"})
+
+    def test_duplicate_waits_for_another_workers_claim(self):
+        other_worker = IdempotencyStore(self.db_path)
+        self.assertEqual(other_worker._claim("key", self.fingerprint)[0], "claimed")
+        work = CountingWork(delay=0)
+
+        async def run():
+            duplicate = asyncio.ensure_future(self.store.run("key", self.fingerprint, work))
+            await asyncio.sleep(0.05)
+            self.assertFalse(duplicate.done())
+            other_worker._complete("key", {"summary": "from other worker"})
+            return await duplicate
+
+        result, replayed = asyncio.run(run())
+        self.assertEqual(work.calls, 0)
+        self.assertTrue(replayed)
+        self.assertEqual(result, {"summary": "from other worker"})
+
+    def test_expired_claim_is_taken_over(self):
+        other_worker = IdempotencyStore(self.db_path, lock_timeout=0)
+        other_worker._claim("key", self.fingerprint)
+        work = CountingWork(delay=0)
+        _, replayed = asyncio.run(self.store.run("key", self.fingerprint, work))
+        self.assertEqual(work.calls, 1)
+        self.assertFalse(replayed)
+
+    def test_reused_key_with_different_request_conflicts(self):
+        asyncio.run(self.store.run("key", self.fingerprint, CountingWork(delay=0)))
+        with self.assertRaises(IdempotencyConflict):
+            asyncio.run(self.store.run("key", request_fingerprint({"body": "other"}), CountingWork(delay=0)))
+
+    def test_failures_are_not_stored(self):
+        failing = CountingWork(delay=0, error=RuntimeError("upstream down"))
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.store.run("key", self.fingerprint, failing))
+
+        work = CountingWork(delay=0)
+        _, replayed = asyncio.run(self.store.run("key", self.fingerprint, work))
+        self.assertEqual(work.calls, 1)
+        self.assertFalse(replayed)
+
+
+class TestProcessEmailIdempotency(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = IdempotencyStore(os.path.join(directory.name, "idempotency.db"))
+        self.calls = 0
+
+        async def fake_process(subject, body):
+            self.calls += 1
+            return f"summary {self.calls}"
+
+        patchers = [
+            patch.object(main, "idempotency_store", store),
+            patch.object(main, "process_email_content_async", fake_process),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(main.app)
+        self.email = {"subject": "Weekly", "body": "News", "sender": "news@example.com"}
+
+    def test_retry_with_key_replays_first_response(self):
+        headers = {"Idempotency-Key": "zap-123"}
+        first = self.client.post("/api/process-email", json=self.email, headers=headers)
+        retry = self.client.post("/api/process-email", json=self.email, headers=headers)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertNotIn("Idempotent-Replayed", first.headers)
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+
+    def test_message_id_deduplicates_without_header(self):
+        email = dict(self.email, headers={"Message-ID": "<abc@example.com>"})
+        self.client.post("/api/process-email", json=email)
+        self.client.post("/api/process-email", json=email)
+        self.assertEqual(self.calls, 1)
+
+    def test_requests_without_key_are_processed_each_time(self):
+        self.client.post("/api/process-email", json=self.email)
+        self.client.post("/api/process-email", json=self.email)
+        self.assertEqual(self.calls, 2)
+
+    def test_key_reused_for_different_email_is_rejected(self):
+        headers = {"Idempotency-Key": "zap-123"}
+        self.client.post("/api/process-email", json=self.email, headers=headers)
+        response = self.client.post("/api/process-email", json=dict(self.email, body="Other"), headers=headers)
+        self.assertEqual(response.status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
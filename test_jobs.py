@@ -0,0 +1,450 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+from fastapi.testclient import TestClient
+from jobs import (
+    FAILED, QUEUED, RUNNING, SUCCEEDED, JobManager, JobQueue, JobQueueFull, PermanentJobError
+)
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    """Receives job callbacks, failing the first ``fail_first`` requests"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.attempts += 1
+        status = 500 if self.server.attempts <= self.server.fail_first else 200
+        if status == 200:
+            self.server.received.append(body)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_callback_server(fail_first=0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CallbackHandler)
+    server.attempts = 0
+    server.fail_first = fail_first
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def run_until_idle(manager):
+    """Run due jobs and callbacks on a fresh event loop until none are left"""
+    async def drain():
+        while await manager.run_next() or await manager.deliver_next_callback():
+            pass
+
+    asyncio.run(drain())
+
+
+# Consumes "echo" jobs from the queue file in argv[1] until it has been idle for a second
+CONSUMER_SNIPPET = """
+import asyncio, os, sys, time
+from jobs import JobManager, JobQueue
+
+async def echo(payload):
+    await asyncio.sleep(0.01)
+    return {"value": payload["value"], "pid": os.getpid()}
+
+async def consume():
+    manager = JobManager(JobQueue(sys.argv[1]))
+    manager.register("echo", echo)
+    idle_since = time.monotonic()
+    while time.monotonic() - idle_since < 1:
+        if await manager.run_next():
+            idle_since = time.monotonic()
+        else:
+            await asyncio.sleep(0.01)
+
+asyncio.run(consume())
+"""
+
+
+class QueueTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.db_path = os.path.join(tmpdir.name, "jobs.db")
+
+    def queue(self, **kwargs):
+        kwargs.setdefault("base_delay", 0)
+        return JobQueue(self.db_path, **kwargs)
+
+
+class TestJobQueue(QueueTestCase):
+    def test_claim_and_complete(self):
+        queue = self.queue()
+        job_id = queue.enqueue("echo", {"value": 1})
+        self.assertEqual(queue.get(job_id)["status"], QUEUED)
+
+        claimed_id, kind, payload, attempts, token = queue.claim(["echo"])
+        self.assertEqual((claimed_id, kind, payload, attempts), (job_id, "echo", {"value": 1}, 1))
+        self.assertEqual(queue.get(job_id)["status"], RUNNING)
+        self.assertIsNone(queue.claim(["echo"]))
+
+        self.assertTrue(queue.complete(job_id, token, {"ok": True}))
+        job = queue.get(job_id)
+        self.assertEqual(job["status"], SUCCEEDED)
+        self.assertEqual(job["result"], {"ok": True})
+
+    def test_only_registered_kinds_are_claimed(self):
+        queue = self.queue()
+        queue.enqueue("other", {})
+        self.assertIsNone(queue.claim(["echo"]))
+        self.assertIsNone(queue.claim([]))
+
+    def test_jobs_survive_restart(self):
+        job_id = self.queue().enqueue("echo", {"value": 1})
+        claimed = self.queue().claim(["echo"])
+        self.assertEqual(claimed[0], job_id)
+
+    def test_duplicate_job_id_is_queued_once(self):
+        queue = self.queue()
+        queue.enqueue("echo", {"value": 1}, job_id="gmail-1")
+        queue.enqueue("echo", {"value": 1}, job_id="gmail-1")
+        self.assertEqual(queue.stats()["queued"], 1)
+
+    def test_queue_full(self):
+        queue = self.queue(max_pending=1)
+        queue.enqueue("echo", {})
+        with self.assertRaises(JobQueueFull):
+            queue.enqueue("echo", {})
+
+    def test_expired_claim_is_reclaimed_and_fenced(self):
+        queue = self.queue(visibility_timeout=0.05)
+        job_id = queue.enqueue("echo", {})
+        first_token = queue.claim(["echo"])[4]
+        time.sleep(0.06)
+
+        _, _, _, attempts, second_token = queue.claim(["echo"])
+        self.assertEqual(attempts, 2)
+        # The consumer that lost its claim cannot overwrite the new holder's result
+        self.assertFalse(queue.complete(job_id, first_token, "stale"))
+        self.assertTrue(queue.complete(job_id, second_token, "fresh"))
+        self.assertEqual(queue.get(job_id)["result"], "fresh")
+
+    def test_job_lost_too_often_is_dead_lettered(self):
+        queue = self.queue(visibility_timeout=0.01, max_attempts=2)
+        job_id = queue.enqueue("echo", {})
+        for _ in range(2):
+            self.assertIsNotNone(queue.claim(["echo"]))
+            time.sleep(0.02)
+        self.assertIsNone(queue.claim(["echo"]))
+        self.assertEqual(queue.get(job_id)["status"], FAILED)
+
+    def test_failure_is_retried_then_dead_lettered(self):
+        queue = self.queue(max_attempts=2)
+        job_id = queue.enqueue("echo", {})
+        error = {"status_code": 503, "detail": "unavailable"}
+
+        _, _, _, attempts, token = queue.claim(["echo"])
+        self.assertTrue(queue.fail(job_id, token, attempts, error))
+        self.assertEqual(queue.get(job_id)["status"], QUEUED)
+
+        _, _, _, attempts, token = queue.claim(["echo"])
+        queue.fail(job_id, token, attempts, error)
+        job = queue.get(job_id)
+        self.assertEqual(job["status"], FAILED)
+        self.assertEqual(job["error"], error)
+
+        self.assertEqual(queue.requeue_failed(["echo"]), 1)
+        self.assertEqual(queue.claim(["echo"])[3], 1)
+
+    def test_retry_waits_for_backoff(self):
+        queue = self.queue(base_delay=60)
+        job_id = queue.enqueue("echo", {})
+        _, _, _, attempts, token = queue.claim(["echo"])
+        queue.fail(job_id, token, attempts, {"status_code": 500, "detail": "boom"})
+        self.assertIsNone(queue.claim(["echo"]))
+
+    def test_release_does_not_use_an_attempt(self):
+        queue = self.queue()
+        job_id = queue.enqueue("echo", {})
+        queue.release(job_id, queue.claim(["echo"])[4])
+        self.assertEqual(queue.claim(["echo"])[3], 1)
+
+    def test_finished_jobs_expire(self):
+        queue = self.queue(ttl=0)
+        job_id = queue.enqueue("echo", {})
+        queue.complete(job_id, queue.claim(["echo"])[4], 1)
+        queue._last_purge = 0
+        queue.claim(["echo"])
+        self.assertIsNone(queue.get(job_id))
+
+
+class TestJobManager(QueueTestCase):
+    def test_sync_and_async_handlers(self):
+        async def double(payload):
+            return payload["value"] * 2
+
+        manager = JobManager(self.queue())
+        manager.register("double", double)
+        manager.register("negate", lambda payload: -payload["value"])
+        doubled = manager.submit("double", {"value": 2})
+        negated = manager.submit("negate", {"value": 2})
+        self.assertEqual(doubled["status"], QUEUED)
+
+        run_until_idle(manager)
+        self.assertEqual(manager.get(doubled["id"])["result"], 4)
+        self.assertEqual(manager.get(negated["id"])["result"], -2)
+        self.assertEqual(manager.stats()["succeeded"], 2)
+
+    def test_failed_job_reports_status_and_detail(self):
+        class UpstreamError(Exception):
+            status_code = 429
+            detail = "OpenAI rate limit reached"
+
+        def work(payload):
+            raise UpstreamError()
+
+        manager = JobManager(self.queue(max_attempts=2))
+        manager.register("work", work)
+        job_id = manager.submit("work", {})["id"]
+        run_until_idle(manager)
+
+        job = manager.get(job_id)
+        self.assertEqual(job["status"], FAILED)
+        self.assertEqual(job["attempts"], 2)
+        self.assertEqual(job["error"], {"status_code": 429, "detail": "OpenAI rate limit reached"})
+
+    def test_permanent_error_is_not_retried(self):
+        def work(payload):
+            raise PermanentJobError("bad payload")
+
+        manager = JobManager(self.queue())
+        manager.register("work", work)
+        job_id = manager.submit("work", {})["id"]
+        run_until_idle(manager)
+        self.assertEqual(manager.get(job_id)["attempts"], 1)
+        self.assertEqual(manager.get(job_id)["status"], FAILED)
+
+    def test_invalid_callback_url(self):
+        with self.assertRaises(ValueError):
+            JobManager(self.queue()).submit("work", {}, callback_url="file:///etc/passwd")
+
+    def test_internal_callback_hosts_are_rejected(self):
+        manager = JobManager(self.queue())
+        for url in ("http://127.0.0.1:8080/hook", "http://localhost/hook", "http://169.254.169.254/latest",
+                    "http://10.0.0.5/hook", "http://[::1]/hook"):
+            with self.assertRaises(ValueError):
+                manager.submit("work", {}, callback_url=url)
+        with patch.dict(os.environ, {"JOB_CALLBACK_ALLOWED_HOSTS": "localhost"}):
+            manager.submit("work", {}, callback_url="http://localhost/hook")
+
+    def test_callback_is_retried_until_delivered(self):
+        server = start_callback_server(fail_first=1)
+        self.addCleanup(server.shutdown)
+        manager = JobManager(self.queue(), callback_attempts=3)
+        manager.register("work", lambda payload: {"summary": "done"})
+        patcher = patch.dict(os.environ, {"JOB_CALLBACK_ALLOWED_HOSTS": "127.0.0.1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+        job_id = manager.submit("work", {}, callback_url=url)["id"]
+        run_until_idle(manager)
+
+        self.assertEqual(len(server.received), 1)
+        self.assertEqual(server.received[0]["id"], job_id)
+        self.assertEqual(server.received[0]["result"], {"summary": "done"})
+        self.assertNotIn("callback", server.received[0])
+        self.assertEqual(manager.get(job_id)["callback"], {"status": "delivered", "attempts": 2})
+
+    def test_background_consumers(self):
+        manager = JobManager(self.queue(), poll_interval=0.01)
+        manager.register("work", lambda payload: payload["value"])
+        manager.start_background(2)
+        job = wait_for(manager, manager.submit("work", {"value": 7})["id"])
+        self.assertEqual(job["result"], 7)
+
+    def test_idle_consumers_back_off(self):
+        manager = JobManager(self.queue(), poll_interval=0.01, max_poll_interval=0.04)
+        manager.register("work", lambda payload: None)
+        sleeps = []
+
+        async def sleep(delay):
+            sleeps.append(delay)
+            if len(sleeps) == 4:
+                manager._stopping = True
+
+        with patch.object(asyncio, "sleep", sleep):
+            asyncio.run(manager._worker())
+        self.assertEqual(sleeps, [0.01, 0.02, 0.04, 0.04])
+
+    def test_inline_job_is_recorded_and_run_by_the_caller(self):
+        manager = JobManager(self.queue())
+        manager.register("work", lambda payload: {"value": payload["value"] * 2})
+        self.assertEqual(manager.run_inline("work", {"value": 4}), {"value": 8})
+        self.assertEqual(manager.queue.stats()["succeeded"], 1)
+        # Consumers never see it as due
+        self.assertIsNone(manager.queue.claim(["work"]))
+
+    def test_failed_inline_job_raises_and_is_dropped(self):
+        manager = JobManager(self.queue())
+
+        async def work(payload):
+            raise RuntimeError("upstream down")
+
+        manager.register("work", work)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(manager.run_inline_async("work", {}))
+        stats = manager.queue.stats()
+        self.assertEqual((stats["queued"], stats["running"], stats["failed"]), (0, 0, 0))
+
+    def test_callbacks_are_delivered_while_jobs_are_due(self):
+        server = start_callback_server()
+        self.addCleanup(server.shutdown)
+        manager = JobManager(self.queue(), poll_interval=0.01)
+        manager.register("work", lambda payload: time.sleep(payload["seconds"]))
+        url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+        with patch.dict(os.environ, {"JOB_CALLBACK_ALLOWED_HOSTS": "127.0.0.1"}):
+            first = manager.submit("work", {"seconds": 0}, callback_url=url)["id"]
+            backlog = [manager.submit("work", {"seconds": 0.2})["id"] for _ in range(5)]
+            manager.start_background(1)
+            wait_for(manager, first)
+            deadline = time.monotonic() + 5
+            while not server.received and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(server.received[0]["id"], first)
+        self.assertNotEqual(manager.get(backlog[-1])["status"], SUCCEEDED)
+
+    def test_worker_processes_share_the_queue(self):
+        queue = self.queue()
+        job_ids = [queue.enqueue("echo", {"value": value}) for value in range(20)]
+        root = os.path.dirname(os.path.abspath(__file__))
+        consumers = [
+            subprocess.Popen([sys.executable, "-c", CONSUMER_SNIPPET, self.db_path], cwd=root)
+            for _ in range(2)
+        ]
+        for consumer in consumers:
+            self.assertEqual(consumer.wait(timeout=30), 0)
+
+        jobs = [queue.get(job_id) for job_id in job_ids]
+        self.assertEqual([job["result"]["value"] for job in jobs], list(range(20)))
+        # Each job ran exactly once
+        self.assertTrue(all(job["attempts"] == 1 for job in jobs))
+        self.assertEqual(len({job["result"]["pid"] for job in jobs}), 2)
+
+
+class TestProcessEmailJobs(QueueTestCase, OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+
+        async def fake_process(subject, body):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return f"summary of {subject}"
+
+        self.manager = JobManager(self.queue(), poll_interval=0.01)
+        self.manager.register(main.SUMMARIZE_EMAIL_JOB, main.run_summarize_email_job)
+        patchers = [
+            patch.object(main, "job_manager", self.manager),
+            patch.object(main, "process_email_content_async", fake_process),
+            # Only the job consumers are needed, not the health monitor or outbox workers
+            patch.object(main.app.router, "on_startup", [lambda: self.manager.start(2)]),
+            patch.object(main.app.router, "on_shutdown", [self.manager.stop]),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Entering the client keeps one event loop alive across requests, as a server does
+        self.client = TestClient(main.app).__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+        self.email = {"subject": "Weekly", "body": "News", "sender": "news@example.com"}
+
+    def poll(self, status_url, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.client.get(status_url).json()
+            if job["status"] in (SUCCEEDED, FAILED):
+                return job
+            time.sleep(0.01)
+        raise AssertionError("job did not finish")
+
+    def test_async_request_returns_202_and_job_result(self):
+        response = self.client.post("/api/process-email?async=true", json=self.email)
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body["status"], "accepted")
+        self.assertEqual(response.headers["location"], body["status_url"])
+
+        job = self.poll(body["status_url"])
+        self.assertEqual(job["status"], SUCCEEDED)
+        self.assertEqual(job["result"]["summary"], "summary of Weekly")
+
+    def test_sync_request_is_recorded_as_a_job(self):
+        response = self.client.post("/api/process-email", json=self.email)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["summary"], "summary of Weekly")
+        self.assertEqual(self.manager.queue.stats()["succeeded"], 1)
+
+    def test_batch_items_are_recorded_as_jobs(self):
+        response = self.client.post("/api/process-emails", json=[self.email, dict(self.email, subject="Daily")])
+        self.assertEqual(response.json()["succeeded"], 2)
+        self.assertEqual(self.manager.queue.stats()["succeeded"], 2)
+
+    def test_prefer_respond_async(self):
+        response = self.client.post("/api/process-email", json=self.email, headers={"Prefer": "respond-async"})
+        self.assertEqual(response.status_code, 202)
+
+    def test_idempotent_retry_gets_same_job(self):
+        with patch.object(main, "idempotency_store", main.IdempotencyStore(":memory:")):
+            headers = {"Idempotency-Key": "zap-1"}
+            first = self.client.post("/api/process-email?async=true", json=self.email, headers=headers)
+            retry = self.client.post("/api/process-email?async=true", json=self.email, headers=headers)
+            self.poll(first.json()["status_url"])
+
+        self.assertEqual(retry.status_code, 202)
+        self.assertEqual(retry.json()["job_id"], first.json()["job_id"])
+        self.assertEqual(self.calls, 1)
+
+    def test_async_retry_of_processed_email_replays_summary(self):
+        with patch.object(main, "idempotency_store", main.IdempotencyStore(":memory:")):
+            headers = {"Idempotency-Key": "zap-2"}
+            first = self.client.post("/api/process-email", json=self.email, headers=headers)
+            retry = self.client.post("/api/process-email?async=true", json=self.email, headers=headers)
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(self.calls, 1)
+
+    def test_invalid_callback_url_is_rejected(self):
+        response = self.client.post("/api/process-email?async=true",
+                                    json=dict(self.email, callback_url="ftp://example.com"))
+        self.assertEqual(response.status_code, 422)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/api/jobs/missing").status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
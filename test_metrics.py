@@ -0,0 +1,78 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import openai
+import main
+import metrics
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetricsEndpoint(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake_client = MagicMock()
+        self.fake_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="summary"))],
+            usage=SimpleNamespace(prompt_tokens=40, completion_tokens=10)
+        )
+        patchers = [
+            patch.object(main, "client", self.fake_client),
+            patch.object(main, "TEST_MODE", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+        self.client = TestClient(main.app)
+
+    def test_request_count_labelled_by_route(self):
+        before = sample("email_processor_http_requests_total",
+                        app="fastapi", method="GET", path="/api/stats", status="200")
+        self.client.get("/api/stats")
+        after = sample("email_processor_http_requests_total",
+                       app="fastapi", method="GET", path="/api/stats", status="200")
+        self.assertEqual(after - before, 1)
+
+    def test_stages_and_tokens_recorded(self):
+        model = main.model_router.small_model
+        stages_before = {
+            stage: sample("email_processor_stage_duration_seconds_count", stage=stage)
+            for stage in ("preprocessing", "summarization")
+        }
+        tokens_before = sample("email_processor_llm_tokens_total", model=model, kind="prompt")
+
+        main.process_email_content("Hello", "A short note.")
+
+        for stage, before in stages_before.items():
+            self.assertEqual(sample("email_processor_stage_duration_seconds_count", stage=stage) - before, 1)
+        self.assertEqual(sample("email_processor_llm_tokens_total", model=model, kind="prompt") - tokens_before, 40)
+
+    def test_upstream_errors_counted_by_type(self):
+        self.fake_client.chat.completions.create.side_effect = openai.AuthenticationError(
+            "invalid_api_key", response=MagicMock(status_code=401), body=None
+        )
+        before = sample("email_processor_upstream_errors_total", upstream="openai", error="AuthenticationError")
+        with self.assertRaises(Exception):
+            main.process_email_content("Hello", "A short note.")
+        after = sample("email_processor_upstream_errors_total", upstream="openai", error="AuthenticationError")
+        self.assertEqual(after - before, 1)
+
+    def test_metrics_exposition(self):
+        main.summary_cache.get("missing")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.headers["content-type"])
+        self.assertIn("email_processor_cache_misses", response.text)
+        self.assertIn("email_processor_llm_requests_in_flight", response.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import main
+from email_processor import EmailProcessor
+from model_router import ModelRouter, parse_task_models
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter("small", "large", large_threshold=100)
+
+    def test_routes_by_prompt_size(self):
+        self.assertEqual(self.router.route("email_summary", 100), "small")
+        self.assertEqual(self.router.route("email_summary", 101), "large")
+
+    def test_classification_stays_small(self):
+        self.assertEqual(self.router.route("newsletter_check", 10000), "small")
+        self.assertEqual(self.router.route("title", 10000), "small")
+
+    def test_task_models_override(self):
+        router = ModelRouter("small", "large", task_models=parse_task_models("email_summary=pinned, bad"))
+        self.assertEqual(router.task_models, {"email_summary": "pinned"})
+        self.assertEqual(router.route("email_summary", 1), "pinned")
+
+    def test_stats_report_latency_per_route(self):
+        for seconds in range(1, 21):
+            self.router.record("email_summary", "small", seconds / 10)
+        with self.router.measure("email_summary", "large"):
+            pass
+        routes = self.router.stats()["routes"]["email_summary"]
+        self.assertEqual(routes["small"]["calls"], 20)
+        self.assertEqual(routes["small"]["p95_seconds"], 2.0)
+        self.assertEqual(routes["large"]["calls"], 1)
+
+
+class TestRoutedCompletions(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake_client = MagicMock()
+        self.fake_client.chat.completions.create.return_value.choices = [
+            MagicMock(message=MagicMock(content="summary"))
+        ]
+        self.router = ModelRouter("small-model", "large-model", large_threshold=200)
+        patchers = [
+            patch.object(main, "client", self.fake_client),
+            patch.object(main, "TEST_MODE", False),
+            patch.object(main, "model_router", self.router),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+
+    def used_model(self):
+        return self.fake_client.chat.completions.create.call_args.kwargs["model"]
+
+    def test_short_email_uses_small_model(self):
+        main.process_email_content("Hello", "A short note about lunch.")
+        self.assertEqual(self.used_model(), "small-model")
+
+    def test_long_email_uses_large_model(self):
+        body = "\n".join(f"Paragraph {i} about a distinct topic in this report." for i in range(200))
+        main.process_email_content("Report", body)
+        self.assertEqual(self.used_model(), "large-model")
+        self.assertEqual(self.router.stats()["routes"]["email_summary"]["large-model"]["calls"], 1)
+
+    def test_flask_email_analysis_is_routed(self):
+        processor = EmailProcessor()
+        processor.test_mode = False
+        processor.client = self.fake_client
+        processor.model_router = ModelRouter("small-model", "large-model", task_models={"email_analysis": "pinned"})
+        processor.process_email({"subject": "Hello", "body": "A short note.", "sender": "a@example.com"})
+        self.assertEqual(self.used_model(), "pinned")
+
+
+if __name__ == '__main__':
+    unittest.main()
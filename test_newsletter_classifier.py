@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import main
+from newsletter_classifier import NewsletterClassifier
+from sender_reputation import SenderReputation
+
+NEWSLETTER_BODY = """
+View this email in your browser
+
+This week's highlights:
+1. New AI features released https://example.com/ai
+2. Cloud computing updates
+
+You are receiving this because you subscribed. Unsubscribe here: https://example.com/unsubscribe
+"""
+
+
+class TestNewsletterClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = NewsletterClassifier(threshold=0.85)
+
+    def test_bulk_headers_are_confident_newsletter(self):
+        headers = {"List-Unsubscribe": "<mailto:unsub@example.com>", "Precedence": "bulk"}
+        score = self.classifier.score("Issue #42", NEWSLETTER_BODY, "Tech Weekly <news@substack.com>", headers)
+        self.assertGreater(score, 0.99)
+        self.assertIs(self.classifier.classify("Issue #42", NEWSLETTER_BODY, "news@substack.com", headers), True)
+
+    def test_personal_reply_is_confident_not_newsletter(self):
+        body = "Hi, can you review my pull request before the meeting?\n\nThanks,\nSam"
+        self.assertIs(self.classifier.classify("Re: PR review", body, "sam@company.com"), False)
+
+    def test_ambiguous_email_defers_to_llm(self):
+        body = "Here is the update on the project, see https://example.com/status for details." * 10
+        self.assertIsNone(self.classifier.classify("Project update", body, "sam@company.com"))
+
+    def test_stats_report_avoided_share(self):
+        self.classifier.classify("Issue #1", NEWSLETTER_BODY, "news@substack.com", {"List-Id": "<list>"})
+        self.classifier.classify("Re: lunch", "Sure, noon works", "friend@example.com")
+        self.classifier.classify("Project update", "See https://example.com " * 50, "sam@company.com")
+        stats = self.classifier.stats()
+        self.assertEqual(stats["classified"], 3)
+        self.assertEqual(stats["deferred_to_llm"], 1)
+        self.assertAlmostEqual(stats["llm_calls_avoided_ratio"], 0.6667)
+
+
+class TestIsNewsletter(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake_client = MagicMock()
+        self.fake_client.chat.completions.create.return_value.choices = [
+            MagicMock(message=MagicMock(content="true"))
+        ]
+        patchers = [
+            patch.object(main, "client", self.fake_client),
+            patch.object(main, "TEST_MODE", False),
+            patch.object(main, "newsletter_classifier", NewsletterClassifier(threshold=0.85)),
+            patch.object(main, "sender_reputation", SenderReputation(":memory:")),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+
+    def test_confident_email_skips_llm(self):
+        headers = {"List-Unsubscribe": "<https://example.com/unsub>"}
+        self.assertTrue(main.is_newsletter("Weekly digest", NEWSLETTER_BODY, "news@beehiiv.com", headers))
+        self.fake_client.chat.completions.create.assert_not_called()
+
+    def test_ambiguous_email_calls_llm(self):
+        body = "Status report, details at https://example.com/status. " * 10
+        self.assertTrue(main.is_newsletter("Project update", body, "sam@company.com"))
+        self.fake_client.chat.completions.create.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
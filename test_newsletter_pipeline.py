@@ -0,0 +1,134 @@
+import json
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import main
+from langchain.chat_models.fake import FakeListChatModel
+from prometheus_client import REGISTRY
+
+
+class SlowChatModel(FakeListChatModel):
+    """Fake chat model that sleeps on every call"""
+
+    delay: float = 0.1
+    calls: int = 0
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.responses[0]
+
+    def get_num_tokens(self, text):
+        return len(text) // 4
+
+
+def slow(result, delay=0.1):
+    """Build a stand-in pipeline stage that sleeps before returning"""
+    def stage(*args):
+        time.sleep(delay)
+        return result
+    return stage
+
+
+class TestNewsletterPipeline(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        patchers = [
+            patch.object(main, "generate_short_summary", slow("short summary")),
+            patch.object(main, "generate_title", slow("Weekly Title")),
+            patch.object(main, "generate_summary", slow("full summary", delay=0.2)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sequential_mode(self):
+        """Sequential mode runs the stages one after another"""
+        result = main.summarise_newsletter("content", mode="sequential")
+        self.assertEqual(result["title"], "Weekly Title")
+        self.assertEqual(result["summary"], "full summary")
+        self.assertEqual(set(result["timings"]["stages"]), {"short_summary", "title", "summary"})
+        self.assertGreaterEqual(result["timings"]["total"], 0.4)
+
+    def test_parallel_mode_overlaps_title_and_summary(self):
+        """Parallel mode finishes in about the time of the longest branch"""
+        result = main.summarise_newsletter("content", mode="parallel")
+        self.assertEqual(result["title"], "Weekly Title")
+        self.assertEqual(result["summary"], "full summary")
+        self.assertLess(result["timings"]["total"], 0.35)
+        self.assertGreater(result["timings"]["saved"], 0.1)
+
+    def test_stage_timings_are_exported_as_metrics(self):
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+
+        stage_before = sample("email_processor_stage_duration_seconds_count", stage="newsletter_title")
+        saved_before = sample("email_processor_newsletter_pipeline_saved_seconds_total", mode="parallel")
+        result = main.summarise_newsletter("content", mode="parallel")
+
+        self.assertEqual(sample("email_processor_stage_duration_seconds_count", stage="newsletter_title") - stage_before, 1)
+        self.assertAlmostEqual(
+            sample("email_processor_newsletter_pipeline_saved_seconds_total", mode="parallel") - saved_before,
+            result["timings"]["saved"]
+        )
+
+    def test_combined_mode_uses_one_function_call(self):
+        """Combined mode asks for title and summary in one completion"""
+        arguments = json.dumps({"title": "Combined Title", "summary": "Combined summary"})
+        response = SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(function_call=SimpleNamespace(arguments=arguments))
+        )])
+        fake_client = MagicMock()
+        fake_client.chat.completions.create.return_value = response
+
+        with patch.object(main, "client", fake_client):
+            result = main.summarise_newsletter("Newsletter\nline two", mode="combined")
+
+        self.assertEqual(result["title"], "Combined Title")
+        self.assertEqual(result["summary"], "Combined summary")
+        call = fake_client.chat.completions.create.call_args.kwargs
+        self.assertEqual(call["function_call"], {"name": "newsletter_summary"})
+        self.assertEqual(fake_client.chat.completions.create.call_count, 1)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            main.summarise_newsletter("content", mode="bogus")
+
+
+class TestSummaryChains(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.model = SlowChatModel(responses=["chunk summary"])
+        patcher = patch.object(main, "get_chat_model", lambda model_name: self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for getter in (main.get_summary_chain, main.get_short_summary_chain):
+            getter.cache_clear()
+            self.addCleanup(getter.cache_clear)
+
+    def test_chains_are_reused(self):
+        """Chains are built once and shared between calls"""
+        self.assertIs(main.get_summary_chain("model"), main.get_summary_chain("model"))
+        self.assertIs(main.get_short_summary_chain("model"), main.get_short_summary_chain("model"))
+
+    def test_map_step_runs_concurrently(self):
+        """Chunks are summarized concurrently, then reduced once"""
+        content = "\n".join(f"paragraph {i} " + "text " * 100 for i in range(6))
+        with patch.object(main, "chunker", main.TokenChunker(max_tokens=150)), \
+                patch.object(main, "SUMMARY_MAP_CONCURRENCY", 6):
+            start = time.perf_counter()
+            summary = main.generate_summary(content)
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(summary, "chunk summary")
+        # six map calls plus one reduce call
+        self.assertEqual(self.model.calls, 7)
+        self.assertLess(elapsed, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+from notion_outbox import NotionOutbox, PermanentDeliveryError
+from fastapi.testclient import TestClient
+
+
+class TestNotionOutbox(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "outbox.db")
+        self.outbox = NotionOutbox(self.db_path, max_attempts=3, base_delay=10)
+
+    def test_delivered_entries_are_removed(self):
+        delivered = []
+
+        async def deliver(page):
+            delivered.append(page)
+
+        self.outbox.enqueue({"title": "one"})
+        self.outbox.enqueue({"title": "two"})
+        self.assertEqual(self.outbox.stats()["depth"], 2)
+
+        async def drain():
+            while await self.outbox.deliver_next(deliver):
+                pass
+
+        asyncio.run(drain())
+        self.assertEqual(delivered, [{"title": "one"}, {"title": "two"}])
+        self.assertEqual(self.outbox.stats()["depth"], 0)
+        self.assertIsNone(self.outbox.stats()["oldest_age_seconds"])
+
+    def test_failures_back_off_then_dead_letter(self):
+        """Failed entries are retried later and dead-lettered after max attempts"""
+        async def deliver(page):
+            raise ConnectionError("Notion unavailable")
+
+        self.outbox.enqueue({"title": "flaky"})
+        asyncio.run(self.outbox.deliver_next(deliver))
+
+        # The retry is scheduled in the future, so nothing is due yet
+        self.assertIsNone(self.outbox.claim())
+        self.assertEqual(self.outbox.stats()["pending"], 1)
+
+        for attempt in range(2):
+            with patch("notion_outbox.time.time", return_value=10 ** 10 * (attempt + 1)):
+                asyncio.run(self.outbox.deliver_next(deliver))
+
+        stats = self.outbox.stats()
+        self.assertEqual(stats["dead"], 1)
+        self.assertEqual(stats["depth"], 0)
+
+    def test_permanent_failure_is_not_retried(self):
+        async def deliver(page):
+            raise PermanentDeliveryError("validation_error")
+
+        self.outbox.enqueue({"title": "bad"})
+        asyncio.run(self.outbox.deliver_next(deliver))
+        self.assertEqual(self.outbox.stats()["dead"], 1)
+
+    def test_survives_restart_and_reclaims_stale_claims(self):
+        """Entries claimed by a worker that died are delivered after a restart"""
+        self.outbox.enqueue({"title": "in flight"})
+        self.assertIsNotNone(self.outbox.claim())
+
+        restarted = NotionOutbox(self.db_path, claim_timeout=120)
+        self.assertIsNone(restarted.claim())
+        self.assertEqual(restarted.stats()["delivering"], 1)
+        with patch("notion_outbox.time.time", return_value=10 ** 10):
+            entry_id, page, attempts = restarted.claim()
+        self.assertEqual(page, {"title": "in flight"})
+
+    def test_claim_is_held_while_delivery_is_in_flight(self):
+        """A delivery slower than claim_timeout is not claimed by another worker"""
+        outbox = NotionOutbox(self.db_path, claim_timeout=0.3)
+        outbox.enqueue({"title": "slow"})
+        claims = []
+
+        async def deliver(page):
+            for _ in range(5):
+                await asyncio.sleep(0.1)
+                claims.append(outbox.claim())
+
+        asyncio.run(outbox.deliver_next(deliver))
+        self.assertEqual(claims, [None] * 5)
+        self.assertEqual(outbox.stats()["depth"], 0)
+
+
+class TestNotionOutboxIntegration(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.outbox = NotionOutbox(os.path.join(directory.name, "outbox.db"))
+        patchers = [
+            patch.object(main, "notion_outbox", self.outbox),
+            patch.object(main, "SAVE_TO_NOTION", True),
+            patch.object(main, "TEST_MODE", False),
+            patch.object(main, "process_email_content_async", self.fake_summary),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    async def fake_summary(subject, body):
+        return f"Summary of {subject}"
+
+    def test_endpoint_queues_notion_write(self):
+        """The response returns once the summary is ready; Notion is written later"""
+        client = TestClient(main.app)
+        response = client.post("/api/process-email", json={
+            "subject": "Weekly Newsletter", "body": "Body", "sender": "news@example.com"
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()["metadata"]["notion_outbox_id"])
+
+        stats = client.get("/api/outbox").json()
+        self.assertEqual(stats["depth"], 1)
+        self.assertIsNotNone(stats["oldest_age_seconds"])
+
+        pages = []
+
+        async def deliver(page):
+            pages.append(page)
+
+        asyncio.run(self.outbox.deliver_next(deliver))
+        self.assertEqual(pages[0]["properties"]["Title"]["title"][0]["text"]["content"], "Weekly Newsletter")
+        self.assertEqual(client.get("/api/outbox").json()["depth"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import json
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+
+import test_support
+
+import main
+import notion_transport
+
+
+class NotionStubHandler(BaseHTTPRequestHandler):
+    """Answers Notion page creation and records which connection served it"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append({
+            "path": self.path,
+            "port": self.client_address[1],
+            "authorization": self.headers.get("Authorization"),
+            "body": body
+        })
+        payload = json.dumps({"object": "page", "id": "page-id"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestNotionTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), NotionStubHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        patchers = [
+            patch.object(notion_transport, "NOTION_API_BASE", base),
+            patch.object(main, "TEST_MODE", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        notion_transport.close()
+        self.addCleanup(notion_transport.close)
+
+    def test_create_notion_page_reuses_connection(self):
+        """Raw page writes share one keep-alive connection"""
+        for _ in range(3):
+            response = main.create_notion_page({"parent": {"database_id": "db"}})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len({r["port"] for r in self.server.requests}), 1)
+        self.assertEqual(self.server.requests[0]["path"], "/v1/pages")
+        self.assertEqual(self.server.requests[0]["authorization"], f"Bearer {os.environ['NOTION_KEY']}")
+
+    def test_add_to_notion_uses_shared_client(self):
+        """add_to_notion goes through the process-wide client"""
+        main.add_to_notion("summary", "subject", "sender@example.com")
+        main.add_to_notion("summary 2", "subject 2", "sender@example.com")
+
+        self.assertIs(notion_transport.get_notion_client(), notion_transport.get_notion_client())
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(len({r["port"] for r in self.server.requests}), 1)
+        self.assertEqual(
+            self.server.requests[1]["body"]["properties"]["Title"]["title"][0]["text"]["content"],
+            "subject 2"
+        )
+
+    def test_client_keeps_transport_settings(self):
+        """The SDK keeps the connect timeout and leaves retries to the outbox"""
+        notion = notion_transport.get_notion_client()
+        self.assertEqual(notion.client.timeout, httpx.Timeout(
+            notion_transport.NOTION_READ_TIMEOUT, connect=notion_transport.NOTION_CONNECT_TIMEOUT
+        ))
+        self.assertIs(notion.options.retry, False)
+        self.assertEqual(notion.options.notion_version, notion_transport.NOTION_VERSION)
+
+    def test_add_to_notion_async(self):
+        """The async path shares a pooled client per event loop"""
+        async def run():
+            for i in range(3):
+                await main.add_to_notion_async(f"summary {i}", f"subject {i}", "sender@example.com")
+            await notion_transport.close_async_notion_client()
+
+        asyncio.run(run())
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len({r["port"] for r in self.server.requests}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
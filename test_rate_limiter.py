@@ -0,0 +1,115 @@
+import time
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import main
+from rate_limiter import (
+    OpenAIRateLimiter, RateLimitWaitExceeded, estimate_request_tokens, parse_reset_duration
+)
+from fastapi.testclient import TestClient
+from openai.types.chat import ChatCompletion
+from prometheus_client import REGISTRY
+
+
+class TestOpenAIRateLimiter(unittest.TestCase):
+    def test_estimate_includes_prompt_and_completion_budget(self):
+        request = {"messages": [{"role": "user", "content": "word " * 100}], "max_tokens": 500}
+        tokens = estimate_request_tokens(request)
+        self.assertGreater(tokens, 500 + 50)
+        self.assertLess(tokens, 500 + 200)
+
+    def test_parse_reset_duration(self):
+        self.assertEqual(parse_reset_duration("6m0s"), 360)
+        self.assertAlmostEqual(parse_reset_duration("17ms"), 0.017)
+        self.assertAlmostEqual(parse_reset_duration("1.5s"), 1.5)
+        self.assertIsNone(parse_reset_duration(""))
+
+    def test_requests_per_minute_queue_bursts(self):
+        """Requests beyond the RPM budget wait for the bucket to refill"""
+        limiter = OpenAIRateLimiter(requests_per_minute=600, tokens_per_minute=10 ** 9)
+        for _ in range(600):
+            limiter.acquire(1)
+
+        start = time.monotonic()
+        limiter.acquire(1)
+        elapsed = time.monotonic() - start
+
+        self.assertGreaterEqual(elapsed, 0.08)
+        self.assertEqual(limiter.stats()["delayed"], 1)
+        self.assertEqual(limiter.stats()["admitted"], 601)
+
+    def test_tokens_per_minute_async(self):
+        """Requests beyond the TPM budget wait without blocking the loop"""
+        limiter = OpenAIRateLimiter(requests_per_minute=10 ** 6, tokens_per_minute=6000)
+
+        async def run():
+            await limiter.acquire_async(6000)
+            start = time.monotonic()
+            await limiter.acquire_async(20)
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.15)
+
+    def test_max_wait_rejects(self):
+        limiter = OpenAIRateLimiter(requests_per_minute=1, tokens_per_minute=10 ** 6, max_wait=1)
+        limiter.acquire(1)
+        with self.assertRaises(RateLimitWaitExceeded):
+            limiter.acquire(1)
+        self.assertEqual(limiter.stats()["rejected"], 1)
+
+    def test_headers_resync_budgets(self):
+        """Rate-limit headers from the API override the local estimate"""
+        limiter = OpenAIRateLimiter(requests_per_minute=3500, tokens_per_minute=90000)
+        limiter.update_from_headers({
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "2s",
+            "x-ratelimit-limit-tokens": "40000",
+            "x-ratelimit-remaining-tokens": "1000",
+        })
+        stats = limiter.stats()
+        self.assertEqual(stats["requests_per_minute"], 500)
+        self.assertEqual(stats["tokens_per_minute"], 40000)
+        self.assertLessEqual(stats["available_tokens"], 1001)
+        self.assertGreater(limiter._reserve(1), 2)
+
+
+class TestRateLimitedEndpoint(OpenAITestCase):
+    def test_exhausted_budget_returns_429(self):
+        limiter = OpenAIRateLimiter(requests_per_minute=1, tokens_per_minute=10 ** 6, max_wait=0.5)
+        limiter.acquire(1)
+        with patch.object(main, "openai_rate_limiter", limiter), patch.object(main, "TEST_MODE", False):
+            main.summary_cache.clear()
+            response = TestClient(main.app).post("/api/process-email", json={
+                "subject": "Rate limited", "body": "Body", "sender": "a@example.com"
+            })
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+    def test_chat_model_uses_shared_limiter_and_token_accounting(self):
+        """langchain chains go through the same limiter and token metrics as direct completions"""
+        completion = {
+            "id": "1", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "summary"}}],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 5, "total_tokens": 35}
+        }
+        fake_client = MagicMock()
+        fake_client.chat.completions.create.return_value = ChatCompletion(**completion)
+        limiter = OpenAIRateLimiter(requests_per_minute=100, tokens_per_minute=10 ** 6)
+        before = REGISTRY.get_sample_value("email_processor_llm_tokens_total",
+                                           {"model": "gpt-3.5-turbo", "kind": "prompt"}) or 0.0
+        with patch.object(main, "client", fake_client), patch.object(main, "openai_rate_limiter", limiter):
+            main.get_chat_model.cache_clear()
+            self.addCleanup(main.get_chat_model.cache_clear)
+            self.assertEqual(main.get_chat_model("gpt-3.5-turbo").predict("Summarize this"), "summary")
+
+        self.assertEqual(limiter.stats()["admitted"], 1)
+        after = REGISTRY.get_sample_value("email_processor_llm_tokens_total", {"model": "gpt-3.5-turbo", "kind": "prompt"})
+        self.assertEqual(after - before, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+import openai
+
+from test_support import OpenAITestCase
+
+import main
+from email_processor import EmailProcessor
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_transient_error
+from fastapi.testclient import TestClient
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+class Flaky:
+    """Callable that fails with the given errors before succeeding"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+        self.policy = RetryPolicy(self.breaker, max_attempts=3, base_delay=0)
+
+    def test_transient_errors_are_retried(self):
+        flaky = Flaky(connection_error(), TimeoutError())
+        self.assertEqual(self.policy.call(flaky), "ok")
+        self.assertEqual(flaky.calls, 3)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_non_transient_errors_are_not_retried(self):
+        flaky = Flaky(ValueError("bad request"))
+        with self.assertRaises(ValueError):
+            self.policy.call(flaky)
+        self.assertEqual(flaky.calls, 1)
+        self.assertFalse(is_transient_error(Exception("Error code: 429 - insufficient_quota")))
+
+    def test_async_retry(self):
+        errors = [connection_error()]
+
+        async def call():
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        self.assertEqual(asyncio.run(self.policy.call_async(call)), "ok")
+
+    def test_circuit_opens_and_recovers(self):
+        """Repeated failures open the circuit; after the reset timeout one trial is let through"""
+        with self.assertRaises(openai.APIConnectionError):
+            self.policy.call(Flaky(*[connection_error()] * 3))
+        self.assertEqual(self.breaker.state, "open")
+
+        never_called = Flaky()
+        with self.assertRaises(CircuitOpenError):
+            self.policy.call(never_called)
+        self.assertEqual(never_called.calls, 0)
+
+        with patch("resilience.time.monotonic", return_value=self.breaker.opened_at + 31):
+            self.assertEqual(self.policy.call(Flaky()), "ok")
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_failed_trial_reopens_circuit(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        with patch("resilience.time.monotonic", return_value=self.breaker.opened_at + 31):
+            self.breaker.before_call()
+            self.assertEqual(self.breaker.state, "half_open")
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.before_call()
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_cancelled_trial_releases_half_open_slot(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        with patch("resilience.time.monotonic", return_value=self.breaker.opened_at + 31):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(self.policy.call_async(cancelled))
+            self.assertEqual(self.breaker.state, "open")
+            # The next call is let through as the trial instead of being rejected
+            self.assertEqual(self.policy.call(Flaky()), "ok")
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_local_error_during_trial_leaves_circuit_open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        with patch("resilience.time.monotonic", return_value=self.breaker.opened_at + 31):
+            with self.assertRaises(ValueError):
+                self.policy.call(Flaky(ValueError("bad argument")))
+            self.assertEqual(self.breaker.state, "open")
+
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            rejected = openai.BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+            with self.assertRaises(openai.BadRequestError):
+                self.policy.call(Flaky(rejected))
+        # An answer from upstream, even a refusal, shows it is reachable
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_reset_closes_circuit(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.breaker.reset()
+        self.assertEqual(self.breaker.stats(), {
+            "state": "closed", "consecutive_failures": 0, "times_opened": 0, "rejected": 0
+        })
+
+
+class TestCallSitesUseResilience(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.breaker = CircuitBreaker("OpenAI", failure_threshold=1, reset_timeout=60)
+        self.breaker.record_failure()
+        self.policy = RetryPolicy(self.breaker, base_delay=0)
+
+    def test_api_fails_fast_with_503(self):
+        with patch.object(main, "openai_retry_policy", self.policy), patch.object(main, "TEST_MODE", False):
+            main.summary_cache.clear()
+            response = TestClient(main.app).post("/api/process-email", json={
+                "subject": "Outage", "body": "Body", "sender": "a@example.com"
+            })
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+    def test_email_processor_degrades(self):
+        processor = EmailProcessor()
+        processor.test_mode = False
+        processor.retry_policy = self.policy
+        result = processor.process_email({"subject": "Outage", "body": "Body", "sender": "a@example.com"})
+        self.assertEqual(result["summary"], "Analysis skipped because OpenAI is unavailable.")
+        self.assertEqual(result["priority"], "Unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from test_support import OpenAITestCase
+
+import main
+import sender_reputation
+from newsletter_classifier import NewsletterClassifier
+from sender_reputation import SenderReputation, sender_keys
+
+AMBIGUOUS_BODY = "Status report, details at https://example.com/status. " * 10
+
+
+class TestSenderReputation(unittest.TestCase):
+    def setUp(self):
+        self.store = SenderReputation(":memory:", min_observations=3, confidence=0.9, recheck_rate=0)
+
+    def test_sender_keys(self):
+        self.assertEqual(
+            sender_keys("Tech Weekly <News@Example.com>"),
+            ["sender:news@example.com", "domain:example.com"]
+        )
+        self.assertEqual(sender_keys("friend@gmail.com"), ["sender:friend@gmail.com"])
+        self.assertEqual(sender_keys("not an address"), [])
+
+    def test_confident_after_enough_votes(self):
+        for _ in range(2):
+            self.store.record("news@example.com", True)
+        self.assertIsNone(self.store.lookup("news@example.com"))
+        self.store.record("news@example.com", True)
+        self.assertIs(self.store.lookup("news@example.com"), True)
+
+    def test_domain_history_covers_new_sender(self):
+        for _ in range(3):
+            self.store.record("news@example.com", True)
+        self.assertIs(self.store.lookup("digest@example.com"), True)
+        self.assertIsNone(self.store.lookup("digest@other.com"))
+
+    def test_mixed_history_is_not_confident(self):
+        for verdict in (True, True, True, False):
+            self.store.record("mixed@example.com", verdict)
+        self.assertIsNone(self.store.lookup("mixed@example.com"))
+
+    def test_old_votes_decay(self):
+        with patch.object(sender_reputation.time, "time", return_value=0):
+            for _ in range(3):
+                self.store.record("news@example.com", True)
+        with patch.object(sender_reputation.time, "time", return_value=31 * 86400):
+            self.assertIsNone(self.store.lookup("news@example.com"))
+
+    def test_recheck_skips_confident_verdict(self):
+        store = SenderReputation(":memory:", recheck_rate=1)
+        for _ in range(3):
+            store.record("news@example.com", True)
+        self.assertIsNone(store.lookup("news@example.com"))
+        self.assertEqual(store.stats()["rechecks"], 1)
+
+
+class TestIsNewsletterReputation(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake_client = MagicMock()
+        self.fake_client.chat.completions.create.return_value.choices = [
+            MagicMock(message=MagicMock(content="true"))
+        ]
+        self.store = SenderReputation(":memory:", recheck_rate=0)
+        patchers = [
+            patch.object(main, "client", self.fake_client),
+            patch.object(main, "TEST_MODE", False),
+            patch.object(main, "newsletter_classifier", NewsletterClassifier(threshold=0.85)),
+            patch.object(main, "sender_reputation", self.store),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+
+    def test_known_sender_skips_classification(self):
+        """After three LLM verdicts the sender is answered from the store"""
+        for i in range(5):
+            self.assertTrue(main.is_newsletter(f"Project update {i}", AMBIGUOUS_BODY + str(i), "ops@company.com"))
+
+        self.assertEqual(self.fake_client.chat.completions.create.call_count, 3)
+        stats = self.store.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["recorded"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
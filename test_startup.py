@@ -0,0 +1,39 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Heavy dependencies main.py imports on first use rather than at import time
+DEFERRED_MODULES = ("langchain", "openai", "requests", "notion_client", "tiktoken")
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_does_not_load_deferred_modules(self):
+        env = dict(os.environ, OPENAI_API_KEY="sk-test", NOTION_KEY="secret", NOTION_DATABASE_ID="db")
+        output = subprocess.run(
+            [sys.executable, "-c",
+             f"import json, sys, main; print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(json.loads(output.strip().splitlines()[-1]), [])
+
+    def test_clients_are_created_on_first_use(self):
+        import main
+
+        async def loop_client():
+            client = main.get_async_openai_client()
+            self.assertIs(main.get_async_openai_client(), client)
+            await main.close_async_openai_client()
+            return client
+
+        # Each event loop gets its own connection pool
+        self.assertIsNot(asyncio.run(loop_client()), asyncio.run(loop_client()))
+        self.assertIs(main.get_openai_client(), main.get_openai_client())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,13 +4,15 @@ import os
 from dotenv import load_dotenv
 import requests
 import json
+from test_support import OpenAITestCase
 from main import app
 from fastapi.testclient import TestClient
 
 load_dotenv()
 
-class TestEmailProcessing(unittest.TestCase):
+class TestEmailProcessing(OpenAITestCase):
     def setUp(self):
+        super().setUp()
         self.client = TestClient(app)
         self.NOTION_KEY = os.getenv("NOTION_KEY")
         self.NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
@@ -0,0 +1,101 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+from summary_cache import SummaryCache
+from test_async_api import FakeCompletions
+from fastapi.testclient import TestClient
+
+
+class TestSummaryCache(unittest.TestCase):
+    def test_key_ignores_whitespace_differences(self):
+        """Copies that differ only in whitespace share a key"""
+        key = SummaryCache.make_key("template", "model", "Weekly  News", "Line one\n\nLine two ")
+        same = SummaryCache.make_key("template", "model", "Weekly News", "Line one Line two")
+        other_model = SummaryCache.make_key("template", "other", "Weekly News", "Line one Line two")
+        self.assertEqual(key, same)
+        self.assertNotEqual(key, other_model)
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first"""
+        cache = SummaryCache(max_entries=2)
+        cache.set("a", "A")
+        cache.set("b", "B")
+        self.assertEqual(cache.get("a"), "A")
+        cache.set("c", "C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(cache.get("c"), "C")
+
+    def test_ttl_expiry(self):
+        """Entries older than the TTL are treated as misses"""
+        cache = SummaryCache(ttl_seconds=10)
+        with patch("summary_cache.time.time", return_value=1000.0):
+            cache.set("key", "value")
+        with patch("summary_cache.time.time", return_value=1005.0):
+            self.assertEqual(cache.get("key"), "value")
+        with patch("summary_cache.time.time", return_value=1011.0):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_sqlite_tier_survives_restart(self):
+        """A new cache instance reads entries written by a previous one"""
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "cache.db")
+            SummaryCache(db_path=db_path).set("key", True)
+
+            restarted = SummaryCache(db_path=db_path)
+            self.assertIs(restarted.get("key"), True)
+            self.assertIs(restarted.get("key"), True)
+            stats = restarted.stats()
+            self.assertEqual(stats["disk_hits"], 1)
+            self.assertEqual(stats["memory_hits"], 1)
+
+
+class TestSummaryCacheIntegration(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.completions = FakeCompletions(delay=0)
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        patchers = [
+            patch.object(main, "get_async_openai_client", lambda: fake_client),
+            patch.object(main, "TEST_MODE", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+
+    def test_repeat_email_skips_llm(self):
+        """A repeated email is answered from the cache"""
+        first = asyncio.run(main.process_email_content_async("Subject", "Body text"))
+        second = asyncio.run(main.process_email_content_async("Subject", "Body  text"))
+        self.assertEqual(first, second)
+        self.assertEqual(self.completions.calls, 1)
+
+    def test_hit_skips_preprocessing_and_routing(self):
+        asyncio.run(main.process_email_content_async("Subject", "Body text"))
+        with patch.object(main, "prepare_body") as prepare_body, patch.object(main, "route_model") as route_model:
+            asyncio.run(main.process_email_content_async("Subject", "Body text"))
+        prepare_body.assert_not_called()
+        route_model.assert_not_called()
+        self.assertEqual(self.completions.calls, 1)
+
+    def test_cache_stats_endpoint(self):
+        """Hit and miss counters are exposed on the API"""
+        asyncio.run(main.process_email_content_async("Subject", "Body"))
+        asyncio.run(main.process_email_content_async("Subject", "Body"))
+        response = TestClient(main.app).get("/api/cache-stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["hits"], 1)
+        self.assertEqual(response.json()["misses"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
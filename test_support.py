@@ -0,0 +1,36 @@
+"""
+Shared setup for the test modules.
+
+Import this before ``main`` or ``app``: it fills in the settings they read
+at import time and points their SQLite stores at a temporary directory, so
+test runs neither need real credentials nor leave databases in the repo.
+"""
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("NOTION_KEY", "test-notion-key")
+os.environ.setdefault("NOTION_DATABASE_ID", "test-database-id")
+
+# Removed when the test process exits
+_db_dir = tempfile.TemporaryDirectory()
+for _setting, _name in (
+    ("JOB_QUEUE_DB", "jobs.db"),
+    ("IDEMPOTENCY_DB", "idempotency.db"),
+    ("NOTION_OUTBOX_DB", "notion_outbox.db"),
+    ("SENDER_REPUTATION_DB", "sender_reputation.db"),
+):
+    os.environ[_setting] = os.path.join(_db_dir.name, _name)
+
+from rate_limiter import reset_openai_rate_limiter
+from resilience import reset_openai_retry_policy
+
+
+class OpenAITestCase(unittest.TestCase):
+    """Starts each test with a closed OpenAI circuit breaker and a fresh rate limiter, which the whole process shares."""
+
+    def setUp(self):
+        super().setUp()
+        reset_openai_retry_policy()
+        reset_openai_rate_limiter()
@@ -0,0 +1,123 @@
+import json
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from test_support import OpenAITestCase
+
+import main
+import tracing
+from fastapi.testclient import TestClient
+
+
+class FakeCompletions:
+    async def create(self, **kwargs):
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="summary"))], usage=None)
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """Stands in for an OTLP/HTTP collector"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSpans(unittest.TestCase):
+    def test_span_without_trace_is_noop(self):
+        with tracing.span("idle") as span:
+            self.assertIsNone(span)
+
+    def test_nested_spans_and_threads(self):
+        def work():
+            with tracing.span("worker"):
+                pass
+
+        with tracing.trace("request") as trace:
+            with tracing.span("outer", stage="test"):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    list(executor.map(tracing.propagate(lambda _: work()), range(2)))
+            breakdown = trace.breakdown()
+
+        spans = {span["name"]: span for span in breakdown["spans"]}
+        self.assertEqual(spans["outer"]["parent"], "request")
+        self.assertEqual(spans["outer"]["stage"], "test")
+        self.assertEqual(spans["worker"]["parent"], "outer")
+        self.assertEqual(sum(1 for span in breakdown["spans"] if span["name"] == "worker"), 2)
+        self.assertIsNone(tracing.current_trace())
+
+
+class TestDebugTiming(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+        patchers = [
+            patch.object(main, "get_async_openai_client", lambda: fake_client),
+            patch.object(main, "TEST_MODE", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.summary_cache.clear()
+        self.client = TestClient(main.app)
+        self.email = {"subject": "Hello", "body": "A short note.", "sender": "sam@example.com"}
+
+    def test_debug_header_adds_timings(self):
+        response = self.client.post("/api/process-email", json=self.email, headers={"X-Debug-Timing": "1"})
+        self.assertEqual(response.status_code, 200)
+        timings = response.json()["metadata"]["timings"]
+        self.assertEqual(timings["trace_id"], response.headers["X-Trace-Id"])
+        names = [span["name"] for span in timings["spans"]]
+        for name in ("preprocessing", "prompt_build", "openai.chat.completions", "summarization"):
+            self.assertIn(name, names)
+        llm = next(span for span in timings["spans"] if span["name"] == "openai.chat.completions")
+        self.assertEqual(llm["parent"], "summarization")
+        self.assertGreaterEqual(llm["duration_ms"], 10)
+
+    def test_no_timings_without_header(self):
+        response = self.client.post("/api/process-email", json=self.email)
+        self.assertNotIn("timings", response.json()["metadata"])
+        self.assertNotIn("X-Trace-Id", response.headers)
+
+
+class TestOTLPExport(OpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CollectorHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_trace_exported_as_otlp_json(self):
+        exporter = tracing.OTLPExporter(f"http://127.0.0.1:{self.server.server_address[1]}", service_name="test")
+        with patch.object(tracing, "get_exporter", return_value=exporter):
+            with tracing.trace("request"):
+                with tracing.span("child", model="gpt"):
+                    pass
+        exporter.flush()
+
+        path, payload = self.server.requests[0]
+        self.assertEqual(path, "/v1/traces")
+        resource = payload["resourceSpans"][0]
+        self.assertEqual(resource["resource"]["attributes"][0]["value"]["stringValue"], "test")
+        spans = {span["name"]: span for span in resource["scopeSpans"][0]["spans"]}
+        self.assertEqual(spans["child"]["parentSpanId"], spans["request"]["spanId"])
+        self.assertEqual(len(spans["request"]["traceId"]), 32)
+        self.assertEqual(spans["child"]["attributes"], [{"key": "model", "value": {"stringValue": "gpt"}}])
+        self.assertEqual(exporter.stats()["exported"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+from functools import lru_cache
+
+# Rough characters-per-token ratio for English text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Return the tiktoken encoding for model, or None if it cannot be loaded."""
+    # Imported on first use so importing the apps does not load tiktoken
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+    except Exception:
+        # The encoding files are downloaded on first use and may be unreachable offline
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Count the tokens text uses for model.
+
+    Falls back to an estimate of one token per four characters when tiktoken
+    or its encoding files are not available.
+
+    Args:
+        text (str): The text to measure.
+        model (str): The model whose tokenizer to use.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
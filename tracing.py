@@ -0,0 +1,256 @@
+import contextvars
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+# Request header that asks for the timing breakdown in the response metadata
+DEBUG_TIMING_HEADER = "X-Debug-Timing"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(self, name: str, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_unix_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Trace:
+    """
+    The spans recorded while handling one request.
+
+    Spans are appended from whichever task or thread runs them, so the list
+    is guarded by a lock.
+    """
+
+    def __init__(self, name: str, debug: bool = False):
+        self.name = name
+        self.debug = debug
+        self.trace_id = secrets.token_hex(16)
+        self.start = time.perf_counter()
+        self.root = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> dict:
+        """
+        Return the finished spans as offsets and durations in milliseconds.
+
+        Returns:
+            dict: The trace ID, elapsed time so far, and spans in start order.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        # The root span is still open while the response is being built
+        names = {span.span_id: span.name for span in spans + ([self.root] if self.root else [])}
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "spans": [
+                {
+                    "name": span.name,
+                    "parent": names.get(span.parent_id),
+                    "start_ms": round((span.start - self.start) * 1000, 2),
+                    "duration_ms": round(span.duration * 1000, 2),
+                    **({"error": span.error} if span.error else {}),
+                    **span.attributes
+                }
+                for span in spans
+            ]
+        }
+
+
+def current_trace():
+    """Return the trace being recorded for the current request, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Record the enclosed block as a span of the current trace.
+
+    Does nothing, and yields None, when no trace is being recorded.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.add(current)
+
+
+@contextmanager
+def trace(name: str, debug: bool = False, **attributes):
+    """Record a new trace with a root span for the enclosed block, then export it."""
+    recorded = Trace(name, debug=debug)
+    token = _current_trace.set(recorded)
+    try:
+        with span(name, **attributes) as root:
+            recorded.root = root
+            yield recorded
+    finally:
+        _current_trace.reset(token)
+        exporter = get_exporter()
+        if exporter is not None:
+            exporter.export(recorded)
+
+
+def propagate(func):
+    """
+    Wrap func so calls in other threads record spans into the caller's trace.
+
+    Each call runs in its own copy of the caller's context, so the wrapper
+    can be handed to an executor and run concurrently.
+    """
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class OTLPExporter:
+    """
+    Sends finished traces to an OTLP/HTTP collector as JSON.
+
+    Traces are queued and posted from a background thread so exporting never
+    adds latency to the request. When the queue is full new traces are
+    dropped rather than blocking.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "email-processor", max_queue: int = 1000,
+                 timeout: float = 5):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Only needed when exporting is configured, so requests is not loaded at import
+        import requests
+        self._session = requests.Session()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def payload(self, trace: Trace) -> dict:
+        """Build the OTLP ``ExportTraceServiceRequest`` JSON for a trace."""
+        spans = []
+        for span in trace.spans:
+            end_unix_ns = span.start_unix_ns + int(span.duration * 1e9)
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                "name": span.name,
+                # SPAN_KIND_INTERNAL
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_unix_ns),
+                "endTimeUnixNano": str(end_unix_ns),
+                "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+            })
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "email-processor"}, "spans": spans}]
+            }]
+        }
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                response = self._session.post(self.url, json=self.payload(trace), timeout=self.timeout)
+                response.raise_for_status()
+                self.exported += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Trace export failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued trace has been posted."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        return {"exported": self.exported, "dropped": self.dropped, "failed": self.failed,
+                "queued": self._queue.qsize()}
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """Return the process-wide OTLP exporter, or None when OTEL_EXPORTER_OTLP_ENDPOINT is unset."""
+    global _exporter
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint:
+        return None
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = OTLPExporter(endpoint, service_name=os.getenv("OTEL_SERVICE_NAME", "email-processor"))
+        return _exporter
+
+
+def should_trace(debug: bool) -> bool:
+    """Whether to record a trace for a request: always when debugging, else sampled for export."""
+    if debug:
+        return True
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return False
+    return random.random() < float(os.getenv("TRACE_SAMPLE_RATE", "1"))
@@ -0,0 +1,138 @@
+"""
+Standalone consumers for the durable job queue.
+
+Runs ``--processes`` worker processes, each consuming jobs from the SQLite
+queue at ``JOB_QUEUE_DB`` with ``--concurrency`` concurrent jobs. Start it
+next to the API apps with ``JOB_WORKERS=0`` so the apps only enqueue:
+
+    JOB_WORKERS=0 uvicorn main:app &
+    python worker.py --processes 4 --concurrency 8
+
+Workers that die are restarted; jobs they were running become visible again
+after ``JOB_VISIBILITY_TIMEOUT`` seconds and are retried by another worker.
+SIGTERM or Ctrl+C lets running jobs finish for ``--grace`` seconds, then
+hands the rest back to the queue.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from jobs import JobManager, get_job_queue
+
+load_dotenv()
+
+# Seconds to wait before restarting a worker process that exited unexpectedly
+RESTART_DELAY = 1
+
+
+def summarize_email_handler():
+    # Imported here so workers that only analyze emails do not load the FastAPI app
+    from main import run_summarize_email_job
+    return run_summarize_email_job
+
+
+def analyze_email_handler():
+    from email_processor import EmailProcessor
+    return EmailProcessor().process_email
+
+
+# Job kinds and factories for their handlers, called once per worker process
+HANDLERS = {
+    "summarize_email": summarize_email_handler,
+    "analyze_email": analyze_email_handler,
+}
+
+
+async def consume(kinds: list, concurrency: int, grace: float):
+    manager = JobManager(get_job_queue())
+    for kind in kinds:
+        manager.register(kind, HANDLERS[kind]())
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    manager.start(concurrency)
+    print(f"Worker {os.getpid()} consuming {', '.join(kinds)} with concurrency {concurrency}")
+    await stopping.wait()
+    await manager.stop(grace)
+    print(f"Worker {os.getpid()} stopped after {manager.processed} jobs")
+
+
+def run_worker(kinds: list, concurrency: int, grace: float):
+    asyncio.run(consume(kinds, concurrency, grace))
+
+
+def supervise(args) -> int:
+    """Keep ``args.processes`` workers running until SIGTERM or SIGINT."""
+    context = multiprocessing.get_context("spawn")
+    worker_args = (args.kinds, args.concurrency, args.grace)
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = []
+    for _ in range(args.processes):
+        process = context.Process(target=run_worker, args=worker_args, daemon=True)
+        process.start()
+        processes.append(process)
+
+    while not stopping:
+        time.sleep(0.5)
+        for index, process in enumerate(processes):
+            if process.is_alive() or stopping:
+                continue
+            print(f"Worker {process.pid} exited with code {process.exitcode}; restarting")
+            time.sleep(RESTART_DELAY)
+            processes[index] = context.Process(target=run_worker, args=worker_args, daemon=True)
+            processes[index].start()
+
+    for process in processes:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    for process in processes:
+        process.join(args.grace + 5)
+        if process.is_alive():
+            process.kill()
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent jobs per worker process")
+    parser.add_argument("--kinds", default=",".join(HANDLERS),
+                        help=f"Comma-separated job kinds to consume (default: {','.join(HANDLERS)})")
+    parser.add_argument("--grace", type=float, default=30, help="Seconds running jobs get to finish on shutdown")
+    parser.add_argument("--requeue-failed", action="store_true",
+                        help="Move dead-lettered jobs of these kinds back to the queue, then exit")
+    args = parser.parse_args(argv)
+    args.kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in args.kinds if kind not in HANDLERS]
+    if unknown:
+        parser.error(f"unknown job kinds: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.requeue_failed:
+        print(f"Requeued {get_job_queue().requeue_failed(args.kinds)} failed jobs")
+        return 0
+    return supervise(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())